@@ -0,0 +1,4 @@
+from benchmark import bench
+
+if __name__ == "__main__":
+    bench.main()
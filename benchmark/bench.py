@@ -0,0 +1,167 @@
+""" bench: time FillDCM end to end and per stage on a synthetic corpus
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmark import corpus
+from fill_dcm import edit_plan, fill_dcm, parse_argument
+
+# Plans benchmarked: "patch" replaces a value by one of the same length, "rewrite" adds tags so headers are rewritten
+PLANS = {
+    "patch": lambda: parse_argument.InputTags({}, {"PatientID": "00000000"}),
+    "rewrite": lambda: parse_argument.InputTags({"ReferringPhysicianName": None}, {"InstitutionAddress": "1 Benchmark street"}),
+}
+
+# Ways to run adjust_dicom_files()
+SCENARIOS = {
+    "serial": lambda: parse_argument.Options(jobs=1),
+    "parallel": lambda: parse_argument.Options(),
+    "pipeline": lambda: parse_argument.Options(pipeline=True),
+    "stages": lambda: parse_argument.Options(jobs=1),
+}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process and of its children, in MB.
+    ru_maxrss of a process is kept across exec(): the high water mark of the process memory is read from /proc when available,
+    so the memory of the parent process isn't accounted."""
+    self_peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open("/proc/self/status") as status:
+            self_peak_kb = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        pass
+    return max(self_peak_kb, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+
+def remove_outputs(files: List[str]) -> None:
+    """Remove the "_modified" files written by a run"""
+    for file in files:
+        Path(fill_dcm.output_filepath(file)).unlink(missing_ok=True)
+
+
+def time_stages(files: List[str], plan: edit_plan.EditPlan, options: parse_argument.Options) -> Dict[str, float]:
+    """Run the read, adjust and write stages file by file and sum the time spent in each one"""
+    stages = {"read": 0.0, "adjust": 0.0, "write": 0.0}
+    for file in files:
+        start = time.perf_counter()
+        edit = fill_dcm.read_dicom_file(file, plan)
+        read = time.perf_counter()
+        fill_dcm.adjust_dicom_edit(edit, plan, options)
+        adjusted = time.perf_counter()
+        fill_dcm.write_dicom_edit(edit, options)
+        stages["read"] += read - start
+        stages["adjust"] += adjusted - read
+        stages["write"] += time.perf_counter() - adjusted
+    return stages
+
+
+def run_scenario(files: List[str], plan_name: str, scenario: str, results: multiprocessing.Queue) -> None:
+    """Run a scenario in a dedicated process, so its peak RSS is its own, and put its measures in the queue"""
+    logging.basicConfig(level=logging.WARNING)
+    input_tags = PLANS[plan_name]()
+    options = SCENARIOS[scenario]()
+
+    start = time.perf_counter()
+    stages = None
+    if scenario == "stages":
+        plan = edit_plan.compile_plan(fill_dcm.update_data(input_tags))
+        stages = time_stages(files, plan, options)
+    else:
+        fill_dcm.adjust_dicom_files(files, input_tags, options)
+    elapsed = time.perf_counter() - start
+
+    results.put({"elapsed": elapsed, "stages": stages, "peak_rss_mb": peak_rss_mb()})
+
+
+def benchmark(files: List[str], plan_names: List[str], scenarios: List[str], repeat: int) -> List[Dict]:
+    """Run each scenario with each plan and keep the best of `repeat` runs
+
+    Args:
+        files (List[str]): Files of the corpus
+        plan_names (List[str]): Names of the plans (see PLANS)
+        scenarios (List[str]): Names of the scenarios (see SCENARIOS)
+        repeat (int): Number of runs of each scenario
+
+    Returns:
+        List[Dict]: Measures of each scenario
+    """
+    total_bytes = sum(os.path.getsize(file) for file in files)
+    context = multiprocessing.get_context("spawn")
+    measures = []
+    for plan_name in plan_names:
+        for scenario in scenarios:
+            runs = []
+            for _ in range(repeat):
+                results = context.Queue()
+                process = context.Process(target=run_scenario, args=(files, plan_name, scenario, results))
+                process.start()
+                runs.append(results.get())
+                process.join()
+                remove_outputs(files)
+            best = min(runs, key=lambda run: run["elapsed"])
+            measures.append(
+                {
+                    "plan": plan_name,
+                    "scenario": scenario,
+                    "files": len(files),
+                    "bytes": total_bytes,
+                    "seconds": best["elapsed"],
+                    "files_per_second": len(files) / best["elapsed"],
+                    "mb_per_second": total_bytes / (1024 * 1024) / best["elapsed"],
+                    "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+                    "stages": best["stages"],
+                }
+            )
+    return measures
+
+
+def print_measures(measures: List[Dict]) -> None:
+    """Print measures as a table"""
+    print(f"{'plan':<8} {'scenario':<9} {'files':>7} {'seconds':>9} {'files/s':>10} {'MB/s':>9} {'peak RSS MB':>12}")
+    for measure in measures:
+        print(
+            f"{measure['plan']:<8} {measure['scenario']:<9} {measure['files']:>7} {measure['seconds']:>9.3f} "
+            f"{measure['files_per_second']:>10.1f} {measure['mb_per_second']:>9.1f} {measure['peak_rss_mb']:>12.1f}"
+        )
+        if measure["stages"] is not None:
+            print("    " + ", ".join(f"{stage}: {seconds:.3f}s" for stage, seconds in measure["stages"].items()))
+
+
+def main() -> None:
+    """Generate (or reuse) a corpus and benchmark FillDCM on it"""
+    command_line = argparse.ArgumentParser(prog="benchmark", description="Benchmark FillDCM on a synthetic DICOM corpus.")
+    command_line.add_argument("--corpus", help="Directory of the corpus. Generated if it has no DICOM file. Defaults to a temporary directory.")
+    command_line.add_argument("--slices", type=int, default=2000, help="Number of small CT slices. Defaults to 2000.")
+    command_line.add_argument("--slice-size", type=int, default=256, help="Rows and columns of the CT slices. Defaults to 256.")
+    command_line.add_argument("--multiframes", type=int, default=2, help="Number of huge multiframe files. Defaults to 2.")
+    command_line.add_argument("--multiframe-size-mb", type=int, default=128, help="Pixel data size of the multiframe files. Defaults to 128.")
+    command_line.add_argument("--seed", type=int, default=0, help="Seed of the corpus. Defaults to 0.")
+    command_line.add_argument("--plans", nargs="+", choices=list(PLANS), default=list(PLANS), help="Plans to benchmark.")
+    command_line.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS), help="Scenarios to benchmark.")
+    command_line.add_argument("--repeat", type=int, default=3, help="Runs of each scenario, the best one is kept. Defaults to 3.")
+    command_line.add_argument("--json", dest="json_path", help="Write the measures in a JSON file, to compare releases.")
+    args = command_line.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="filldcm-benchmark-") as temporary_directory:
+        directory = Path(args.corpus or temporary_directory)
+        files = sorted(str(file) for file in directory.glob("*.dcm") if not file.stem.endswith("_modified"))
+        if not files:
+            spec = corpus.CorpusSpec(args.slices, args.slice_size, args.multiframes, args.multiframe_size_mb, args.seed)
+            files = corpus.generate_corpus(directory, spec)
+
+        measures = benchmark(files, args.plans, args.scenarios, args.repeat)
+
+    print_measures(measures)
+    if args.json_path is not None:
+        with open(args.json_path, "w") as json_file:
+            json.dump(measures, json_file, indent=2)
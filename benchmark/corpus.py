@@ -0,0 +1,152 @@
+""" corpus: generate reproducible synthetic DICOM corpora for benchmarks
+"""
+
+import random
+from pathlib import Path
+from typing import List
+
+from pydicom import Dataset, FileMetaDataset
+from pydicom.encaps import encapsulate
+from pydicom.uid import (
+    CTImageStorage,
+    DeflatedExplicitVRLittleEndian,
+    EnhancedMRImageStorage,
+    ExplicitVRBigEndian,
+    ExplicitVRLittleEndian,
+    ImplicitVRLittleEndian,
+    JPEGBaseline8Bit,
+    RLELossless,
+    generate_uid,
+)
+
+# Transfer syntaxes of the small slices, used in turn. Compressed pixel data are random bytes
+# encapsulated in fragments: FillDCM never decodes them
+SLICE_TRANSFER_SYNTAXES = [
+    ExplicitVRLittleEndian,
+    ImplicitVRLittleEndian,
+    ExplicitVRBigEndian,
+    DeflatedExplicitVRLittleEndian,
+    JPEGBaseline8Bit,
+    RLELossless,
+]
+
+# Size of the compressed frames, relative to the uncompressed ones
+COMPRESSION_RATIO = 4
+
+
+class CorpusSpec:
+    """Content of a synthetic corpus"""
+
+    def __init__(
+        self,
+        slices: int = 2000,
+        slice_size: int = 256,
+        multiframes: int = 2,
+        multiframe_size_mb: int = 128,
+        seed: int = 0,
+    ):
+        """CorpusSpec constructor
+
+        Args:
+            slices (int, optional): Number of small CT slices. Defaults to 2000.
+            slice_size (int, optional): Rows and columns of the CT slices. Defaults to 256.
+            multiframes (int, optional): Number of huge multiframe MR files. Defaults to 2.
+            multiframe_size_mb (int, optional): Size of the pixel data of each multiframe file, in MB. Defaults to 128.
+            seed (int, optional): Seed of the random content: a spec and a seed always give the same corpus. Defaults to 0.
+        """
+        self.slices: int = slices
+        self.slice_size: int = slice_size
+        self.multiframes: int = multiframes
+        self.multiframe_size_mb: int = multiframe_size_mb
+        self.seed: int = seed
+
+
+def _uid(rng: random.Random) -> str:
+    """Generate a reproducible UID"""
+    return generate_uid(entropy_srcs=[str(rng.getrandbits(64))])
+
+
+def make_dataset(rng: random.Random, sop_class: str, transfer_syntax: str, rows: int, columns: int, frames: int) -> Dataset:
+    """Build a dataset with random patient data and random 16 bits pixel data
+
+    Args:
+        rng (random.Random): Random generator
+        sop_class (str): SOP Class UID
+        transfer_syntax (str): Transfer Syntax UID
+        rows (int): Number of rows
+        columns (int): Number of columns
+        frames (int): Number of frames
+
+    Returns:
+        Dataset: the dataset, with its file meta information
+    """
+    dataset = Dataset()
+    dataset.file_meta = FileMetaDataset()
+    dataset.file_meta.MediaStorageSOPClassUID = sop_class
+    dataset.file_meta.MediaStorageSOPInstanceUID = _uid(rng)
+    dataset.file_meta.TransferSyntaxUID = transfer_syntax
+
+    dataset.SOPClassUID = sop_class
+    dataset.SOPInstanceUID = dataset.file_meta.MediaStorageSOPInstanceUID
+    dataset.StudyInstanceUID = _uid(rng)
+    dataset.SeriesInstanceUID = _uid(rng)
+    dataset.StudyDate = f"{rng.randrange(1990, 2025)}{rng.randrange(1, 13):02}{rng.randrange(1, 29):02}"
+    dataset.Modality = "CT" if sop_class == CTImageStorage else "MR"
+    dataset.PatientName = f"Patient^{rng.randrange(100000):05}"
+    dataset.PatientID = f"{rng.randrange(10**8):08}"
+    dataset.PatientSex = rng.choice(["F", "M", "O"])
+    dataset.InstitutionName = "Synthetic Hospital"
+    dataset.ReferringPhysicianName = ""
+
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = "MONOCHROME2"
+    dataset.Rows = rows
+    dataset.Columns = columns
+    dataset.BitsAllocated = 16
+    dataset.BitsStored = 16
+    dataset.HighBit = 15
+    dataset.PixelRepresentation = 0
+    if frames > 1:
+        dataset.NumberOfFrames = frames
+
+    frame_size = rows * columns * 2
+    if transfer_syntax.is_compressed:
+        fragments = [rng.randbytes(frame_size // COMPRESSION_RATIO) for _ in range(frames)]
+        dataset.PixelData = encapsulate(fragments)
+        dataset["PixelData"].VR = "OB"
+    else:
+        dataset.PixelData = rng.randbytes(frame_size * frames)
+        dataset["PixelData"].VR = "OW"
+    return dataset
+
+
+def generate_corpus(directory: str, spec: CorpusSpec) -> List[str]:
+    """Write a synthetic corpus: small CT slices with mixed transfer syntaxes and huge multiframe MR files
+
+    Args:
+        directory (str): Directory of the corpus, created if needed
+        spec (CorpusSpec): Content of the corpus
+
+    Returns:
+        List[str]: paths to the generated files
+    """
+    rng = random.Random(spec.seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    files = []
+    for index in range(spec.slices):
+        transfer_syntax = SLICE_TRANSFER_SYNTAXES[index % len(SLICE_TRANSFER_SYNTAXES)]
+        dataset = make_dataset(rng, CTImageStorage, transfer_syntax, spec.slice_size, spec.slice_size, 1)
+        files.append(str(directory / f"slice_{index:06}.dcm"))
+        dataset.save_as(files[-1], enforce_file_format=True)
+
+    # Frames of 512x512 16 bits pixels
+    frames = max(1, spec.multiframe_size_mb * 1024 * 1024 // (512 * 512 * 2))
+    for index in range(spec.multiframes):
+        dataset = make_dataset(rng, EnhancedMRImageStorage, ExplicitVRLittleEndian, 512, 512, frames)
+        files.append(str(directory / f"multiframe_{index:03}.dcm"))
+        dataset.save_as(files[-1], enforce_file_format=True)
+        # Pixel data of the next files are generated from scratch
+        del dataset
+    return files
@@ -0,0 +1,126 @@
+""" startup: time the startup of the FillDCM command line with python -X importtime
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# Entry point of the command line
+FILLDCM = str(Path(__file__).resolve().parent.parent / "filldcm.py")
+
+# Command lines timed: they are answered without processing any file
+COMMANDS = {
+    "help": ["--help"],
+    "invalid_argument": ["--jobs", "0", "file.dcm"],
+}
+
+# Modules that shall not be imported to answer these command lines
+DEFERRED_MODULES = ("pydicom", "numpy", "sqlite3", "concurrent.futures.process", "fill_dcm.dicom_io", "fill_dcm.vr_generators")
+
+
+def parse_importtime(stderr: str) -> Dict[str, Dict[str, int]]:
+    """Parse the output of python -X importtime
+
+    Args:
+        stderr (str): Standard error of the command
+
+    Returns:
+        Dict[str, Dict[str, int]]: self and cumulative import times of each module, in microseconds
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us), "top_level": not name[1:].startswith(" ")}
+    return modules
+
+
+def run_command(arguments: List[str], pycache_prefix: str) -> Dict:
+    """Run FillDCM once with python -X importtime
+
+    Args:
+        arguments (List[str]): Arguments of FillDCM
+        pycache_prefix (str): Directory of the bytecode cache. An empty directory means a cold start: every module is compiled
+
+    Returns:
+        Dict: wall time of the command, total import time and import times of each module
+    """
+    environment = dict(os.environ, PYTHONPYCACHEPREFIX=pycache_prefix)
+    # The bytecode cache is what differs between cold and warm starts: it shall be written
+    environment.pop("PYTHONDONTWRITEBYTECODE", None)
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", FILLDCM, *arguments], capture_output=True, text=True, env=environment)
+    seconds = time.perf_counter() - start
+    modules = parse_importtime(process.stderr)
+    return {
+        "seconds": seconds,
+        "import_ms": sum(module["cumulative_us"] for module in modules.values() if module["top_level"]) / 1000,
+        "modules": modules,
+    }
+
+
+def measure(command: str, repeat: int) -> Dict:
+    """Time a command cold (empty bytecode cache) and warm (best of `repeat` runs with the cache filled by the cold run)
+
+    Args:
+        command (str): Name of the command (see COMMANDS)
+        repeat (int): Number of warm runs
+
+    Returns:
+        Dict: measures of the command
+    """
+    with tempfile.TemporaryDirectory(prefix="filldcm-startup-") as pycache_prefix:
+        cold = run_command(COMMANDS[command], pycache_prefix)
+        warm = min((run_command(COMMANDS[command], pycache_prefix) for _ in range(repeat)), key=lambda run: run["seconds"])
+    slowest = sorted(warm["modules"].items(), key=lambda item: item[1]["self_us"], reverse=True)[:10]
+    return {
+        "command": command,
+        "cold_seconds": cold["seconds"],
+        "cold_import_ms": cold["import_ms"],
+        "warm_seconds": warm["seconds"],
+        "warm_import_ms": warm["import_ms"],
+        "deferred_modules_imported": [module for module in DEFERRED_MODULES if module in warm["modules"]],
+        "slowest_imports": [{"module": name, "self_ms": times["self_us"] / 1000} for name, times in slowest],
+    }
+
+
+def main() -> int:
+    """Time the startup of FillDCM. The exit status is 1 if a deferred module is imported or if a threshold is exceeded"""
+    command_line = argparse.ArgumentParser(prog="benchmark.startup", description="Time the startup of the FillDCM command line.")
+    command_line.add_argument("--repeat", type=int, default=5, help="Warm runs of each command, the best one is kept. Defaults to 5.")
+    command_line.add_argument("--max-import-ms", type=float, help="Fail if the warm import time of a command exceeds this threshold.")
+    command_line.add_argument("--json", dest="json_path", help="Write the measures in a JSON file, to compare releases.")
+    args = command_line.parse_args()
+
+    measures = [measure(command, args.repeat) for command in COMMANDS]
+
+    regression = False
+    print(f"{'command':<17} {'cold s':>8} {'cold import ms':>15} {'warm s':>8} {'warm import ms':>15}")
+    for measure_ in measures:
+        print(
+            f"{measure_['command']:<17} {measure_['cold_seconds']:>8.3f} {measure_['cold_import_ms']:>15.1f} "
+            f"{measure_['warm_seconds']:>8.3f} {measure_['warm_import_ms']:>15.1f}"
+        )
+        print("    " + ", ".join(f"{module['module']}: {module['self_ms']:.1f}ms" for module in measure_["slowest_imports"][:5]))
+        if measure_["deferred_modules_imported"]:
+            print(f"    Modules imported at startup: {', '.join(measure_['deferred_modules_imported'])}")
+            regression = True
+        if args.max_import_ms is not None and measure_["warm_import_ms"] > args.max_import_ms:
+            print(f"    Import time above {args.max_import_ms}ms")
+            regression = True
+
+    if args.json_path is not None:
+        with open(args.json_path, "w") as json_file:
+            json.dump(measures, json_file, indent=2)
+    return 1 if regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
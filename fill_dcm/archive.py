@@ -0,0 +1,425 @@
+""" archive: adjust the DICOM members of ZIP and TAR archives, streamed from the input archive to a new archive
+"""
+
+import copy
+import io
+import logging
+import os
+import tarfile
+import time
+import zipfile
+from collections import deque
+from typing import IO, Any, Dict, Iterator, List, NamedTuple, Tuple
+
+from pydicom import dcmread
+from pydicom.errors import InvalidDicomError
+
+from fill_dcm import dicom_io, durability, edit_plan, fill_dcm, parse_argument
+
+logger = logging.getLogger()
+
+# Suffixes of the archives, the longest first, and their format
+ARCHIVE_SUFFIXES = {
+    ".tar.gz": "tar",
+    ".tar.bz2": "tar",
+    ".tar.xz": "tar",
+    ".tgz": "tar",
+    ".tar": "tar",
+    ".zip": "zip",
+}
+
+# Members processed ahead of the writer by the worker processes, per worker
+PREFETCH_PER_JOB = 4
+
+# Size of the chunks copied from a member of the input archive to the output archive
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def archive_suffix(path: str) -> str:
+    """Return the archive suffix of a path (".zip", ".tar.gz"...), None if it isn't an archive"""
+    name = path.lower()
+    return next((suffix for suffix in ARCHIVE_SUFFIXES if name.endswith(suffix)), None)
+
+
+def is_archive(path: str) -> bool:
+    """Indicate if a path is a ZIP or TAR archive, from its suffix"""
+    return archive_suffix(path) is not None
+
+
+def output_archive_path(path: str, overwrite_output_file: bool = False) -> str:
+    """Output path of an archive: '_modified' is inserted before its suffix unless it is overwritten (see fill_dcm.output_filepath())"""
+    if overwrite_output_file:
+        return path
+    suffix = archive_suffix(path)
+    return f"{path[: len(path) - len(suffix)]}_modified{path[len(path) - len(suffix):]}"
+
+
+def random_access(path: str) -> bool:
+    """Indicate if the members of an archive can be read in any order: ZIP and uncompressed TAR archives"""
+    return ARCHIVE_SUFFIXES[archive_suffix(path)] == "zip" or archive_suffix(path) == ".tar"
+
+
+class PreparedMember(NamedTuple):
+    """Member adjusted in memory: the bytes of its header, followed by the bytes of the input member from tail_offset"""
+
+    # None if the member isn't a DICOM file or can't be adjusted: it is copied as is
+    data: bytes
+    # Offset of the bytes of the input member following data. None if data is the whole member
+    tail_offset: int
+    result: fill_dcm.FileResult
+
+
+def prepare_member(stream: IO[bytes], name: str, plan: edit_plan.EditPlan, options: parse_argument.Options) -> PreparedMember:
+    """Read and adjust a DICOM member. Only its header is read and encoded if its pixel data can be copied as is
+
+    Args:
+        stream (IO[bytes]): Seekable stream of the member
+        name (str): Name of the member, reported in the result
+        plan (EditPlan): Plan of the tags to replace/filled (see fill_dcm.run_plan())
+        options (Options): Options
+
+    Returns:
+        PreparedMember: the member to write in the output archive
+    """
+    timings = {}
+    start = time.perf_counter()
+    try:
+        dataset = dcmread(stream, stop_before_pixels=True)
+        tail_offset = stream.tell()
+        transfer_syntax = dataset.file_meta.get("TransferSyntaxUID") if hasattr(dataset, "file_meta") else None
+        if (transfer_syntax is not None and transfer_syntax.is_deflated) or not dicom_io.can_passthrough(tail_offset, plan.tags):
+            stream.seek(0)
+            dataset, tail_offset = dcmread(stream), None
+    except InvalidDicomError as error:
+        logger.debug("Not a DICOM file, copied as is: %s: %s", name, error)
+        timings["read"] = time.perf_counter() - start
+        return PreparedMember(None, None, fill_dcm.FileResult(name, fill_dcm.FileStatus.SKIPPED, None, timings))
+    except Exception as error:
+        logger.error("Invalid file to read: %s: %s", name, error)
+        timings["read"] = time.perf_counter() - start
+        return PreparedMember(
+            None, None, fill_dcm.FileResult(name, fill_dcm.FileStatus.READ_ERROR, str(error), timings, error_type=type(error).__name__)
+        )
+    timings["read"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        changes = fill_dcm.adjust_dicom_dataset(dataset, fill_dcm.dataset_plan(dataset, plan, options), options.recursive)
+        buffer = io.BytesIO()
+        dataset.save_as(buffer)
+    except Exception as error:
+        logger.error("Can't write the DICOM file: %s: %s", name, error)
+        timings["adjust"] = time.perf_counter() - start
+        return PreparedMember(
+            None, None, fill_dcm.FileResult(name, fill_dcm.FileStatus.WRITE_ERROR, str(error), timings, error_type=type(error).__name__)
+        )
+    timings["adjust"] = time.perf_counter() - start
+    return PreparedMember(buffer.getvalue(), tail_offset, fill_dcm.FileResult(name, fill_dcm.FileStatus.REWRITTEN, None, timings, changes=changes))
+
+
+class ArchiveReader:
+    """Members of a ZIP or TAR archive, with the same interface for both formats"""
+
+    def __init__(self, path: str):
+        """ArchiveReader constructor. The archive is opened in stream mode if it is a compressed TAR archive
+
+        Args:
+            path (str): Path to the archive
+        """
+        self.path: str = path
+        self.is_zip: bool = ARCHIVE_SUFFIXES[archive_suffix(path)] == "zip"
+        if self.is_zip:
+            self._archive = zipfile.ZipFile(path)
+        else:
+            self._archive = tarfile.open(path, "r:" if random_access(path) else "r|*")
+        self._members: Dict[str, Any] = None
+
+    def __iter__(self) -> Iterator[Any]:
+        """Iterate over the members (ZipInfo or TarInfo) in the order of the archive"""
+        return iter(self._archive.infolist() if self.is_zip else self._archive)
+
+    def member(self, name: str) -> Any:
+        """Return a member by its name. The index of the members is built at the first call"""
+        if self._members is None:
+            self._members = {member.filename if self.is_zip else member.name: member for member in self}
+        return self._members[name]
+
+    def name(self, member: Any) -> str:
+        return member.filename if self.is_zip else member.name
+
+    def size(self, member: Any) -> int:
+        return member.file_size if self.is_zip else member.size
+
+    def is_file(self, member: Any) -> bool:
+        return not member.is_dir() if self.is_zip else member.isfile()
+
+    def open(self, member: Any) -> IO[bytes]:
+        """Open a member. The stream of a member of a compressed TAR archive can't go back: the bytes read are kept (see _ReplayStream)"""
+        if self.is_zip:
+            return self._archive.open(member)
+        stream = self._archive.extractfile(member)
+        return stream if random_access(self.path) else _ReplayStream(stream, member.size)
+
+    def close(self) -> None:
+        self._archive.close()
+
+
+class _ReplayStream(io.RawIOBase):
+    """Seekable stream of a member of a compressed TAR archive, whose stream only goes forward. The bytes read are kept, to be read
+    again by dcmread(), until release(): only the header of a member whose pixel data are copied as is stays in memory"""
+
+    def __init__(self, stream: IO[bytes], size: int):
+        """_ReplayStream constructor
+
+        Args:
+            stream (IO[bytes]): Forward only stream of the member
+            size (int): Size of the member
+        """
+        self._stream = stream
+        self._size: int = size
+        # Bytes read from the stream, from the offset _start of the member: the stream is at _start + len(_buffer)
+        self._buffer = bytearray()
+        self._start: int = 0
+        self._position: int = 0
+        self._released: bool = False
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        position = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence] + offset
+        if position < self._start:
+            raise io.UnsupportedOperation(f"Bytes before {self._start} have been released")
+        self._position = position
+        return position
+
+    def release(self, offset: int = None) -> None:
+        """Stop keeping the bytes read and forget those before offset, all of them if offset is None"""
+        self._released = True
+        end = self._start + len(self._buffer)
+        offset = end if offset is None else max(self._start, min(offset, end))
+        del self._buffer[: offset - self._start]
+        self._start = offset
+
+    def readinto(self, buffer) -> int:
+        count = 0
+        while count < len(buffer):
+            data = self._read(len(buffer) - count)
+            if not data:
+                break
+            buffer[count : count + len(data)] = data
+            count += len(data)
+        return count
+
+    def _read(self, size: int) -> bytes:
+        """Read up to `size` bytes from the position: from the kept bytes, or from the stream, past the bytes skipped by a seek"""
+        end = self._start + len(self._buffer)
+        if self._position < end:
+            offset = self._position - self._start
+            data = bytes(self._buffer[offset : offset + size])
+        else:
+            data = self._stream.read(self._position - end + size)
+            if self._released:
+                self._buffer.clear()
+                self._start = end + len(data)
+            else:
+                self._buffer += data
+            data = data[self._position - end :]
+        self._position += len(data)
+        return data
+
+    def close(self) -> None:
+        self._stream.close()
+        super().close()
+
+
+class ArchiveWriter:
+    """New ZIP or TAR archive, with the format and compression of the input archive"""
+
+    def __init__(self, path: str, reader: ArchiveReader):
+        """ArchiveWriter constructor
+
+        Args:
+            path (str): Path to the new archive
+            reader (ArchiveReader): Input archive
+        """
+        self.is_zip: bool = reader.is_zip
+        if self.is_zip:
+            self._archive = zipfile.ZipFile(path, "w")
+        else:
+            compression = {".tar.gz": "gz", ".tgz": "gz", ".tar.bz2": "bz2", ".tar.xz": "xz"}.get(archive_suffix(reader.path), "")
+            self._archive = tarfile.open(path, f"w:{compression}")
+
+    def write(self, member: Any, size: int, chunks: Iterator[bytes]) -> None:
+        """Write a member with the metadata of an input member
+
+        Args:
+            member (Any): Input member (ZipInfo or TarInfo)
+            size (int): Size of the data of the member
+            chunks (Iterator[bytes]): Data of the member, `size` bytes in total
+        """
+        if self.is_zip:
+            info = zipfile.ZipInfo(member.filename, member.date_time)
+            info.compress_type = member.compress_type
+            info.external_attr = member.external_attr
+            if member.is_dir():
+                self._archive.writestr(info, b"")
+                return
+            with self._archive.open(info, "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as destination:
+                for chunk in chunks:
+                    destination.write(chunk)
+            return
+        info = copy.copy(member)
+        info.size = size
+        self._archive.addfile(info, io.BufferedReader(_ChunksReader(chunks)) if member.isfile() else None)
+
+    def close(self) -> None:
+        self._archive.close()
+
+
+class _ChunksReader(io.RawIOBase):
+    """Raw file object reading an iterator of chunks. tarfile.addfile() expects full reads: it is buffered"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            self._pending = next(self._chunks, b"")
+            if not self._pending:
+                return 0
+        count = min(len(buffer), len(self._pending))
+        buffer[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+
+def _member_chunks(stream: IO[bytes], data: bytes, tail_offset: int) -> Iterator[bytes]:
+    """Chunks of an output member: data, then the input member from tail_offset"""
+    if data:
+        yield data
+    if tail_offset is not None:
+        stream.seek(tail_offset)
+        while chunk := stream.read(COPY_CHUNK_SIZE):
+            yield chunk
+
+
+# Archives opened by a worker process, by path. Their index of members is built once per worker
+_worker_readers: Dict[Tuple[int, str], ArchiveReader] = {}
+
+
+def _prepare_member_in_worker(path: str, name: str) -> PreparedMember:
+    """Prepare a member of an archive with random access from a worker process, with the plan received at the worker initialization"""
+    key = (os.getpid(), path)
+    if key not in _worker_readers:
+        _worker_readers[key] = ArchiveReader(path)
+    reader = _worker_readers[key]
+    with reader.open(reader.member(name)) as stream:
+        return prepare_member(stream, os.path.join(path, name), fill_dcm._worker_plan, fill_dcm._worker_options)
+
+
+def _prepared_members(
+    reader: ArchiveReader, plan: edit_plan.EditPlan, options: parse_argument.Options
+) -> Iterator[Tuple[Any, PreparedMember, IO[bytes]]]:
+    """Yield the members of the archive in order with, for the files, their prepared version and their open stream.
+    Members of archives with random access are prepared by a pool of processes, a bounded number of them ahead of the writer:
+    their stream is opened again by the writer. Members of compressed TAR archives are prepared in order, their stream is kept
+    and read on by the writer."""
+    # Values generated per group are cached by the process adjusting the members: with groups, they are all adjusted by the writer
+    jobs = options.jobs if random_access(reader.path) and options.group_by is None else 1
+    if jobs <= 1:
+        for member in reader:
+            if not reader.is_file(member):
+                yield member, None, None
+                continue
+            stream = reader.open(member)
+            prepared = prepare_member(stream, os.path.join(reader.path, reader.name(member)), plan, options)
+            if isinstance(stream, _ReplayStream):
+                # Only the bytes copied to the output archive are kept: all of them if the member is copied as is
+                stream.release(0 if prepared.data is None else prepared.tail_offset)
+            yield member, prepared, stream
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # The plan is sent once to each worker, only member names and prepared members go through the pool afterward
+    pending = deque()
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=fill_dcm._init_worker,
+        initargs=(plan, options, logging.getLogger().getEffectiveLevel()),
+    ) as executor:
+        for member in reader:
+            future = None
+            if reader.is_file(member):
+                future = executor.submit(_prepare_member_in_worker, reader.path, reader.name(member))
+            pending.append((member, future))
+            while len(pending) > jobs * PREFETCH_PER_JOB:
+                member, future = pending.popleft()
+                yield member, future.result() if future is not None else None, None
+        while pending:
+            member, future = pending.popleft()
+            yield member, future.result() if future is not None else None, None
+
+
+def adjust_archive(path: str, plan: edit_plan.EditPlan, options: parse_argument.Options) -> List[fill_dcm.FileResult]:
+    """Adjust the DICOM members of an archive into a new archive, without extracting them. Members that aren't
+    DICOM files are copied as is and reported as skipped. The pixel data of the members are streamed from the input archive to the output archive.
+
+    Args:
+        path (str): Path to the archive
+        plan (EditPlan): Plan of the tags to replace/filled (see fill_dcm.run_plan())
+        options (Options): Options
+
+    Returns:
+        List[FileResult]: results of the members, an archive error is reported as a READ_ERROR of the archive itself
+    """
+    logger.info(f"Work on archive: {path}")
+    output_path = output_archive_path(path, options.overwrite_output_file)
+    results = []
+    reader = None
+    try:
+        reader = ArchiveReader(path)
+        # The new archive is written next to the output and renamed once complete, and synced first with the batch durability policy
+        with durability.atomic_output(output_path, path, sync=options.durability == durability.BATCH_SYNC) as target:
+            writer = ArchiveWriter(target, reader)
+            try:
+                for member, prepared, stream in _prepared_members(reader, plan, options):
+                    if prepared is None:
+                        writer.write(member, 0, iter(()))
+                        continue
+                    start = time.perf_counter()
+                    with stream if stream is not None else reader.open(member) as stream:
+                        if prepared.data is None:
+                            # Not a DICOM member, or one that can't be adjusted: copied as is
+                            size = reader.size(member)
+                            writer.write(member, size, _member_chunks(stream, b"", 0))
+                        else:
+                            size = len(prepared.data) + (reader.size(member) - prepared.tail_offset if prepared.tail_offset is not None else 0)
+                            writer.write(member, size, _member_chunks(stream, prepared.data, prepared.tail_offset))
+                    prepared.result.timings["write"] = time.perf_counter() - start
+                    prepared.result.bytes_read = reader.size(member)
+                    prepared.result.bytes_written = size
+                    results.append(prepared.result)
+            finally:
+                writer.close()
+        # The members are synced with their archive
+        for result in results:
+            result.output_file = output_path
+    except Exception as error:
+        logger.error(f"Can't adjust the archive {path}: {error}")
+        results.append(fill_dcm.FileResult(path, fill_dcm.FileStatus.READ_ERROR, str(error), error_type=type(error).__name__))
+    finally:
+        if reader is not None:
+            reader.close()
+    return results
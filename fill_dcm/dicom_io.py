@@ -0,0 +1,416 @@
+""" dicom_io: read and write DICOM files without loading their pixel data in memory
+"""
+
+import errno
+import mmap
+import os
+from contextlib import contextmanager
+from typing import IO, Any, Iterable, Iterator, List, NamedTuple, Tuple
+
+from pydicom import DataElement, Dataset, datadict, dcmread
+from pydicom.dataelem import RawDataElement
+from pydicom.filebase import DicomBytesIO
+from pydicom.filereader import read_partial
+from pydicom.filewriter import write_data_element
+from pydicom.tag import Tag
+from pydicom.valuerep import EXPLICIT_VR_LENGTH_32
+
+from fill_dcm import durability
+
+# Elements from this tag are never parsed: (7FE0,0008) FloatPixelData, (7FE0,0009) DoubleFloatPixelData and (7FE0,0010) PixelData
+FIRST_PIXEL_DATA_TAG = Tag(0x7FE0, 0x0008)
+
+# Size of the chunks used when no kernel-side copy is available
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# ioctl request to clone a file on copy-on-write filesystems (btrfs, XFS with reflink, ...): _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# Errors of the FICLONE ioctl meaning that cloning isn't possible between two files
+CLONE_UNSUPPORTED_ERRORS = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF}
+
+# Devices (st_dev) on which cloning failed once: it isn't tried again on them
+_clone_unsupported_devices = set()
+
+# Length of sequences and items encoded with delimiters
+UNDEFINED_LENGTH = 0xFFFFFFFF
+
+# VRs whose trailing spaces are not significant: a shorter value can be padded to the length of the value it replaces
+SPACE_PADDED_VRS = {"AE", "CS", "DS", "IS", "LO", "LT", "PN", "SH", "ST", "UC", "UT"}
+
+
+class Patch(NamedTuple):
+    """Bytes to write at a given offset of a file to replace the value of an element"""
+
+    tag: int
+    offset: int
+    data: bytes
+
+
+@contextmanager
+def open_source(file: str, memory_map: bool = False, sequential: bool = False) -> Iterator[IO[bytes]]:
+    """Open a file to read, as a memory-mapped view if requested. Files that can't be mapped, such as empty files
+    or pipes, are read with a regular file object.
+
+    Args:
+        file (str): Path to the file
+        memory_map (bool, optional): Set to True to read the file through a read-only memory map. Defaults to False.
+        sequential (bool, optional): Set to True if the whole file is read in order: the kernel reads ahead. Defaults to False.
+
+    Returns:
+        Iterator[IO[bytes]]: the mmap object or the file object, both readable and seekable
+    """
+    with open(file, "rb") as file_object:
+        mapping = _map_file(file_object.fileno(), 0, 0) if memory_map else None
+        if mapping is None:
+            yield file_object
+            return
+        with mapping:
+            if sequential and hasattr(mapping, "madvise"):
+                mapping.madvise(mmap.MADV_SEQUENTIAL)
+            yield mapping
+
+
+def _map_file(file_descriptor: int, offset: int, length: int) -> mmap.mmap:
+    """Map `length` bytes of a file from `offset`, a multiple of mmap.ALLOCATIONGRANULARITY, in memory.
+    A length of 0 maps up to the end of the file.
+
+    Returns:
+        mmap.mmap: the read-only mapping, or None if the file can't be mapped
+    """
+    try:
+        return mmap.mmap(file_descriptor, length, access=mmap.ACCESS_READ, offset=offset)
+    except (ValueError, OSError):
+        return None
+
+
+def read_header(file: str, memory_map: bool = False) -> Tuple[Dataset, int]:
+    """Read a DICOM file up to its pixel data.
+
+    Args:
+        file (str): Path to the DICOM file
+        memory_map (bool, optional): Set to True to parse the header from a memory-mapped view of the file. Defaults to False.
+
+    Returns:
+        Tuple[Dataset, int]: The dataset without its pixel data and the offset of the pixel data in the file.
+        The offset is None if the remaining bytes of the file can't be copied as is, e.g. for a deflated transfer syntax.
+    """
+    with open_source(file, memory_map) as source:
+        dataset = dcmread(source, stop_before_pixels=True)
+        pixel_data_offset = source.tell()
+
+    transfer_syntax = dataset.file_meta.get("TransferSyntaxUID") if hasattr(dataset, "file_meta") else None
+    if transfer_syntax is not None and transfer_syntax.is_deflated:
+        # The file object is positioned in the inflated stream, not in the file
+        return dataset, None
+    return dataset, pixel_data_offset
+
+
+def read_tags(file: str, tags: Iterable[Tag], memory_map: bool = False) -> Dataset:
+    """Read only some elements of a DICOM file: the other elements are skipped without being read and the parsing stops
+    after the highest tag. The elements read are left raw, as with read_header()
+
+    Args:
+        file (str): Path to the DICOM file
+        tags (Iterable[Tag]): Tags to read. SpecificCharacterSet is always read
+        memory_map (bool, optional): Set to True to parse the file from a memory-mapped view. Defaults to False.
+
+    Returns:
+        Dataset: The dataset with the elements of the tags present in the file
+    """
+    tags = list(tags)
+    last_tag = max(tags)
+    with open_source(file, memory_map) as source:
+        return read_partial(source, stop_when=lambda tag, vr, length: tag > last_tag, specific_tags=tags)
+
+
+def read_dataset(file: str, memory_map: bool = False) -> Dataset:
+    """Read a whole DICOM file, pixel data included.
+
+    Args:
+        file (str): Path to the DICOM file
+        memory_map (bool, optional): Set to True to parse the file from a memory-mapped view. Defaults to False.
+
+    Returns:
+        Dataset: The dataset
+    """
+    with open_source(file, memory_map, sequential=True) as source:
+        return dcmread(source)
+
+
+def can_passthrough(pixel_data_offset: int, tags: Iterable[int]) -> bool:
+    """Indicate if the bytes following the header can be copied as is from the input file to the output file.
+
+    Args:
+        pixel_data_offset (int): Offset returned by read_header()
+        tags (Iterable[int]): Tags modified in the header
+
+    Returns:
+        bool: True if the header can be written on its own and followed by the raw bytes of the input
+    """
+    return pixel_data_offset is not None and all(Tag(tag) < FIRST_PIXEL_DATA_TAG for tag in tags)
+
+
+def copy_file_range(source_fd: int, destination_fd: int, offset: int, count: int) -> None:
+    """Copy `count` bytes of a source file from `offset` to the current position of the destination file.
+    The copy is done by the kernel with copy_file_range() or sendfile() when available, without going through Python memory.
+    Otherwise the source is memory-mapped and written from memoryviews of the mapping, and read in chunks as a last resort.
+
+    Args:
+        source_fd (int): File descriptor of the source file
+        destination_fd (int): File descriptor of the destination file
+        offset (int): Offset of the first byte to copy from the source
+        count (int): Number of bytes to copy
+    """
+    # The position of the destination is the reference: it is also right if a copy fails midway
+    start = os.lseek(destination_fd, 0, os.SEEK_CUR)
+    for kernel_copy in (_copy_with_copy_file_range, _copy_with_sendfile):
+        copied = os.lseek(destination_fd, 0, os.SEEK_CUR) - start
+        try:
+            kernel_copy(source_fd, destination_fd, offset + copied, count - copied)
+        except (AttributeError, OSError):
+            # Not available on this platform or not supported between these files
+            continue
+        if os.lseek(destination_fd, 0, os.SEEK_CUR) - start >= count:
+            return
+
+    copied = os.lseek(destination_fd, 0, os.SEEK_CUR) - start
+    if copied < count and _copy_with_memory_map(source_fd, destination_fd, offset + copied, count - copied):
+        return
+    copied = os.lseek(destination_fd, 0, os.SEEK_CUR) - start
+    while copied < count:
+        chunk = os.pread(source_fd, min(COPY_CHUNK_SIZE, count - copied), offset + copied)
+        if not chunk:
+            break
+        os.write(destination_fd, chunk)
+        copied += len(chunk)
+
+
+def _copy_with_copy_file_range(source_fd: int, destination_fd: int, offset: int, count: int) -> None:
+    """Copy with os.copy_file_range() to the current position of the destination"""
+    copied = 0
+    while copied < count:
+        written = os.copy_file_range(source_fd, destination_fd, count - copied, offset + copied)
+        if written == 0:
+            break
+        copied += written
+
+
+def _copy_with_sendfile(source_fd: int, destination_fd: int, offset: int, count: int) -> None:
+    """Copy with os.sendfile() to the current position of the destination"""
+    copied = 0
+    while copied < count:
+        written = os.sendfile(destination_fd, source_fd, offset + copied, count - copied)
+        if written == 0:
+            break
+        copied += written
+
+
+def _copy_with_memory_map(source_fd: int, destination_fd: int, offset: int, count: int) -> bool:
+    """Copy memoryviews of a mapping of the source to the current position of the destination: the bytes are not copied in Python objects
+
+    Returns:
+        bool: False if the source can't be mapped
+    """
+    # The offset of a mapping is aligned on the allocation granularity
+    aligned_offset = offset - offset % mmap.ALLOCATIONGRANULARITY
+    mapping = _map_file(source_fd, aligned_offset, offset - aligned_offset + count)
+    if mapping is None:
+        return False
+    with mapping, memoryview(mapping) as view:
+        copied = offset - aligned_offset
+        end = copied + count
+        while copied < end:
+            with view[copied : min(copied + COPY_CHUNK_SIZE, end)] as chunk:
+                copied += os.write(destination_fd, chunk)
+    return True
+
+
+def clone_file(source_fd: int, destination_fd: int) -> bool:
+    """Clone a file with the FICLONE ioctl: the destination shares the extents of the source and no data block is copied.
+
+    Args:
+        source_fd (int): File descriptor of the source file
+        destination_fd (int): File descriptor of the destination file, opened for writing
+
+    Returns:
+        bool: True if the file has been cloned, False if cloning isn't supported for these files
+    """
+    device = os.fstat(destination_fd).st_dev
+    if device in _clone_unsupported_devices:
+        return False
+    try:
+        import fcntl
+
+        fcntl.ioctl(destination_fd, FICLONE, source_fd)
+    except ImportError:
+        _clone_unsupported_devices.add(device)
+        return False
+    except OSError as error:
+        if error.errno not in CLONE_UNSUPPORTED_ERRORS:
+            raise
+        # EXDEV depends on the source: the destination filesystem may still support cloning
+        if error.errno != errno.EXDEV:
+            _clone_unsupported_devices.add(device)
+        return False
+    return True
+
+
+def copy_file(source_file: str, output_file: str) -> bool:
+    """Copy a file, by cloning it if the filesystem supports it, otherwise with a kernel-side copy.
+
+    Args:
+        source_file (str): Path to the file to copy
+        output_file (str): Path to the copy
+
+    Returns:
+        bool: True if the copy is a clone sharing the extents of the source
+    """
+    with open(source_file, "rb") as source, open(output_file, "wb") as destination:
+        if clone_file(source.fileno(), destination.fileno()):
+            return True
+        copy_file_range(source.fileno(), destination.fileno(), 0, os.fstat(source.fileno()).st_size)
+    return False
+
+
+def write_header_and_passthrough(dataset: Dataset, source_file: str, pixel_data_offset: int, output_file: str, deferred: bool = False) -> str:
+    """Write a dataset read by read_header() followed by the bytes of the source file starting at the pixel data.
+    The output is written in a temporary file renamed to the output file, which may be the source file.
+
+    Args:
+        dataset (Dataset): Dataset, without pixel data, to write
+        source_file (str): Path to the file the dataset has been read from
+        pixel_data_offset (int): Offset of the pixel data in the source file
+        output_file (str): Path to the output file
+        deferred (bool, optional): Set to True to leave the rename to the durability policy (see durability.atomic_output()). Defaults to False.
+
+    Returns:
+        str: the temporary file to rename with deferred, None otherwise
+    """
+    with durability.atomic_output(output_file, source_file, deferred) as target:
+        with open(source_file, "rb") as source, open(target, "wb") as destination:
+            dataset.save_as(destination)
+            destination.flush()
+            tail_size = os.fstat(source.fileno()).st_size - pixel_data_offset
+            copy_file_range(source.fileno(), destination.fileno(), pixel_data_offset, tail_size)
+    return target if deferred else None
+
+
+def encode_element_value(
+    tag: int, vr: str, value: Any, is_implicit_vr: bool = False, is_little_endian: bool = True, encodings: List[str] = None
+) -> bytes:
+    """Encode the value of an element, padding included.
+
+    Args:
+        tag (int): Tag of the element
+        vr (str): VR of the element
+        value (Any): Value to encode
+        is_implicit_vr (bool, optional): Encoding of the file. Defaults to False.
+        is_little_endian (bool, optional): Encoding of the file. Defaults to True.
+        encodings (List[str], optional): Python encodings of the character set of the file. Defaults to the DICOM default character set.
+
+    Returns:
+        bytes: The encoded value, without the tag, VR and length of the element
+    """
+    buffer = DicomBytesIO()
+    buffer.is_implicit_VR = is_implicit_vr
+    buffer.is_little_endian = is_little_endian
+    write_data_element(buffer, DataElement(tag, vr, value), encodings)
+
+    header_length = 8 if is_implicit_vr or vr not in EXPLICIT_VR_LENGTH_32 else 12
+    return buffer.getvalue()[header_length:]
+
+
+def encode_value(dataset: Dataset, tag: int, vr: str, value: Any) -> bytes:
+    """Encode the value of an element as it would be written in the file of the dataset, padding included.
+
+    Args:
+        dataset (Dataset): Dataset read from a file. Its encoding and character set are used
+        tag (int): Tag of the element
+        vr (str): VR of the element
+        value (Any): Value to encode
+
+    Returns:
+        bytes: The encoded value, without the tag, VR and length of the element
+    """
+    is_implicit_vr, is_little_endian = dataset.original_encoding
+    return encode_element_value(tag, vr, value, is_implicit_vr, is_little_endian, dataset._character_set)
+
+
+def plan_patches(dataset: Dataset, entries: Iterable) -> List[Patch]:
+    """Compute the patches to apply on the file of a dataset read by read_header() to set values of existing elements.
+    A value can be patched only if its encoded length is the length of the current value, or if it is shorter and its VR
+    can be padded with spaces.
+
+    Args:
+        dataset (Dataset): Dataset read by read_header(), not modified yet
+        entries (Iterable[PlanEntry]): Entries of an edit plan with the values to set
+
+    Returns:
+        List[Patch]: The patches to apply, or None if at least one value can't be patched in place
+    """
+    is_little_endian = dataset.original_encoding[1]
+    patches = []
+    for entry in entries:
+        if entry.tag not in dataset:
+            return None
+        raw_element = dataset.get_item(entry.tag)
+        if not isinstance(raw_element, RawDataElement) or raw_element.value_tell is None or raw_element.length == UNDEFINED_LENGTH:
+            return None
+
+        vr = raw_element.VR or entry.vr
+        if entry.encoded is not None and is_little_endian and vr == entry.vr:
+            data = entry.encoded
+        else:
+            data = encode_value(dataset, entry.tag, vr, entry.value)
+        if len(data) < raw_element.length and vr in SPACE_PADDED_VRS:
+            data = data.ljust(raw_element.length, b" ")
+        if len(data) != raw_element.length:
+            return None
+        patches.append(Patch(entry.tag, raw_element.value_tell, data))
+    return patches
+
+
+def is_sequence(dataset: Dataset, tag: Tag) -> bool:
+    """Indicate if an element of a dataset is a sequence, without parsing the value of a raw element
+
+    Args:
+        dataset (Dataset): Dataset of the element
+        tag (Tag): Tag of the element
+
+    Returns:
+        bool: True if the element is a sequence
+    """
+    vr = dataset.get_item(tag).VR
+    if vr is None:
+        # Raw elements of implicit VR datasets: the VR is taken from the dictionary, private sequences are not recognized
+        vr = datadict.dictionary_VR(tag) if datadict.dictionary_has_tag(tag) else None
+    return vr == "SQ"
+
+
+def is_unchanged(dataset: Dataset, patch: Patch) -> bool:
+    """Indicate if a patch computed by plan_patches() writes the bytes already in the file
+
+    Args:
+        dataset (Dataset): Dataset the patch has been computed for
+        patch (Patch): Patch of one of its elements
+
+    Returns:
+        bool: True if the value of the element is left as is by the patch
+    """
+    return dataset.get_item(patch.tag).value == patch.data
+
+
+def apply_patches(file: str, patches: List[Patch]) -> None:
+    """Write patches computed by plan_patches() in a file
+
+    Args:
+        file (str): Path to the file to patch
+        patches (List[Patch]): Patches to write
+    """
+    file_descriptor = os.open(file, os.O_RDWR)
+    try:
+        for patch in patches:
+            os.pwrite(file_descriptor, patch.data, patch.offset)
+    finally:
+        os.close(file_descriptor)
@@ -0,0 +1,157 @@
+""" discovery: stream the paths of the files to process, from the command line, from directories walked recursively and from path lists
+"""
+
+import fnmatch
+import itertools
+import logging
+import os
+import re
+import sys
+import time
+from typing import Iterable, Iterator, List, Pattern
+
+logger = logging.getLogger()
+
+# Names of the files written by FillDCM next to its inputs, found again when a directory is walked during the run or in a later run:
+# copies, with "_modified" before their suffix (see fill_dcm.output_filepath()), and temporary files of the writes (see durability.atomic_output())
+OUTPUT_NAME = re.compile(r".*_modified(\.tar)?(\.[^.]*)?")
+TEMPORARY_NAME = re.compile(r"\..*\.tmp")
+
+
+def compile_patterns(patterns: List[str]) -> Pattern:
+    """Compile glob patterns once into a single regular expression
+
+    Args:
+        patterns (List[str]): Glob patterns, such as "*.dcm"
+
+    Returns:
+        Pattern: the expression matching any of the patterns, None if there is no pattern
+    """
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns))
+
+
+class PathFilter:
+    """Include and exclude patterns of the files found in directories. A pattern matches the name of a file
+    or its path relative to the walked directory. Temporary files of FillDCM are always skipped"""
+
+    def __init__(self, include: List[str] = None, exclude: List[str] = None, skip_outputs: bool = False):
+        """PathFilter constructor
+
+        Args:
+            include (List[str], optional): Patterns of the files to process. Defaults to None, all files.
+            exclude (List[str], optional): Patterns of the files and directories to skip. Defaults to None.
+            skip_outputs (bool, optional): Set to True to skip the copies written by FillDCM (see OUTPUT_NAME). Defaults to False.
+        """
+        self.include: Pattern = compile_patterns(include)
+        self.exclude: Pattern = compile_patterns(exclude)
+        self.skip_outputs: bool = skip_outputs
+
+    def excluded(self, name: str, relative_path: str) -> bool:
+        """Indicate if a file or a directory matches an exclude pattern"""
+        return self.exclude is not None and (self.exclude.match(name) is not None or self.exclude.match(relative_path) is not None)
+
+    def accepts(self, name: str, relative_path: str) -> bool:
+        """Indicate if a file found in a directory is processed"""
+        if TEMPORARY_NAME.fullmatch(name) is not None or (self.skip_outputs and OUTPUT_NAME.fullmatch(name) is not None):
+            return False
+        if self.include is not None and self.include.match(name) is None and self.include.match(relative_path) is None:
+            return False
+        return not self.excluded(name, relative_path)
+
+
+def walk(directory: str, path_filter: PathFilter = None) -> Iterator[str]:
+    """Yield the files of a directory and of its subdirectories as they are listed by os.scandir(), without listing the whole tree first.
+    Symbolic links to directories are not followed
+
+    Args:
+        directory (str): Path to the directory
+        path_filter (PathFilter, optional): Patterns of the files to yield. Defaults to None, all files.
+
+    Returns:
+        Iterator[str]: paths to the files
+    """
+    path_filter = path_filter if path_filter is not None else PathFilter()
+    prefix_length = len(os.path.join(directory, ""))
+    directories = [directory]
+    while directories:
+        current = directories.pop()
+        subdirectories = []
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    relative_path = entry.path[prefix_length:]
+                    if entry.is_dir(follow_symlinks=False):
+                        if not path_filter.excluded(entry.name, relative_path):
+                            subdirectories.append(entry.path)
+                    elif entry.is_file() and path_filter.accepts(entry.name, relative_path):
+                        yield entry.path
+        except OSError as error:
+            logger.error(f"Can't list the directory {current}: {error}")
+        # Subdirectories are walked depth first, in the order they were listed
+        directories += reversed(subdirectories)
+
+
+def read_paths(source: str) -> Iterator[str]:
+    """Yield the paths listed in a file, one per line, as they are read. Empty lines are skipped
+
+    Args:
+        source (str): Path to the file, "-" for the standard input
+
+    Returns:
+        Iterator[str]: the paths
+    """
+    with open(source, "r", encoding="utf-8", errors="surrogateescape") if source != "-" else sys.stdin as lines:
+        for line in lines:
+            path = line.rstrip("\r\n")
+            if path:
+                yield path
+
+
+def discover(
+    paths: Iterable[str], files_from: str = None, include: List[str] = None, exclude: List[str] = None, skip_outputs: bool = False
+) -> Iterator[str]:
+    """Yield the files to process, as they are discovered: processing can start on the first file while the others are discovered.
+    Directories are walked recursively, files given explicitly are always yielded, whatever the patterns
+
+    Args:
+        paths (Iterable[str]): Files and directories given on the command line
+        files_from (str, optional): File listing the files and directories, "-" for the standard input. Defaults to None.
+        include (List[str], optional): Patterns of the files to process in the directories. Defaults to None, all files.
+        exclude (List[str], optional): Patterns of the files and directories to skip in the directories. Defaults to None.
+        skip_outputs (bool, optional): Set to True to skip the copies written by FillDCM in the directories, as when the run writes
+            copies: the copies written while a directory is walked aren't processed again. Defaults to False.
+
+    Returns:
+        Iterator[str]: paths to the files
+    """
+    path_filter = PathFilter(include, exclude, skip_outputs)
+    for path in itertools.chain(paths, read_paths(files_from) if files_from is not None else ()):
+        if os.path.isdir(path):
+            yield from walk(path, path_filter)
+        else:
+            yield path
+
+
+class TimedPaths:
+    """Iterator over paths accumulating the time spent to discover them, spread over the run when they are streamed"""
+
+    def __init__(self, paths: Iterable[str]):
+        """TimedPaths constructor
+
+        Args:
+            paths (Iterable[str]): Paths, possibly discovered as they are iterated
+        """
+        self._paths: Iterator[str] = iter(paths)
+        self.seconds: float = 0.0
+
+    def __iter__(self) -> "TimedPaths":
+        return self
+
+    def __next__(self) -> str:
+        start = time.perf_counter()
+        try:
+            return next(self._paths)
+        finally:
+            self.seconds += time.perf_counter() - start
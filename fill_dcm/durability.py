@@ -0,0 +1,160 @@
+""" durability: output files replaced atomically, and flushed to stable storage by batches
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Tuple
+
+logger = logging.getLogger()
+
+# Durability policies. "none": files are renamed into place but left to the page cache. "batch": the files written are fsynced
+# at the end of each batch, then renamed into place, then their directories are fsynced. "directory": the directories of the
+# renamed files are fsynced once per batch
+NO_SYNC = "none"
+BATCH_SYNC = "batch"
+DIRECTORY_SYNC = "directory"
+DURABILITY_POLICIES = (NO_SYNC, BATCH_SYNC, DIRECTORY_SYNC)
+
+# A batch ends after this number of written files or this number of seconds, whichever comes first
+DEFAULT_SYNC_FILES = 1000
+DEFAULT_SYNC_SECONDS = 10.0
+
+
+def copy_metadata(source_file: str, target_file: str) -> None:
+    """Give a file the owner, when permitted, the permissions and the other metadata of another file (see shutil.copystat())
+
+    Args:
+        source_file (str): File whose metadata are copied, usually the input file
+        target_file (str): File receiving the metadata
+    """
+    status = os.stat(source_file)
+    # The owner is changed first: a change of owner clears the setuid and setgid bits
+    try:
+        os.chown(target_file, status.st_uid, status.st_gid)
+    except OSError as error:
+        logger.debug("Can't give %s the owner of %s: %s", target_file, source_file, error)
+    shutil.copystat(source_file, target_file)
+
+
+@contextmanager
+def atomic_output(output_file: str, mode_file: str = None, deferred: bool = False, sync: bool = False) -> Iterator[str]:
+    """Yield the path to a temporary file next to the output file, renamed to the output file once written.
+    If writing fails, the temporary file is removed and the output file is left untouched.
+
+    Args:
+        output_file (str): Path to the output file
+        mode_file (str, optional): File whose owner and permissions are given to the output file, usually the input file. Defaults to None.
+        deferred (bool, optional): Set to True to leave the temporary file to the durability policy, which renames it once synced
+            (see DurabilityPolicy.written()). Defaults to False.
+        sync (bool, optional): Set to True to sync the temporary file before it is renamed. Defaults to False.
+
+    Returns:
+        Iterator[str]: path to the temporary file to write
+    """
+    output_path = Path(output_file)
+    file_descriptor, target = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix=".tmp")
+    os.close(file_descriptor)
+    try:
+        if mode_file is not None:
+            copy_metadata(mode_file, target)
+        yield target
+        if not deferred:
+            if sync:
+                fsync_path(target)
+            os.replace(target, output_file)
+    except BaseException:
+        if os.path.exists(target):
+            os.unlink(target)
+        raise
+
+
+def fsync_path(path: str) -> None:
+    """fsync a file or a directory by its path. Directories can't be opened on some platforms: they are skipped"""
+    try:
+        file_descriptor = os.open(path, os.O_RDONLY)
+    except OSError as error:
+        logger.debug("Can't open %s to sync it: %s", path, error)
+        return
+    try:
+        os.fsync(file_descriptor)
+    finally:
+        os.close(file_descriptor)
+
+
+class DurabilityPolicy:
+    """Flush the files written by a run to stable storage by batches rather than with one fsync per file"""
+
+    def __init__(self, policy: str = NO_SYNC, sync_files: int = DEFAULT_SYNC_FILES, sync_seconds: float = DEFAULT_SYNC_SECONDS):
+        """DurabilityPolicy constructor
+
+        Args:
+            policy (str, optional): One of DURABILITY_POLICIES. Defaults to NO_SYNC.
+            sync_files (int, optional): Number of written files ending a batch. Defaults to DEFAULT_SYNC_FILES.
+            sync_seconds (float, optional): Seconds since the last sync ending a batch. Defaults to DEFAULT_SYNC_SECONDS.
+        """
+        if policy not in DURABILITY_POLICIES:
+            raise ValueError(f"Unknown durability policy: {policy}")
+        self.policy: str = policy
+        self.sync_files: int = sync_files
+        self.sync_seconds: float = sync_seconds
+        # Number of batches synced
+        self.syncs: int = 0
+        # Files written since the last sync, in order: path, temporary file awaiting its rename and function called once durable
+        self._pending: List[Tuple[str, str, Callable[[], None]]] = []
+        self._last_sync: float = time.monotonic()
+
+    def written(self, path: str, temporary_file: str = None, durable: Callable[[], None] = None) -> None:
+        """Account a written file, and sync the batch if it is complete
+
+        Args:
+            path (str): Path to the written file
+            temporary_file (str, optional): Temporary file holding the data of the file, renamed to the file once synced.
+                Defaults to None, the file is already in place.
+            durable (Callable[[], None], optional): Function called once the file is durable, such as its record in the manifest.
+                Defaults to None.
+        """
+        if self.policy == NO_SYNC:
+            if temporary_file is not None:
+                os.replace(temporary_file, path)
+            if durable is not None:
+                durable()
+            return
+        self._pending.append((os.path.abspath(path), temporary_file, durable))
+        if len(self._pending) >= self.sync_files or time.monotonic() - self._last_sync >= self.sync_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        """Sync the files written since the last sync. Called at the end of a run for the last batch"""
+        if not self._pending:
+            return
+        start = time.perf_counter()
+        # Only the files of the run are flushed, not the other dirty data of the system: the writes of the batch are already
+        # under way in the background, most of them are on the disk by the time they are fsynced. A path written twice is synced once
+        if self.policy == BATCH_SYNC:
+            for path in dict.fromkeys(temporary_file or path for path, temporary_file, _ in self._pending):
+                fsync_path(path)
+        # Files are renamed into place once their data are durable: a crash never leaves an output file with missing data
+        durables = []
+        for path, temporary_file, durable in self._pending:
+            if temporary_file is not None:
+                try:
+                    os.replace(temporary_file, path)
+                except OSError as error:
+                    logger.error("Can't rename %s to %s: %s", temporary_file, path, error)
+                    continue
+            if durable is not None:
+                durables.append(durable)
+        # The renames are made durable by syncing the directories holding the files
+        for directory in {os.path.dirname(path) for path, _, _ in self._pending}:
+            fsync_path(directory)
+        logger.debug(f"Synced {len(self._pending)} file(s) in {time.perf_counter() - start:.3f}s")
+        self._pending.clear()
+        self._last_sync = time.monotonic()
+        self.syncs += 1
+        for durable in durables:
+            durable()
@@ -0,0 +1,131 @@
+""" edit_plan: tags to fill or to replace compiled once into a plan applied to each dataset
+"""
+
+from enum import Enum
+from typing import Any, Callable, Dict, NamedTuple, Tuple
+
+from pydicom import datadict
+from pydicom.tag import BaseTag, Tag
+
+from fill_dcm import dicom_io, parse_argument, vr_validation
+
+
+class Operation(Enum):
+    """Operation applied on a tag"""
+
+    # Set the value if the tag is missing or empty
+    FILL = "fill"
+    # Set the value in any case
+    REPLACE = "replace"
+
+
+class PlanEntry(NamedTuple):
+    """A tag of the plan with everything needed to apply it, resolved once"""
+
+    tag: BaseTag
+    keyword: str
+    vr: str
+    # None if the value is generated for each file
+    value: Any
+    # Value encoded for a little endian file with the default character set, None if it depends on the file
+    encoded: bytes
+    operation: Operation
+
+
+class EditPlan(NamedTuple):
+    """Immutable plan of the tags to fill or to replace, sorted by tag"""
+
+    entries: Tuple[PlanEntry, ...]
+    # True if all the values of the plan passed the rules of their VR: pydicom doesn't check them again on each file
+    validated: bool = False
+    # Entries of the plan indexed by tag, built once with the plan (see index_entries())
+    by_tag: Dict[BaseTag, PlanEntry] = None
+
+    @property
+    def tags(self) -> Tuple[BaseTag, ...]:
+        """Tags of the plan"""
+        return tuple(entry.tag for entry in self.entries)
+
+    @property
+    def has_generated_values(self) -> bool:
+        """True if some values are generated for each file"""
+        return any(entry.value is None for entry in self.entries)
+
+    def resolve(self, resolve_value: Callable[[PlanEntry], Any]) -> "EditPlan":
+        """Return the plan of a given file, where entries without value get the value returned by resolve_value()
+
+        Args:
+            resolve_value (Callable[[PlanEntry], Any]): Return the value of an entry for the file
+
+        Returns:
+            EditPlan: the plan with all values defined
+        """
+        entries = tuple(
+            entry if entry.value is not None else compile_entry(entry.tag, resolve_value(entry), entry.operation) for entry in self.entries
+        )
+        # Resolved values are generated for their VR
+        return EditPlan(entries, self.validated, index_entries(entries))
+
+
+def index_entries(entries: Tuple[PlanEntry, ...]) -> Dict[BaseTag, PlanEntry]:
+    """Index entries by tag (see EditPlan.by_tag)"""
+    return {entry.tag: entry for entry in entries}
+
+
+def pre_encode(tag: BaseTag, vr: str, value: Any) -> bytes:
+    """Encode a value once for little endian files. Only values whose encoding doesn't depend on the
+    character set of the file are encoded: ASCII strings and numbers.
+
+    Args:
+        tag (BaseTag): Tag of the element
+        vr (str): VR of the element
+        value (Any): Value to encode
+
+    Returns:
+        bytes: The encoded value, or None if it depends on the file
+    """
+    if value is None or (isinstance(value, str) and not value.isascii()):
+        return None
+    try:
+        return dicom_io.encode_element_value(tag, vr, value)
+    except Exception:
+        # Invalid value for the VR: the error is raised when the value is applied on a dataset
+        return None
+
+
+def compile_entry(tag: Any, value: Any, operation: Operation) -> PlanEntry:
+    """Resolve a tag and its value into an entry of the plan
+
+    Args:
+        tag (Any): Tag, as a name or a number
+        value (Any): Value of the tag, None if it is generated for each file
+        operation (Operation): Operation applied on the tag
+
+    Returns:
+        PlanEntry: the entry
+    """
+    try:
+        tag = Tag(tag)
+    except ValueError as error:
+        raise parse_argument.InvalidArgument(f"Tag {tag} is not a valid tag from DICOM dictionary: {error}")
+    vr = datadict.dictionary_VR(tag)
+    return PlanEntry(tag, datadict.keyword_for_tag(tag), vr, value, pre_encode(tag, vr, value), operation)
+
+
+def compile_plan(input_tags: parse_argument.InputTags) -> EditPlan:
+    """Compile tags to fill or to replace into a plan
+
+    Args:
+        input_tags (InputTags): Tags to fill or to replace
+
+    Returns:
+        EditPlan: the plan, sorted by tag, validated if all its values pass the rules of their VR
+    """
+    entries = [compile_entry(tag, value, Operation.FILL) for tag, value in input_tags.tags_to_fill.items()]
+    entries += [compile_entry(tag, value, Operation.REPLACE) for tag, value in input_tags.tags_to_replace.items()]
+    validated = all(
+        entry.value is None or (vr_validation.is_checked(entry.vr) and vr_validation.invalid_value(entry.vr, entry.value) is None)
+        for entry in entries
+    )
+    entries = tuple(sorted(entries, key=lambda entry: entry.tag))
+    return EditPlan(entries, validated, index_entries(entries))
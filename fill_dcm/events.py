@@ -0,0 +1,113 @@
+""" events: structured logs of the changes made to each file, sampled and written by batches, and the report of a run
+"""
+
+import json
+import logging
+import logging.handlers
+import sys
+import zlib
+
+from fill_dcm import stats
+
+logger = logging.getLogger()
+
+# Detail of the events logged for each file. "tag": one event per tag added or updated, "file": one event per file,
+# "run": none, only the report of the run
+TAG_DETAIL = "tag"
+FILE_DETAIL = "file"
+RUN_DETAIL = "run"
+LOG_DETAILS = (TAG_DETAIL, FILE_DETAIL, RUN_DETAIL)
+
+# Log records kept in memory before being written at once. Errors are written immediately, with the records before them
+DEFAULT_LOG_BATCH = 1000
+
+# Format of the text logs
+TEXT_FORMAT = "%(levelname)s - %(message)s"
+
+
+class JSONFormatter(logging.Formatter):
+    """Format a log record as a JSON line. The fields given with extra={"fields": {...}} are added to the line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {"time": record.created, "level": record.levelname, "message": record.getMessage()}
+        line.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+def configure_logging(level: int, json_lines: bool = False, batch: int = 0) -> None:
+    """Set the handler of the root logger
+
+    Args:
+        level (int): Logging level
+        json_lines (bool, optional): Set to True to write the logs as JSON lines. Defaults to False.
+        batch (int, optional): Number of records written at once, 0 to write each record as it comes. Defaults to 0.
+    """
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+    if batch > 0:
+        # Records are formatted when the batch is written: their message arguments are only formatted if they are written
+        handler = logging.handlers.MemoryHandler(batch, flushLevel=logging.ERROR, target=handler)
+    root = logging.getLogger()
+    for previous in root.handlers[:]:
+        root.removeHandler(previous)
+        previous.close()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def sampled(file: str, sample_rate: float) -> bool:
+    """Indicate if the events of a file are logged. The choice only depends on the path: a file is sampled in every run
+
+    Args:
+        file (str): Path to the file
+        sample_rate (float): Fraction of the files whose events are logged, from 0 to 1
+
+    Returns:
+        bool: True if the events of the file are logged
+    """
+    return sample_rate >= 1 or zlib.crc32(file.encode("utf-8", "surrogateescape")) < sample_rate * 0x100000000
+
+
+class EventLog:
+    """Log the changes made to each processed file, with the detail and the sampling of the run"""
+
+    def __init__(self, detail: str = TAG_DETAIL, sample_rate: float = 1.0):
+        """EventLog constructor
+
+        Args:
+            detail (str, optional): One of LOG_DETAILS. Defaults to TAG_DETAIL.
+            sample_rate (float, optional): Fraction of the files whose events are logged. Defaults to 1.0.
+        """
+        self.detail: str = detail
+        self.sample_rate: float = sample_rate
+
+    def file_done(self, result) -> None:
+        """Log the changes made to a file, if its events are logged
+
+        Args:
+            result (FileResult): Result of a processed file
+        """
+        if self.detail == RUN_DETAIL or not logger.isEnabledFor(logging.INFO) or not sampled(result.file, self.sample_rate):
+            return
+        if self.detail == FILE_DETAIL:
+            fields = {"event": "file", "file": result.file, "status": result.status.value, "changes": len(result.changes)}
+            logger.info("%s: %s, %d change(s)", result.file, result.status.value, len(result.changes), extra={"fields": fields})
+            return
+        for operation, keyword, value in result.changes:
+            fields = {"event": operation, "file": result.file, "tag": keyword, "value": value}
+            logger.info("%s %s:%s", operation.capitalize(), keyword, value, extra={"fields": fields})
+
+    def report(self, statistics: stats.RunStatistics) -> None:
+        """Log the changes and errors of a run, aggregated over its files
+
+        Args:
+            statistics (RunStatistics): Statistics of the run
+        """
+        fields = {"event": "run", "changes": statistics.changes, "errors": statistics.errors, "error_types": statistics.error_types}
+        changes = ", ".join(
+            f"{keyword} " + " ".join(f"{operation}={count}" for operation, count in counts.items()) for keyword, counts in statistics.changes.items()
+        )
+        errors = ", ".join(f"{error_type}={count}" for error_type, count in statistics.error_types.items())
+        logger.info("Changes: %s. Errors: %s", changes or "none", errors or "none", extra={"fields": fields})
@@ -1,23 +1,221 @@
 """ fill_dcm
 """
 
+from __future__ import annotations
+
 import argparse
-import json
+import importlib
+import itertools
 import logging
+import os
+import sys
+import time
+from collections import deque
+from enum import Enum
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from fill_dcm import discovery, durability, events, parse_argument, stats
+
+# pydicom, numpy and the modules relying on them take most of the startup time: they are imported when the files are processed,
+# so --help or an invalid argument are answered without loading them
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
 
-from pydicom import datadict, dcmread, errors
+    from fill_dcm import dicom_io, edit_plan
+    from fill_dcm.journal import Journal
+    from fill_dcm.manifest import Manifest
 
-from fill_dcm import parse_argument, vr_generators
+# Modules of the package imported at their first access as attributes of this module (e.g. fill_dcm.vr_generators)
+_LAZY_MODULES = ("dicom_io", "edit_plan", "mapping_store", "vr_generators")
 
 logger = logging.getLogger()
 
+# Number of files sent at once to a worker process when the files are discovered during the run (see chunk_size())
+STREAM_CHUNK_SIZE = 16
+
+# Chunks of files submitted to the worker processes ahead of the results, per worker (see map_chunks())
+PREFETCH_CHUNKS_PER_JOB = 4
+
+
+def __getattr__(name: str) -> Any:
+    """Import a module of _LAZY_MODULES at its first access as an attribute of this module"""
+    if name in _LAZY_MODULES:
+        return importlib.import_module(f"fill_dcm.{name}")
+    raise AttributeError(f"module {__name__} has no attribute {name}")
+
 
 class InvalidParameter(Exception):
     """Exception to handle CLI parameter errors"""
 
 
+class FileStatus(Enum):
+    """Outcome of the processing of a single DICOM file"""
+
+    PATCHED = "patched"
+    REWRITTEN = "rewritten"
+    # The plan doesn't change the file: it isn't rewritten
+    UNCHANGED = "unchanged"
+    # Up to date in the manifest: the file isn't read
+    SKIPPED = "skipped"
+    READ_ERROR = "read_error"
+    WRITE_ERROR = "write_error"
+
+
+class FileResult:
+    """Result of the processing of a single DICOM file, sent back to the caller (or to the parent process)"""
+
+    def __init__(
+        self,
+        file: str,
+        status: FileStatus,
+        error: str = None,
+        timings: Dict[str, float] = None,
+        bytes_read: int = 0,
+        bytes_written: int = 0,
+        output_file: str = None,
+        changes: List[Tuple[str, str, Any]] = None,
+        error_type: str = None,
+        temporary_file: str = None,
+    ):
+        """FileResult constructor
+
+        Args:
+            file (str): Path to the processed DICOM file
+            status (FileStatus): Outcome of the processing
+            error (str, optional): Error message if the processing failed. Defaults to None.
+            timings (Dict[str, float], optional): Seconds spent in each stage (see stats.FILE_STAGES). Defaults to None.
+            bytes_read (int, optional): Bytes read from the input file. Defaults to 0.
+            bytes_written (int, optional): Bytes written to the output file. Defaults to 0.
+            output_file (str, optional): Path to the file written, once renamed into place. Defaults to None.
+            changes (List[Tuple[str, str, Any]], optional): Operation ("add" or "update"), keyword and value of each tag changed. Defaults to None.
+            error_type (str, optional): Name of the exception if the processing failed. Defaults to None.
+            temporary_file (str, optional): Temporary file holding the output, renamed to output_file once synced (see
+                durability.DurabilityPolicy.written()). Defaults to None, the output is in place.
+        """
+        self.file: str = file
+        self.status: FileStatus = status
+        self.error: str = error
+        self.timings: Dict[str, float] = timings if timings is not None else {}
+        self.bytes_read: int = bytes_read
+        self.bytes_written: int = bytes_written
+        self.output_file: str = output_file
+        self.changes: List[Tuple[str, str, Any]] = changes if changes is not None else []
+        self.error_type: str = error_type
+        self.temporary_file: str = temporary_file
+
+    @property
+    def succeeded(self) -> bool:
+        """True if the file has been processed without error"""
+        return self.status not in (FileStatus.READ_ERROR, FileStatus.WRITE_ERROR)
+
+
+class ProcessingSummary:
+    """Aggregated results of a run over a list of DICOM files"""
+
+    def __init__(
+        self,
+        slowest_files: int = stats.DEFAULT_SLOWEST_FILES,
+        durability_policy: durability.DurabilityPolicy = None,
+        manifest: Manifest = None,
+        journal: Journal = None,
+        event_log: events.EventLog = None,
+    ):
+        """ProcessingSummary constructor
+
+        Args:
+            slowest_files (int, optional): Number of slowest files kept in the statistics. Defaults to stats.DEFAULT_SLOWEST_FILES.
+            durability_policy (DurabilityPolicy, optional): Policy syncing the written files. Defaults to no sync.
+            manifest (Manifest, optional): Manifest recording the processed files. Defaults to None.
+            journal (Journal, optional): Journal recording the outcome of each file of the run. Defaults to None.
+            event_log (EventLog, optional): Log of the changes made to each file. Defaults to one event per tag change.
+        """
+        self.counts: Dict[FileStatus, int] = {status: 0 for status in FileStatus}
+        self.statistics = stats.RunStatistics(slowest_files)
+        self.durability_policy = durability_policy if durability_policy is not None else durability.DurabilityPolicy()
+        self.manifest = manifest
+        self.journal = journal
+        self.event_log = event_log if event_log is not None else events.EventLog()
+
+    def add(self, result: FileResult, recorded: bool = True) -> None:
+        """Account a file result in the summary
+
+        Args:
+            result (FileResult): Result of a processed file
+            recorded (bool, optional): Set to False if the file isn't recorded in the manifest and the journal (see record()),
+                e.g. a member of an archive or a file replayed from the journal. Defaults to True.
+        """
+        self.counts[result.status] += 1
+        self.statistics.add(result)
+        self.event_log.file_done(result)
+        # The file is recorded in the manifest and the journal once its output is durable
+        if result.succeeded and result.output_file is not None:
+            self.durability_policy.written(result.output_file, result.temporary_file, partial(self.record, result) if recorded else None)
+        elif recorded:
+            self.record(result)
+
+    def record(self, result: FileResult) -> None:
+        """Record the outcome of a file in the journal and, if it succeeded, in the manifest
+
+        Args:
+            result (FileResult): Result of a processed file
+        """
+        if self.journal is not None:
+            self.journal.record(result.file, result.status.value, result.error)
+        if self.manifest is not None and result.succeeded and result.status is not FileStatus.SKIPPED:
+            self.manifest.record(result.file, result.output_file)
+
+    def close(self) -> None:
+        """Sync the last written files and close the manifest and the journal"""
+        self.durability_policy.flush()
+        if self.manifest is not None:
+            self.manifest.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    @property
+    def total(self) -> int:
+        """Number of files processed"""
+        return sum(self.counts.values())
+
+    @property
+    def failed(self) -> int:
+        """Number of files that couldn't be read or written"""
+        return self.counts[FileStatus.READ_ERROR] + self.counts[FileStatus.WRITE_ERROR]
+
+
+def value_generator(tag: str, uid_root: str = None) -> Callable[[], Any]:
+    """Return the function generating random values matching the VR of a tag
+    Parameters:
+        tag : str Tag name
+        uid_root : str Organization root of the generated UIDs, None for the 2.25 form
+    Exceptions:
+        InvalidParameter if the VR of the tag isn't managed
+    """
+    from pydicom import datadict
+
+    from fill_dcm import vr_generators
+
+    tag_vr = datadict.dictionary_VR(tag)
+    if tag_vr not in vr_generators.VR_GENERATORS:
+        raise InvalidParameter(f"VR: {tag_vr} for tag {tag} not managed")
+    if tag_vr == "UI":
+        return partial(vr_generators.generate_unique_identifier, uid_root)
+    return vr_generators.VR_GENERATORS[tag_vr]
+
+
 def update_data(input_values: parse_argument.InputTags) -> parse_argument.InputTags:
     """Define a value to each tag without. The generated value matches tag's VR.
     If a tag has a defined value, it is not updated.
@@ -26,64 +224,121 @@ def update_data(input_values: parse_argument.InputTags) -> parse_argument.InputT
     """
     for tag in input_values.tags_to_fill:
         if input_values.tags_to_fill[tag] is None:
-            tag_vr = datadict.dictionary_VR(tag)
-            tag_generator = None
-            match (tag_vr):
-                case "AS":
-                    tag_generator = vr_generators.generate_age_string
-                case "DA":
-                    tag_generator = vr_generators.generate_date
-                case "DS":
-                    tag_generator = vr_generators.generate_decimal_string
-                case "DT":
-                    tag_generator = vr_generators.generate_date_time
-                case "IS":
-                    tag_generator = vr_generators.generate_integer_string
-                case "LO":
-                    tag_generator = vr_generators.generate_lo
-                case "LT":
-                    tag_generator = vr_generators.generate_long_text
-                case "PN":
-                    tag_generator = vr_generators.generate_personal_name
-                case "SH":
-                    tag_generator = vr_generators.generate_short_string
-                case "ST":
-                    tag_generator = vr_generators.generate_short_text
-                case "TM":
-                    tag_generator = vr_generators.generate_time
-                case "UI":
-                    tag_generator = vr_generators.generate_unique_identifier
-                case "US":
-                    tag_generator = vr_generators.generate_unsigned_short
-                case _:
-                    raise InvalidParameter(f"VR: {tag_vr} for tag {tag} not managed")
-            input_values.tags_to_fill[tag] = tag_generator()
+            input_values.tags_to_fill[tag] = value_generator(tag)()
     return input_values
 
 
-def adjust_dicom_dataset(dataset, input_tags: parse_argument.InputTags):
+def original_value(dataset, tag: str) -> str:
+    """Return the value of a tag in a dataset as a string, "" if the tag is missing or empty.
+    Raw elements are converted without being replaced in the dataset, so they can still be patched.
+    Parameters:
+        dataset (Dataset) Dataset read from a file
+        tag (str) Tag name
+    """
+    from pydicom.dataelem import RawDataElement, convert_raw_data_element
+
+    if not tag in dataset:
+        return ""
+    element = dataset.get_item(tag)
+    if isinstance(element, RawDataElement):
+        element = convert_raw_data_element(element, encoding=dataset._character_set, ds=dataset)
+    return "" if element.VM == 0 else str(element.value)
+
+
+def adjust_dicom_dataset(
+    dataset, input_tags: Union[parse_argument.InputTags, edit_plan.EditPlan], recursive: bool = False
+) -> List[Tuple[str, str, Any]]:
     """Replace in the dataset empty or missing tags by replacement data
     Parameters:
         dataset (Dataset) Dataset to adjust
-        input_tags (InputTags) Data used to replace or overwrite DICOM tags
-    """
-    # Replace only empty/missing  DICOM tags
-    for dcm_tag, tag_value in input_tags.tags_to_fill.items():
-        if not dcm_tag in dataset:
-            dataset.add_new(dcm_tag, datadict.dictionary_VR(dcm_tag), tag_value)
-            logger.info(f"Add {dcm_tag}:{tag_value}")
-        elif dataset[dcm_tag].VM == 0:
-            dataset[dcm_tag].value = tag_value
-            logger.info(f"Update {dcm_tag}:{tag_value}")
-
-    # Replace or insert all specified tags
-    for dcm_tag, tag_value in input_tags.tags_to_replace.items():
-        if not dcm_tag in dataset:
-            dataset.add_new(dcm_tag, datadict.dictionary_VR(dcm_tag), tag_value)
-            logger.info(f"Add {dcm_tag}:{tag_value}")
-        else:
-            dataset[dcm_tag].value = tag_value
-            logger.info(f"Update {dcm_tag}:{tag_value}")
+        input_tags (InputTags or EditPlan) Data used to replace or overwrite DICOM tags. InputTags are compiled into a plan
+        recursive (bool, optional) Set to True to also adjust the items of the sequences (see adjust_nested_items())
+    Returns:
+        List[Tuple[str, str, Any]]: Operation ("add" or "update"), keyword and value of each tag changed, logged by the caller (see events module)
+    """
+    from pydicom import DataElement
+
+    from fill_dcm import edit_plan
+
+    plan = input_tags if isinstance(input_tags, edit_plan.EditPlan) else edit_plan.compile_plan(input_tags)
+    validation_mode = _validation_mode(plan)
+    changes = []
+    for entry in plan.entries:
+        if not entry.tag in dataset:
+            dataset.add(DataElement(entry.tag, entry.vr, entry.value, validation_mode=validation_mode))
+            changes.append(("add", entry.keyword, entry.value))
+            continue
+        element = dataset[entry.tag]
+        # Replace only empty/missing DICOM tags to fill, replace all tags to replace
+        if entry.operation is edit_plan.Operation.REPLACE or element.VM == 0:
+            _set_value(element, entry.value, validation_mode)
+            changes.append(("update", entry.keyword, entry.value))
+    if recursive:
+        changes += adjust_nested_items(dataset, plan)
+    return changes
+
+
+def adjust_nested_items(dataset, plan: edit_plan.EditPlan) -> List[Tuple[str, str, Any]]:
+    """Fill or replace the tags of the plan in the items of the sequences of the dataset, at any depth. Missing tags are only
+    added to the top-level dataset (see adjust_dicom_dataset()). The tree is traversed once: the tags of each item are looked
+    up in the plan indexed by tag, and only the elements of the plan and the sequences are parsed
+    Parameters:
+        dataset (Dataset) Dataset to adjust
+        plan (EditPlan) Plan of the tags to replace or overwrite, with all values defined
+    Returns:
+        List[Tuple[str, str, Any]]: Operation ("update"), keyword and value of each nested tag changed
+    """
+    from fill_dcm import dicom_io, edit_plan
+
+    entries = plan.by_tag
+    validation_mode = _validation_mode(plan)
+    changes = []
+    # Datasets whose elements are still to traverse, in the order of the file
+    datasets = [dataset]
+    while datasets:
+        current = datasets.pop()
+        items = []
+        for tag in current.keys():
+            entry = entries.get(tag)
+            if entry is not None and current is not dataset:
+                element = current[tag]
+                if (entry.operation is edit_plan.Operation.REPLACE or element.VM == 0) and element.value != entry.value:
+                    _set_value(element, entry.value, validation_mode)
+                    changes.append(("update", entry.keyword, entry.value))
+            elif entry is None and dicom_io.is_sequence(current, tag):
+                items += current[tag].value
+        datasets += reversed(items)
+    return changes
+
+
+def _validation_mode(plan: edit_plan.EditPlan) -> Optional[int]:
+    """Validation mode of the elements set by a plan: values of a validated plan are not checked again by pydicom on each file,
+    the others are checked with the reading validation mode of pydicom (None)"""
+    from pydicom import config
+
+    return config.IGNORE if plan.validated else None
+
+
+def _set_value(element, value: Any, validation_mode: Optional[int]) -> None:
+    """Set the value of an element, with the validation mode of the plan (see _validation_mode())"""
+    if validation_mode is not None:
+        element.validation_mode = validation_mode
+    element.value = value
+
+
+def dataset_edits(dataset, plan: edit_plan.EditPlan) -> List[edit_plan.PlanEntry]:
+    """List the entries of the plan adjust_dicom_dataset() would apply on the dataset, without modifying it
+    Parameters:
+        dataset (Dataset) Dataset to adjust
+        plan (EditPlan) Plan of the tags to replace or overwrite
+    Returns:
+        List[PlanEntry]: Entries changing the dataset
+    """
+    from fill_dcm import edit_plan
+
+    return [
+        entry for entry in plan.entries if entry.operation is edit_plan.Operation.REPLACE or not entry.tag in dataset or dataset[entry.tag].VM == 0
+    ]
 
 
 def output_filepath(original_file_path: str, overwrite_output_file: bool = False) -> str:
@@ -96,50 +351,719 @@ def output_filepath(original_file_path: str, overwrite_output_file: bool = False
     if not overwrite_output_file:
         path_to_file = Path(original_file_path)
         output_file_path = f"{path_to_file.parent}/{path_to_file.stem}_modified{path_to_file.suffix}"
-        logger.info(f"Output file: {output_file_path}")
+        logger.debug("Output file: %s", output_file_path)
     return output_file_path
 
 
+class FileEdit:
+    """A DICOM file going through the read, adjust and write stages"""
+
+    def __init__(self, file: str):
+        """FileEdit constructor
+
+        Args:
+            file (str): Path to the DICOM file
+        """
+        self.file: str = file
+        self.dataset = None
+        # Offset of the pixel data copied as is to the output. None if the whole dataset is read and written
+        self.pixel_data_offset: int = None
+        # Patches to write in place of the current values. None if the file must be rewritten
+        self.patches: List[dicom_io.Patch] = None
+        self.entries: List[edit_plan.PlanEntry] = None
+        # Set as soon as a stage fails
+        self.result: FileResult = None
+        # Seconds spent in each stage and bytes read and written, reported in the result
+        self.timings: Dict[str, float] = {}
+        self.bytes_read: int = 0
+        self.bytes_written: int = 0
+        self.output_file: str = None
+        # Temporary file holding the output until its batch is synced (see durability.atomic_output())
+        self.temporary_file: str = None
+        # Changes made to the dataset (see adjust_dicom_dataset())
+        self.changes: List[Tuple[str, str, Any]] = []
+
+    def finish(self, status: FileStatus, error: Exception = None) -> FileResult:
+        """Set the result of the file, with its timings and volumes
+
+        Args:
+            status (FileStatus): Outcome of the processing
+            error (str, optional): Error message if the processing failed. Defaults to None.
+
+        Returns:
+            FileResult: the result
+        """
+        self.result = FileResult(
+            self.file,
+            status,
+            str(error) if error is not None else None,
+            self.timings,
+            self.bytes_read,
+            self.bytes_written,
+            self.output_file,
+            self.changes,
+            type(error).__name__ if error is not None else None,
+            self.temporary_file,
+        )
+        return self.result
+
+
+def read_dicom_file(file: str, plan: edit_plan.EditPlan, memory_map: bool = False) -> FileEdit:
+    """Read stage: read a DICOM file. Pixel data are not read if they can be copied as is to the output file
+
+    Args:
+        file (str): path to the DICOM file
+        plan (EditPlan): Plan of the tags to replace/filled in the DICOM file
+        memory_map (bool, optional): Set to True to parse the file from a memory-mapped view. Defaults to False.
+
+    Returns:
+        FileEdit: the file read, with its result defined if the file can't be read
+    """
+    from pydicom import errors
+
+    from fill_dcm import dicom_io
+
+    logger.debug("Work on file: %s", file)
+    edit = FileEdit(file)
+    start = time.perf_counter()
+    try:
+        edit.dataset, edit.pixel_data_offset = dicom_io.read_header(file, memory_map)
+        if not dicom_io.can_passthrough(edit.pixel_data_offset, plan.tags):
+            edit.dataset, edit.pixel_data_offset = dicom_io.read_dataset(file, memory_map), None
+        # Only the header is parsed when the pixel data are passed through
+        edit.bytes_read = edit.pixel_data_offset if edit.pixel_data_offset is not None else os.path.getsize(file)
+    except (errors.InvalidDicomError, Exception) as error:
+        logger.error("Invalid file to read: %s: %s", file, error)
+        edit.finish(FileStatus.READ_ERROR, error)
+    edit.timings["read"] = time.perf_counter() - start
+    return edit
+
+
+def adjust_dicom_edit(edit: FileEdit, plan: edit_plan.EditPlan, options: parse_argument.Options) -> FileEdit:
+    """Adjust stage: compute the patches of a file read by read_dicom_file() or, if they can't be applied, adjust its dataset
+
+    Args:
+        edit (FileEdit): File read by read_dicom_file()
+        plan (EditPlan): Plan of the tags to replace/filled in the DICOM file. Values shall already be defined (see update_data()),
+            unless a mapping store is used or values are generated per file
+        options (Options): Options
+
+    Returns:
+        FileEdit: the file ready to be written
+    """
+    if edit.result is not None:
+        return edit
+
+    start = time.perf_counter()
+    _adjust_dicom_edit(edit, plan, options)
+    edit.timings["adjust"] = time.perf_counter() - start
+    return edit
+
+
+def dataset_plan(dataset, plan: edit_plan.EditPlan, options: parse_argument.Options) -> edit_plan.EditPlan:
+    """Return the plan of a dataset: with a mapping store, per file values or groups, tags without value get the value of the dataset
+    Parameters:
+        dataset (Dataset) Dataset to adjust
+        plan (EditPlan) Plan of the run (see run_plan())
+        options (Options) Options
+    Returns:
+        EditPlan: the plan with all values defined
+    """
+    from fill_dcm import grouping, mapping_store, vr_generators
+
+    if options.mapping_store is not None:
+        # Each original value of a tag is mapped to a generated value
+        store = mapping_store.get_store(options.mapping_store, options.mapping_cache_size)
+        plan = plan.resolve(
+            lambda entry: store.get(entry.keyword, original_value(dataset, entry.tag), value_generator(entry.keyword, options.uid_root))
+        )
+    elif options.per_file_values:
+        # Each file gets new values, taken from pools of pre-generated values
+        plan = plan.resolve(lambda entry: vr_generators.get_pool(entry.vr, options.uid_root).next())
+    elif options.group_by is not None and any(entry.value is None for entry in plan.entries):
+        # Each group gets new values, generated at its first dataset. Files are grouped beforehand, with the plan of their group
+        plan = grouping.get_group_values(options.group_by, options.uid_root).dataset_plan(dataset, plan)
+    return plan
+
+
+def _adjust_dicom_edit(edit: FileEdit, plan: edit_plan.EditPlan, options: parse_argument.Options) -> None:
+    """Compute the patches of a file or adjust its dataset (see adjust_dicom_edit())"""
+    from fill_dcm import dicom_io
+
+    plan = dataset_plan(edit.dataset, plan, options)
+    # Nested items are adjusted in the dataset: a file with nested changes is rewritten rather than patched
+    nested_changes = adjust_nested_items(edit.dataset, plan) if options.recursive else []
+
+    entries = dataset_edits(edit.dataset, plan)
+    patches = dicom_io.plan_patches(edit.dataset, entries)
+    if patches is not None:
+        # Values identical to the current ones are left as is
+        changes = [(entry, patch) for entry, patch in zip(entries, patches) if not dicom_io.is_unchanged(edit.dataset, patch)]
+        entries = [entry for entry, _ in changes]
+        patches = [patch for _, patch in changes]
+    if not entries and not nested_changes:
+        edit.patches, edit.entries = [], []
+        return
+
+    # Values of existing elements are written in place if their length allows it
+    if edit.pixel_data_offset is not None and patches is not None and not nested_changes:
+        edit.patches, edit.entries = patches, entries
+        edit.changes = [("update", entry.keyword, entry.value) for entry in entries]
+        return
+
+    edit.changes = adjust_dicom_dataset(edit.dataset, plan) + nested_changes
+
+
+def write_dicom_edit(edit: FileEdit, options: parse_argument.Options) -> FileResult:
+    """Write stage: write a file adjusted by adjust_dicom_edit()
+
+    Args:
+        edit (FileEdit): File adjusted by adjust_dicom_edit()
+        options (Options): Options
+
+    Returns:
+        FileResult: outcome of the processing of the file
+    """
+    if edit.result is not None:
+        return edit.result
+
+    from fill_dcm import dicom_io
+
+    output_file = None
+    # With the batch durability policy, outputs are renamed into place once their batch is synced
+    deferred = options.durability == durability.BATCH_SYNC
+    start = time.perf_counter()
+    try:
+        output_file = output_filepath(edit.file, options.overwrite_output_file)
+        edit.timings["output_filepath"] = time.perf_counter() - start
+        start = time.perf_counter()
+        if edit.patches is not None:
+            if output_file == edit.file:
+                # Values are overwritten in place with values of the same length: the file is never truncated
+                if edit.patches:
+                    dicom_io.apply_patches(output_file, edit.patches)
+                else:
+                    output_file = None
+            else:
+                # Without the overwrite option, the input is first cloned (or copied) to the output file
+                with durability.atomic_output(output_file, edit.file, deferred) as target:
+                    cloned = dicom_io.copy_file(edit.file, target)
+                    logger.debug("%s %s to %s", "Clone" if cloned else "Copy", edit.file, output_file)
+                    if not cloned:
+                        copied = os.path.getsize(target)
+                        edit.bytes_read += copied
+                        edit.bytes_written += copied
+                    if edit.patches:
+                        dicom_io.apply_patches(target, edit.patches)
+                edit.temporary_file = target if deferred else None
+            edit.bytes_written += sum(len(patch.data) for patch in edit.patches)
+            status = FileStatus.PATCHED if edit.patches else FileStatus.UNCHANGED
+        elif edit.pixel_data_offset is None:
+            with durability.atomic_output(output_file, edit.file, deferred) as target:
+                edit.dataset.save_as(target)
+            edit.temporary_file = target if deferred else None
+            edit.bytes_written = os.path.getsize(edit.temporary_file or output_file)
+            status = FileStatus.REWRITTEN
+        else:
+            # The pixel data are read from the input to be copied. The size is taken before the input may be replaced
+            edit.bytes_read += os.path.getsize(edit.file) - edit.pixel_data_offset
+            edit.temporary_file = dicom_io.write_header_and_passthrough(edit.dataset, edit.file, edit.pixel_data_offset, output_file, deferred)
+            edit.bytes_written = os.path.getsize(edit.temporary_file or output_file)
+            status = FileStatus.REWRITTEN
+        edit.timings["write"] = time.perf_counter() - start
+        edit.output_file = output_file
+        edit.finish(status)
+    except Exception as error:
+        logger.error("Can't write the DICOM file: %s: %s", output_file, error)
+        edit.timings["write"] = time.perf_counter() - start
+        edit.finish(FileStatus.WRITE_ERROR, error)
+    return edit.result
+
+
+def adjust_dicom_file(file: str, plan: edit_plan.EditPlan, options: parse_argument.Options) -> FileResult:
+    """Adjust a single DICOM file according to rules and values passed as input
+
+    Args:
+        file (str): path to the DICOM file
+        plan (EditPlan): Plan of the tags to replace/filled in the DICOM file (see adjust_dicom_edit())
+        options (Options): Options
+
+    Returns:
+        FileResult: outcome of the processing of the file
+    """
+    edit = read_dicom_file(file, plan, options.memory_map)
+    adjust_dicom_edit(edit, plan, options)
+    return write_dicom_edit(edit, options)
+
+
+# Plan and options of a worker process. They are set once per worker by _init_worker()
+_worker_plan: edit_plan.EditPlan = None
+_worker_options: parse_argument.Options = None
+
+
+def _init_worker(plan: edit_plan.EditPlan, options: parse_argument.Options, log_level: int) -> None:
+    """Initialize a worker process of the pool: store the plan and the options and setup the logs
+
+    Args:
+        plan (EditPlan): Plan of the tags to replace/filled
+        options (Options): Options
+        log_level (int): Logging level of the parent process
+    """
+    global _worker_plan, _worker_options
+    _worker_plan = plan
+    _worker_options = options
+    # Workers only log errors and debug messages, written as they come: a batch would be lost when the worker exits
+    events.configure_logging(log_level, options.log_json)
+
+
+def _adjust_dicom_chunk_in_worker(files: List[str]) -> List[FileResult]:
+    """Adjust DICOM files from a worker process, with the plan received at the worker initialization"""
+    return [adjust_dicom_file(file, _worker_plan, _worker_options) for file in files]
+
+
+def _adjust_dicom_group_chunk_in_worker(files: List[Tuple[edit_plan.EditPlan, str]]) -> List[FileResult]:
+    """Adjust DICOM files from a worker process, each with the plan of its group"""
+    return [adjust_dicom_file(file, plan, _worker_options) for plan, file in files]
+
+
+def run_plan(plan: edit_plan.EditPlan, options: parse_argument.Options) -> edit_plan.EditPlan:
+    """Return the plan of a run. Unless a mapping store is used or values are generated per file or per group,
+    tags without value get a value generated once for all the files of the run (see update_data()).
+
+    Args:
+        plan (EditPlan): Compiled plan, tags without value included
+        options (Options): Options
+
+    Returns:
+        EditPlan: the plan to apply on the files
+    Exceptions:
+        InvalidParameter if a value can't be generated for a tag
+    """
+    # Check values can be generated before any file is processed
+    for entry in plan.entries:
+        if entry.value is None:
+            value_generator(entry.keyword)
+    if options.mapping_store is None and not options.per_file_values and options.group_by is None:
+        plan = plan.resolve(lambda entry: value_generator(entry.keyword, options.uid_root)())
+    return plan
+
+
+def generated_values(compiled: edit_plan.EditPlan, plan: edit_plan.EditPlan) -> Dict[str, Any]:
+    """Return the values generated once for the run (see run_plan()), by keyword
+
+    Args:
+        compiled (EditPlan): Compiled plan, tags without value included
+        plan (EditPlan): Plan of the run, resolved from the compiled plan
+
+    Returns:
+        Dict[str, Any]: the generated values, empty if values are generated for each file
+    """
+    return {
+        entry.keyword: resolved.value for entry, resolved in zip(compiled.entries, plan.entries) if entry.value is None and resolved.value is not None
+    }
+
+
+def chunk_size(files_count: int, jobs: int) -> int:
+    """Number of files sent at once to a worker process: enough to amortize the transfers, few enough to balance the load.
+    When the number of files isn't known, as when they are discovered during the run, STREAM_CHUNK_SIZE"""
+    if files_count is None:
+        return STREAM_CHUNK_SIZE
+    return max(1, min(64, files_count // (jobs * 4)))
+
+
+def map_chunks(executor: Executor, function: Callable[[List[Any]], List[Any]], files: Iterable[Any], jobs: int, size: int) -> Iterator[Any]:
+    """Apply a function on chunks of files in a pool of processes and yield its results in order. Chunks are submitted as the files
+    are iterated, at most PREFETCH_CHUNKS_PER_JOB per worker ahead of the results: files discovered during the run are processed
+    without waiting for the end of the discovery
+
+    Args:
+        executor (Executor): Pool of processes
+        function (Callable[[List[Any]], List[Any]]): Function processing a chunk of files in a worker, returning a result per file
+        files (Iterable[Any]): paths to the files, or the arguments of the function for each file
+        jobs (int): Number of workers of the pool
+        size (int): Number of files per chunk (see chunk_size())
+
+    Returns:
+        Iterator[Any]: results of the files
+    """
+    files = iter(files)
+    pending = deque()
+    while chunk := list(itertools.islice(files, size)):
+        pending.append(executor.submit(function, chunk))
+        while len(pending) > jobs * PREFETCH_CHUNKS_PER_JOB:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
 def adjust_dicom_files(
-    files: List[str],
+    files: Iterable[str],
     input_tags: parse_argument.InputTags,
     options: parse_argument.Options,
-) -> None:
-    """Adjust DICOM files according to rules and values passed as input
+) -> ProcessingSummary:
+    """Adjust DICOM files according to rules and values passed as input.
+    With the pipeline option, reads, adjustments and writes of different files overlap (see pipeline module).
+    Otherwise, if options.jobs is greater than 1, files are spread over a pool of processes.
+    With options.group_by, files are bucketed by group first and each group is processed as a unit (see grouping module).
+    ZIP and TAR archives are adjusted into new archives (see archive module).
 
     Args:
-        files ([str]): list of path to DICOM files
+        files (Iterable[str]): paths to DICOM files, possibly discovered while the first ones are processed (see discovery.discover())
         input_tags (InputTags): Tags to replace/filled in the list of DICOM files
+        options (Options): Options. With options.stats_path, the statistics of the run are written in a JSON file
+
+    Returns:
+        ProcessingSummary: results of the run, with its statistics
+    """
+    from fill_dcm import archive, edit_plan, grouping, journal, manifest, mapping_store
+
+    run_start = time.perf_counter()
+    # Files discovered during the run (see discovery.discover()) are processed as they come: their number isn't known
+    files_count = len(files) if isinstance(files, (list, tuple)) else None
+    discovered = discovery.TimedPaths(files)
+    files = discovered
+
+    compiled = edit_plan.compile_plan(input_tags)
+    plan = run_plan(compiled, options)
+
+    summary = ProcessingSummary(options.stats_slowest, durability_policy(options), event_log=events.EventLog(options.log_detail, options.log_sample))
+    if options.manifest_path is not None:
+        summary.manifest = manifest.Manifest(options.manifest_path, manifest.plan_hash(input_tags, options))
+    if options.journal_path is not None:
+        values = generated_values(compiled, plan)
+        summary.journal = journal.Journal(options.journal_path, manifest.plan_hash(input_tags, options), options.resume, values)
+        # The remaining files of a resumed run get the values generated by the interrupted run, not new ones
+        if summary.journal.resumed and values and summary.journal.values.keys() == values.keys():
+            plan = compiled.resolve(lambda entry: summary.journal.values[entry.keyword])
+        if options.group_by is not None:
+            _journal_group_values(compiled, options, summary.journal)
+    try:
+        # Archives are adjusted one after the other once the other files are done, their members are spread over the pool (see archive module)
+        archives = []
+        if options.pipeline and options.group_by is None:
+            from fill_dcm import pipeline
+
+            # Files are discovered by a thread of the pipeline and selected on its event loop: the manifest, the journal and the summary
+            # are only used from the thread of the run
+            pipeline.adjust_dicom_files_pipeline(
+                files, plan, options, summary, partial(_to_process, summary=summary, archives=archives, options=options)
+            )
+        else:
+            _adjust_dicom_files((file for file in files if _to_process(file, summary, archives, options)), files_count, plan, options, summary)
+        for path in archives:
+            results = archive.adjust_archive(path, plan, options)
+            for result in results:
+                summary.add(result, recorded=False)
+            # The archive is recorded as a whole, with the first error of its members
+            failure = next((result for result in results if not result.succeeded), None)
+            summary.record(
+                FileResult(path, FileStatus.REWRITTEN, output_file=archive.output_archive_path(path, options.overwrite_output_file))
+                if failure is None
+                else FileResult(path, failure.status, failure.error, error_type=failure.error_type)
+            )
+    finally:
+        # Files completed before an interruption are kept in the journal and the manifest
+        summary.close()
+    mapping_store.close_stores()
+    grouping.clear_group_values()
+    summary.statistics.discovery = discovered.seconds
+    summary.statistics.elapsed = time.perf_counter() - run_start
+    if options.stats_path is not None:
+        summary.statistics.write(options.stats_path)
+    summary.event_log.report(summary.statistics)
+
+    logger.info(
+        f"{summary.total} file(s) processed: {summary.counts[FileStatus.PATCHED]} patched, "
+        f"{summary.counts[FileStatus.REWRITTEN]} rewritten, {summary.counts[FileStatus.UNCHANGED]} unchanged, "
+        f"{summary.counts[FileStatus.SKIPPED]} skipped, {summary.failed} failed"
+    )
+    return summary
+
+
+def _journal_group_values(compiled: edit_plan.EditPlan, options: parse_argument.Options, run_journal: Journal) -> None:
+    """Record the values generated for each group in the journal, and give the groups of a resumed run their values again
+
+    Args:
+        compiled (EditPlan): Compiled plan, tags without value included
         options (Options): Options
+        run_journal (Journal): Journal of the run
+    """
+    from fill_dcm import grouping
 
+    group_values = grouping.get_group_values(options.group_by, options.uid_root)
+    for group, values in run_journal.groups.items():
+        group_values.restore(group, compiled.resolve(lambda entry: values[entry.keyword]))
+    group_values.on_generated = lambda group, plan: run_journal.record_group(group, generated_values(compiled, plan))
+
+
+def _adjust_dicom_files(
+    files: Iterable[str], files_count: int, plan: edit_plan.EditPlan, options: parse_argument.Options, summary: ProcessingSummary
+) -> None:
+    """Adjust the files of a run, by groups, in the current process or spread over a pool of processes
+
+    Args:
+        files (Iterable[str]): paths to DICOM files, without the archives and the files already processed (see _to_process())
+        files_count (int): Number of files given to the run, None if they are discovered during the run
+        plan (EditPlan): Plan of the run (see run_plan())
+        options (Options): Options
+        summary (ProcessingSummary): Summary the results are added to
     """
-    update_data(input_tags)
+    from fill_dcm import grouping
 
-    for file in files:
-        logger.info(f"Work on file: {file}")
-        try:
-            dataset = dcmread(file)
-        except (errors.InvalidDicomError, Exception) as error:
-            logger.error(f"Invalid file to read: {file}: {error}")
-            continue
+    jobs = options.jobs if files_count is None else min(options.jobs, files_count)
+    if files_count is None and jobs > 1:
+        files, jobs = _prefetched(files, jobs)
+    if options.group_by is not None:
+        groups = grouping.grouped_plans(
+            files, plan, options.group_by, options.memory_map, grouping.get_group_values(options.group_by, options.uid_root)
+        )
+        _adjust_dicom_groups(groups, options, jobs, chunk_size(files_count, jobs), summary)
+    elif jobs <= 1:
+        for file in files:
+            summary.add(adjust_dicom_file(file, plan, options))
+    else:
+        # The compiled plan is sent once to each worker, only file paths and results go through the pool afterward
+        from concurrent.futures import ProcessPoolExecutor
 
-        adjust_dicom_dataset(dataset, input_tags)
-        try:
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(plan, options, logging.getLogger().getEffectiveLevel()),
+        ) as executor:
+            for result in map_chunks(executor, _adjust_dicom_chunk_in_worker, files, jobs, chunk_size(files_count, jobs)):
+                summary.add(result)
+
+
+def _adjust_dicom_groups(
+    groups: Iterable[Tuple[edit_plan.EditPlan, List[str]]], options: parse_argument.Options, jobs: int, size: int, summary: ProcessingSummary
+) -> None:
+    """Adjust groups of files one after the other, each with its own plan (see grouping.grouped_plans())
+
+    Args:
+        groups (Iterable[Tuple[EditPlan, List[str]]]): plan and files of each group
+        options (Options): Options
+        jobs (int): Number of processes
+        size (int): Number of files sent at once to a worker process (see chunk_size())
+        summary (ProcessingSummary): Summary the results are added to
+    """
+    if options.pipeline:
+        from fill_dcm import pipeline
+
+        for plan, files in groups:
+            pipeline.adjust_dicom_files_pipeline(files, plan, options, summary)
+    elif jobs <= 1:
+        for plan, files in groups:
+            for file in files:
+                summary.add(adjust_dicom_file(file, plan, options))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # A chunk may span consecutive groups: each file is sent with the plan of its group, pickled once per chunk
+        files = ((plan, file) for plan, group in groups for file in group)
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(None, options, logging.getLogger().getEffectiveLevel()),
+        ) as executor:
+            for result in map_chunks(executor, _adjust_dicom_group_chunk_in_worker, files, jobs, size):
+                summary.add(result)
+
+
+def _prefetched(files: Iterable[str], jobs: int) -> Tuple[Iterator[str], int]:
+    """Read the first discovered files, a chunk per worker (see STREAM_CHUNK_SIZE), to size the pool from them: files fitting in a
+    chunk are adjusted in the current process, without pool, and a pool never has more workers than chunks to process
+
+    Args:
+        files (Iterable[str]): paths to DICOM files, discovered during the run
+        jobs (int): Number of processes requested
+
+    Returns:
+        Tuple[Iterator[str], int]: all the files, the first ones included, and the number of processes to use
+    """
+    files = iter(files)
+    first_files = list(itertools.islice(files, jobs * STREAM_CHUNK_SIZE))
+    chunks = -(-len(first_files) // STREAM_CHUNK_SIZE)
+    return itertools.chain(first_files, files), max(1, min(jobs, chunks))
+
+
+def _to_process(file: str, summary: ProcessingSummary, archives: List[str], options: parse_argument.Options) -> bool:
+    """Select a file of the run. Files already processed, by the interrupted run (journal) or by a previous run (manifest), are
+    accounted in the summary. Archives are appended to a list, processed after the other files
+
+    Args:
+        file (str): path to a DICOM file
+        summary (ProcessingSummary): Summary of the run, with its journal and its manifest
+        archives (List[str]): Archives of the run
+        options (Options): Options
+
+    Returns:
+        bool: True if the file remains to process with the other files
+    """
+    from fill_dcm import archive
+
+    if summary.journal is not None and summary.journal.completed(file):
+        status, error = summary.journal.replayed[os.path.abspath(file)]
+        summary.add(FileResult(file, FileStatus(status), error), recorded=False)
+        return False
+    if summary.manifest is not None:
+        if archive.is_archive(file):
+            output_file = archive.output_archive_path(file, options.overwrite_output_file)
+        else:
             output_file = output_filepath(file, options.overwrite_output_file)
-            dataset.save_as(output_file)
-        except Exception as error:
-            logger.error(f"Can't write the DICOM file: {output_file}: {error}")
-            continue
+        if summary.manifest.up_to_date(file, output_file):
+            summary.add(FileResult(file, FileStatus.SKIPPED))
+            return False
+    if archive.is_archive(file):
+        archives.append(file)
+        return False
+    return True
+
+
+def _without_archives(files: Iterable[str], archives: List[str]) -> Iterator[str]:
+    """Yield the files that aren't archives and append the archives to a list, processed after the other files"""
+    from fill_dcm import archive
 
+    for file in files:
+        if archive.is_archive(file):
+            archives.append(file)
+        else:
+            yield file
+
+
+def durability_policy(options: parse_argument.Options) -> durability.DurabilityPolicy:
+    """Return the durability policy of a run described by its options"""
+    return durability.DurabilityPolicy(options.durability, options.sync_files, options.sync_seconds)
+
+
+def positive_integer(value: str) -> int:
+    """argparse type of parameters such as --jobs: a strictly positive number"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a number")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} shall be greater or equal to 1")
+    return number
+
+
+def positive_number(value: str) -> float:
+    """argparse type of parameters such as --sync-seconds: a strictly positive number, decimals allowed"""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a number")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"{value} shall be greater than 0")
+    return number
 
-def fill_dcm_executable() -> None:
-    """Main function that does the job"""
+
+def fraction(value: str) -> float:
+    """argparse type of parameters such as --log-sample: a number greater than 0 and lower or equal to 1"""
+    number = positive_number(value)
+    if number > 1:
+        raise argparse.ArgumentTypeError(f"{value} shall be lower or equal to 1")
+    return number
+
+
+def uid_root(value: str) -> str:
+    """argparse type of --uid-root: a UID short enough to prefix the generated UIDs (see uids.invalid_root())"""
+    from fill_dcm import uids
+
+    reason = uids.invalid_root(value)
+    if reason is not None:
+        raise argparse.ArgumentTypeError(f"{value} isn't a valid UID root: {reason}")
+    return value
+
+
+def add_network_arguments(command_line: argparse.ArgumentParser) -> None:
+    """Add the arguments of the "forward" subcommand to the command line"""
+    command_line.add_argument(
+        "--destination",
+        required=True,
+        help="Address and port of the SCP the adjusted datasets are forwarded to: <host>:<port>.",
+    )
+    command_line.add_argument(
+        "--destination-ae-title",
+        default=parse_argument.DEFAULT_DESTINATION_AE_TITLE,
+        help=f"AE title of the destination. Defaults to {parse_argument.DEFAULT_DESTINATION_AE_TITLE}.",
+    )
+    command_line.add_argument(
+        "--port",
+        type=int,
+        default=parse_argument.DEFAULT_PORT,
+        help=f"Port the datasets are received on. Defaults to {parse_argument.DEFAULT_PORT}.",
+    )
+    command_line.add_argument("--listen-address", default="", help="Address the datasets are received on. Defaults to all addresses.")
+    command_line.add_argument(
+        "--ae-title",
+        default=parse_argument.DEFAULT_AE_TITLE,
+        help=f"AE title of FillDCM. Defaults to {parse_argument.DEFAULT_AE_TITLE}.",
+    )
+    command_line.add_argument(
+        "--associations",
+        type=positive_integer,
+        default=parse_argument.DEFAULT_ASSOCIATIONS,
+        help=f"Maximum number of associations opened with the destination. Defaults to {parse_argument.DEFAULT_ASSOCIATIONS}.",
+    )
+
+
+def fill_dcm_executable(arguments: List[str] = None) -> int:
+    """Main function that does the job. Subcommands are handled before the usual arguments:
+        - "serve" starts a server running the jobs sent on a Unix socket (see server module)
+        - "client" sends the job described by the usual arguments to a server instead of running it
+        - "forward" receives datasets with C-STORE, adjusts them and forwards them to another SCP (see network module)
+
+    Args:
+        arguments (List[str], optional): Command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: exit status. 0 if all files have been processed, otherwise 1
+    """
+    from fill_dcm import grouping
+
+    arguments = sys.argv[1:] if arguments is None else arguments
+    if arguments[:1] == ["serve"]:
+        from fill_dcm import server
+
+        return server.serve_executable(arguments[1:])
+    subcommand = arguments[0] if arguments[:1] in (["client"], ["forward"]) else None
 
     command_line = argparse.ArgumentParser(
-        prog="FillDCM",
+        prog="FillDCM" if subcommand is None else f"FillDCM {subcommand}",
         description="Tool to fill missing or empty DICOM tags or to replace others.",
     )
-    command_line.add_argument("files", metavar="dcm_file", nargs="+", help="List of DICOM files to edit")
+    if subcommand is not None:
+        arguments = arguments[1:]
+    if subcommand == "client":
+        command_line.add_argument("--socket", required=True, help="Path to the Unix socket of a server started by 'FillDCM serve'.")
+    if subcommand == "forward":
+        add_network_arguments(command_line)
+    else:
+        command_line.add_argument(
+            "files",
+            metavar="dcm_file",
+            nargs="*",
+            help="List of DICOM files to edit. Directories are walked recursively. ZIP and TAR archives are adjusted into new archives.",
+        )
+        command_line.add_argument(
+            "--files-from",
+            dest="files_from",
+            metavar="FILE",
+            help="Read the files and directories to edit from a file, one per line, '-' for the standard input. "
+            "Paths are read as the files are processed: the processing starts on the first file while the others are listed.",
+        )
+        command_line.add_argument(
+            "--include",
+            action="append",
+            help="Glob pattern of the files to edit in the directories, matched against their name or their path relative to the directory "
+            "(e.g. '*.dcm'). Can be repeated. Defaults to all files.",
+        )
+        command_line.add_argument(
+            "--exclude",
+            action="append",
+            help="Glob pattern of the files and directories to skip in the directories, matched against their name or their path relative "
+            "to the directory (e.g. 'DICOMDIR'). Can be repeated.",
+        )
     command_line.add_argument(
         "-f",
         "--fill-tag",
@@ -175,20 +1099,222 @@ def fill_dcm_executable() -> None:
         help="Enable verbose mode. More logs output.",
     )
 
+    command_line.add_argument(
+        "-J",
+        "--jobs",
+        dest="jobs",
+        type=positive_integer,
+        default=None,
+        help="Number of processes used to adjust the DICOM files. Defaults to the number of CPUs.",
+    )
+    command_line.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Overlap reads, adjustments and writes of different files in an asyncio pipeline. --jobs is ignored.",
+    )
+    command_line.add_argument(
+        "--read-concurrency",
+        type=positive_integer,
+        default=parse_argument.DEFAULT_READ_CONCURRENCY,
+        help=f"Pipeline mode: number of files read concurrently. Defaults to {parse_argument.DEFAULT_READ_CONCURRENCY}.",
+    )
+    command_line.add_argument(
+        "--adjust-concurrency",
+        type=positive_integer,
+        default=parse_argument.DEFAULT_ADJUST_CONCURRENCY,
+        help=f"Pipeline mode: number of datasets adjusted concurrently. Defaults to {parse_argument.DEFAULT_ADJUST_CONCURRENCY}.",
+    )
+    command_line.add_argument(
+        "--write-concurrency",
+        type=positive_integer,
+        default=parse_argument.DEFAULT_WRITE_CONCURRENCY,
+        help=f"Pipeline mode: number of files written concurrently. Defaults to {parse_argument.DEFAULT_WRITE_CONCURRENCY}.",
+    )
+    command_line.add_argument(
+        "--queue-size",
+        type=positive_integer,
+        default=parse_argument.DEFAULT_QUEUE_SIZE,
+        help=f"Pipeline mode: number of files waiting between two stages. Defaults to {parse_argument.DEFAULT_QUEUE_SIZE}.",
+    )
+
+    command_line.add_argument(
+        "--recursive",
+        action="store_true",
+        help="Also fill or replace the tags in the items of the sequences, at any depth, in a single traversal of each dataset. "
+        "Missing tags are only added to the top-level dataset.",
+    )
+    command_line.add_argument(
+        "--no-value-check",
+        dest="check_values",
+        action="store_false",
+        help="Don't check the values against the rules of the VR of their tag (length, characters, DA/TM/DT/UI formats...). "
+        "By default, they are checked once before any file is processed, and not again on each file.",
+    )
+    generated_values = command_line.add_mutually_exclusive_group()
+    generated_values.add_argument(
+        "--per-file-values",
+        action="store_true",
+        help="Generate new values for each file for tags to fill without value. By default, the same generated values are used for all files.",
+    )
+    generated_values.add_argument(
+        "--group-by",
+        choices=grouping.GROUP_BY,
+        help="Generate new values for each patient, study or series for tags without value: the files are bucketed by PatientID, "
+        "StudyInstanceUID or SeriesInstanceUID, read from their header, and each group is processed as a unit with its own values.",
+    )
+    generated_values.add_argument(
+        "--mapping-store",
+        dest="mapping_store",
+        help="SQLite database mapping original values to generated values. Tags without value get, per file, the value mapped to their "
+        "original value: the same original value gets the same generated value across files and runs. Tags to replace may then have no value.",
+    )
+    command_line.add_argument(
+        "--uid-root",
+        dest="uid_root",
+        metavar="ROOT",
+        type=uid_root,
+        help="Organization root of the generated UIDs: <root>.<namespace>.<counter>. The namespace is unique to each process and run, "
+        "so UIDs never collide, even across parallel jobs. By default, UIDs are derived from random UUIDs in the 2.25.<integer> form.",
+    )
+    command_line.add_argument(
+        "--mapping-cache-size",
+        type=positive_integer,
+        default=parse_argument.DEFAULT_CACHE_SIZE,
+        help=f"Number of mappings kept in memory. Defaults to {parse_argument.DEFAULT_CACHE_SIZE}.",
+    )
+
+    command_line.add_argument(
+        "--stats",
+        dest="stats_path",
+        help="Write the statistics of the run in a JSON file: time spent in each stage (total, p50, p95, p99), slowest files, "
+        "bytes read and written and errors.",
+    )
+    command_line.add_argument(
+        "--stats-slowest",
+        type=positive_integer,
+        default=stats.DEFAULT_SLOWEST_FILES,
+        help=f"Number of slowest files reported in the statistics. Defaults to {stats.DEFAULT_SLOWEST_FILES}.",
+    )
+    command_line.add_argument(
+        "--mmap",
+        dest="memory_map",
+        action="store_true",
+        help="Read the input files through memory maps: headers are parsed from the mapped view and the bytes copied as is are written from it.",
+    )
+    command_line.add_argument(
+        "--dry-run",
+        "--scan",
+        dest="dry_run",
+        action="store_true",
+        help="Only scan the files, in parallel, without writing anything: only the tags of the plan are read, up to the highest one. "
+        "The number of files where each tag is missing, empty or present and the files a run would write are reported.",
+    )
+    command_line.add_argument(
+        "--scan-report",
+        dest="scan_report",
+        help="Dry run: write the report of the scan in a JSON file, with the list of the files a run would write.",
+    )
+    command_line.add_argument(
+        "--manifest",
+        dest="manifest_path",
+        help="Incremental mode: SQLite database recording the size and modification time of each processed file and the hash of the tags "
+        "and of the options changing the output. Files processed with the same tags and options, and unchanged since, are skipped.",
+    )
+    command_line.add_argument(
+        "--journal",
+        dest="journal_path",
+        help="Append the outcome of each file to a journal, by batches, so an interrupted run can be resumed with --resume.",
+    )
+    command_line.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume the run recorded in the journal: files it completed or failed are not processed again.",
+    )
+    command_line.add_argument(
+        "--log-detail",
+        choices=events.LOG_DETAILS,
+        default=events.TAG_DETAIL,
+        help="Events logged for each file: 'tag', one per tag added or updated; 'file', one per file; 'run', none. "
+        "The changes and errors of the run are always reported once aggregated. Defaults to tag.",
+    )
+    command_line.add_argument(
+        "--log-sample",
+        type=fraction,
+        default=1.0,
+        help="Fraction of the files, between 0 and 1, whose events are logged. Errors are always logged. Defaults to 1.",
+    )
+    command_line.add_argument("--log-json", action="store_true", help="Write the logs as JSON lines, with the fields of each event.")
+    command_line.add_argument(
+        "--durability",
+        choices=durability.DURABILITY_POLICIES,
+        default=durability.NO_SYNC,
+        help="Files are always written to a temporary file renamed once complete. 'none': left to the operating system to flush. "
+        "'batch': the files of each batch are synced at the end of the batch, then renamed into place, then their directories are synced. 'directory': the directories of the renamed files are synced once per batch. "
+        f"Defaults to {durability.NO_SYNC}.",
+    )
+    command_line.add_argument(
+        "--sync-files",
+        type=positive_integer,
+        default=durability.DEFAULT_SYNC_FILES,
+        help=f"Number of written files ending a batch of the durability policy. Defaults to {durability.DEFAULT_SYNC_FILES}.",
+    )
+    command_line.add_argument(
+        "--sync-seconds",
+        type=positive_number,
+        default=durability.DEFAULT_SYNC_SECONDS,
+        help=f"Seconds ending a batch of the durability policy, even if it has fewer files. Defaults to {durability.DEFAULT_SYNC_SECONDS:g}.",
+    )
+
     # TODO allow to pass tag as tag "0010,0010"
 
-    input_args: argparse.Namespace = command_line.parse_args()
+    input_args: argparse.Namespace = command_line.parse_args(arguments)
+    if subcommand != "forward" and not input_args.files and input_args.files_from is None:
+        command_line.error("the following arguments are required: dcm_file or --files-from")
     try:
         input_tags, options = parse_argument.parse(input_args)
-        logging.basicConfig(
-            level=logging.DEBUG if options.verbose_log else logging.INFO,
-            format="%(levelname)s - %(message)s",
-        )
+        # Logs of a local run are written by batches. The network mode runs until interrupted: its logs are written as they come
+        batch = events.DEFAULT_LOG_BATCH if subcommand is None else 0
+        events.configure_logging(logging.DEBUG if options.verbose_log else logging.INFO, options.log_json, batch)
     except parse_argument.InvalidArgument as invalid_argument:
         command_line.error(f"Invalid argument: {invalid_argument}")
 
+    if subcommand == "client":
+        from fill_dcm import server
+
+        files = list(
+            discovery.discover(
+                input_args.files, input_args.files_from, input_args.include, input_args.exclude, skip_outputs=not options.overwrite_output_file
+            )
+        )
+        return server.submit_executable(input_args.socket, files, input_tags, options)
+    if subcommand == "forward":
+        try:
+            from fill_dcm import network
+        except ImportError as error:
+            logger.error(f"The network mode requires pynetdicom (pip install pynetdicom): {error}")
+            return 1
+        try:
+            return network.forward_executable(input_args, input_tags, options)
+        except Exception as error:
+            logger.error(f"Can't process an error encountered: {error}")
+            return 1
+
     try:
-        parse_argument.verify_input_tags(input_tags)
-        adjust_dicom_files(input_args.files, input_tags, options)
+        parse_argument.verify_input_tags(input_tags, generated_replacements=options.mapping_store is not None, check_values=options.check_values)
+        # Files are discovered as they are processed
+        files = discovery.discover(
+            input_args.files, input_args.files_from, input_args.include, input_args.exclude, skip_outputs=not options.overwrite_output_file
+        )
+        if options.dry_run:
+            from fill_dcm import scan
+
+            failed = len(scan.scan_dicom_files(files, input_tags, options).errors)
+        else:
+            failed = adjust_dicom_files(files, input_tags, options).failed
     except Exception as error:
         logger.error(f"Can't process an error encountered: {error}")
+        return 1
+    finally:
+        for handler in logging.getLogger().handlers:
+            handler.flush()
+    return 0 if failed == 0 else 1
@@ -0,0 +1,175 @@
+""" grouping: files bucketed by patient, study or series, with values generated once per group
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from fill_dcm import fill_dcm
+from fill_dcm.mapping_store import LRUCache
+
+# The modes are choices of the command line: pydicom is only imported when files are grouped
+if TYPE_CHECKING:
+    from fill_dcm import edit_plan
+
+logger = logging.getLogger()
+
+# Tag identifying the group of a file, by grouping mode
+GROUP_TAGS = {"patient": "PatientID", "study": "StudyInstanceUID", "series": "SeriesInstanceUID"}
+GROUP_BY = tuple(GROUP_TAGS)
+
+# Number of groups whose values are kept in memory: a group seen again after this many others gets new values
+GROUP_CACHE_SIZE = 100_000
+
+
+def file_group(file: str, group_by: str, memory_map: bool = False) -> str:
+    """Return the group of a file, read from its header up to the tag of the group only
+
+    Args:
+        file (str): Path to the DICOM file
+        group_by (str): Grouping mode, one of GROUP_BY
+        memory_map (bool, optional): Set to True to read the file through a memory map. Defaults to False.
+
+    Returns:
+        str: the value of the tag of the group, None if the file can't be read or has no value for the tag
+    """
+    from pydicom.tag import Tag
+
+    from fill_dcm import dicom_io
+
+    tag = Tag(GROUP_TAGS[group_by])
+    try:
+        dataset = dicom_io.read_tags(file, [tag], memory_map)
+    except Exception as error:
+        # The file is read again, and its error reported, when it is processed
+        logger.debug("Can't read the group of %s: %s", file, error)
+        return None
+    return fill_dcm.original_value(dataset, tag) or None
+
+
+class GroupValues:
+    """Plans of the groups, with values generated once per group and cached for the run"""
+
+    def __init__(self, group_by: str, cache_size: int = GROUP_CACHE_SIZE, uid_root: str = None):
+        """GroupValues constructor
+
+        Args:
+            group_by (str): Grouping mode, one of GROUP_BY
+            cache_size (int, optional): Number of groups kept in memory. Defaults to GROUP_CACHE_SIZE.
+            uid_root (str, optional): Organization root of the generated UIDs. Defaults to None, the 2.25 form.
+        """
+        self.group_by: str = group_by
+        self.tag: str = GROUP_TAGS[group_by]
+        self.uid_root: str = uid_root
+        self._plans = LRUCache(cache_size)
+        # Called with each group and its plan once its values are generated, to record them (see fill_dcm.adjust_dicom_files())
+        self.on_generated: Callable[[str, edit_plan.EditPlan], None] = None
+        # Datasets received from the network are adjusted by concurrent threads
+        self._lock = threading.Lock()
+
+    def plan(self, group: str, plan: edit_plan.EditPlan) -> edit_plan.EditPlan:
+        """Return the plan of a group: tags without value get values generated at the first file of the group
+
+        Args:
+            group (str): Group of the file (see file_group()), None if it has none: the file gets its own values
+            plan (EditPlan): Plan of the run, tags without value included (see fill_dcm.run_plan())
+
+        Returns:
+            EditPlan: the plan with all values defined
+        """
+        if group is None:
+            return plan.resolve(lambda entry: fill_dcm.value_generator(entry.keyword, self.uid_root)())
+        with self._lock:
+            resolved = self._plans.get(group)
+            if resolved is None:
+                resolved = plan.resolve(lambda entry: fill_dcm.value_generator(entry.keyword, self.uid_root)())
+                self._plans.put(group, resolved)
+                if self.on_generated is not None:
+                    self.on_generated(group, resolved)
+            return resolved
+
+    def restore(self, group: str, plan: edit_plan.EditPlan) -> None:
+        """Give a group the plan it got in a previous run, such as an interrupted run being resumed
+
+        Args:
+            group (str): Group of the files (see file_group())
+            plan (EditPlan): Plan of the group, with all values defined
+        """
+        with self._lock:
+            self._plans.put(group, plan)
+
+    def dataset_plan(self, dataset, plan: edit_plan.EditPlan) -> edit_plan.EditPlan:
+        """Return the plan of a dataset, from the group given by its original value of the tag of the group"""
+        return self.plan(fill_dcm.original_value(dataset, self.tag) or None, plan)
+
+
+def group_files(files: Iterable[str], group_by: str, memory_map: bool = False) -> Dict[str, List[str]]:
+    """Bucket files by group. Files without group are bucketed under None
+
+    Args:
+        files (Iterable[str]): paths to DICOM files
+        group_by (str): Grouping mode, one of GROUP_BY
+        memory_map (bool, optional): Set to True to read the files through memory maps. Defaults to False.
+
+    Returns:
+        Dict[str, List[str]]: files of each group, in the order their first file was found
+    """
+    groups: Dict[str, List[str]] = {}
+    for file in files:
+        groups.setdefault(file_group(file, group_by, memory_map), []).append(file)
+    logger.info(f"{sum(len(group) for group in groups.values())} file(s) in {len(groups)} group(s) by {group_by}")
+    return groups
+
+
+def grouped_plans(
+    files: Iterable[str], plan: edit_plan.EditPlan, group_by: str, memory_map: bool = False, values: GroupValues = None
+) -> Iterator[Tuple[edit_plan.EditPlan, List[str]]]:
+    """Yield the groups of files to process as units, each with its plan. Files without group are yielded one by one,
+    each with its own values
+
+    Args:
+        files (Iterable[str]): paths to DICOM files
+        plan (EditPlan): Plan of the run, tags without value included (see fill_dcm.run_plan())
+        group_by (str): Grouping mode, one of GROUP_BY
+        memory_map (bool, optional): Set to True to read the files through memory maps. Defaults to False.
+        values (GroupValues, optional): Values of the groups. Defaults to None, the values of the current process (see get_group_values()).
+
+    Returns:
+        Iterator[Tuple[EditPlan, List[str]]]: plan and files of each group
+    """
+    values = values if values is not None else get_group_values(group_by)
+    for group, members in group_files(files, group_by, memory_map).items():
+        if group is None:
+            for file in members:
+                yield values.plan(None, plan), [file]
+        else:
+            yield values.plan(group, plan), members
+
+
+# Values of the groups of the current process, by grouping mode and UID root
+_group_values: Dict[Tuple[int, str, str], GroupValues] = {}
+
+
+def get_group_values(group_by: str, uid_root: str = None) -> GroupValues:
+    """Return the values of the groups of the current process: files and archive members of the same group get the same values
+
+    Args:
+        group_by (str): Grouping mode, one of GROUP_BY
+        uid_root (str, optional): Organization root of the generated UIDs. Defaults to None, the 2.25 form.
+
+    Returns:
+        GroupValues: the values of the groups
+    """
+    key = (os.getpid(), group_by, uid_root)
+    if key not in _group_values:
+        _group_values[key] = GroupValues(group_by, uid_root=uid_root)
+    return _group_values[key]
+
+
+def clear_group_values() -> None:
+    """Forget the values of the groups of the current process: the next run generates new ones"""
+    for key in [key for key in _group_values if key[0] == os.getpid()]:
+        del _group_values[key]
@@ -0,0 +1,167 @@
+""" journal: append-only record of the files completed or failed by a run, replayed to resume an interrupted run
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+logger = logging.getLogger()
+
+# Entries kept in memory before being appended to the journal, unless DEFAULT_BATCH_SECONDS elapse first
+DEFAULT_BATCH_ENTRIES = 256
+DEFAULT_BATCH_SECONDS = 2.0
+
+
+class JournalMismatch(Exception):
+    """Exception to handle a journal written by a run with other tags"""
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """Read the header of a journal: the hash of the tags of its run and the values generated for them
+
+    Args:
+        path (str): Path to the journal
+
+    Returns:
+        Dict[str, Any]: the header, empty if the journal is empty
+    """
+    with open(path, "r", encoding="utf-8") as journal_file:
+        header = journal_file.readline()
+    return json.loads(header) if header else {}
+
+
+def _read_entries(path: str, plan_hash: str) -> Iterator[Dict[str, Any]]:
+    """Yield the entries of a journal, following its header. A last line cut by the interruption of the run is ignored
+
+    Exceptions:
+        JournalMismatch if the journal was written by a run with other tags
+    """
+    with open(path, "r", encoding="utf-8") as journal_file:
+        header = journal_file.readline()
+        if header and json.loads(header).get("plan_hash") != plan_hash:
+            raise JournalMismatch(f"The journal {path} was written by a run with other tags")
+        for line in journal_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.debug(f"Ignore an incomplete line of the journal {path}")
+
+
+def replay(path: str, plan_hash: str) -> Dict[str, Tuple[str, str]]:
+    """Read the files of a journal
+
+    Args:
+        path (str): Path to the journal
+        plan_hash (str): Hash of the tags of the run resumed (see manifest.plan_hash())
+
+    Returns:
+        Dict[str, Tuple[str, str]]: status and error of each file of the journal, by absolute path
+    Exceptions:
+        JournalMismatch if the journal was written by a run with other tags
+    """
+    return {entry["file"]: (entry["status"], entry.get("error")) for entry in _read_entries(path, plan_hash) if "file" in entry}
+
+
+def replay_groups(path: str, plan_hash: str) -> Dict[str, Dict[str, Any]]:
+    """Read the values generated for the groups of a journal (see Journal.record_group())
+
+    Args:
+        path (str): Path to the journal
+        plan_hash (str): Hash of the tags of the run resumed (see manifest.plan_hash())
+
+    Returns:
+        Dict[str, Dict[str, Any]]: values generated for each group, by keyword
+    Exceptions:
+        JournalMismatch if the journal was written by a run with other tags
+    """
+    return {entry["group"]: entry["values"] for entry in _read_entries(path, plan_hash) if "group" in entry}
+
+
+class Journal:
+    """Journal of a run. Entries are buffered and appended by batches with a single write: a crash loses at most
+    the last batch, whose files are processed again when the run is resumed"""
+
+    def __init__(
+        self,
+        path: str,
+        plan_hash: str,
+        resume: bool = False,
+        values: Dict[str, Any] = None,
+        batch_entries: int = DEFAULT_BATCH_ENTRIES,
+        batch_seconds: float = DEFAULT_BATCH_SECONDS,
+    ):
+        """Journal constructor. Without resume, an existing journal is replaced
+
+        Args:
+            path (str): Path to the journal
+            plan_hash (str): Hash of the tags of the run (see manifest.plan_hash())
+            resume (bool, optional): Set to True to replay the existing journal and append to it. Defaults to False.
+            values (Dict[str, Any], optional): Values generated for the tags without value, by keyword, written in the header of a new
+                journal. Defaults to None.
+            batch_entries (int, optional): Number of entries appended at once. Defaults to DEFAULT_BATCH_ENTRIES.
+            batch_seconds (float, optional): Maximum number of seconds an entry waits to be appended. Defaults to DEFAULT_BATCH_SECONDS.
+        Exceptions:
+            JournalMismatch if the journal to resume was written by a run with other tags
+        """
+        self.path: str = path
+        self.batch_entries: int = batch_entries
+        self.batch_seconds: float = batch_seconds
+        # Files already completed or failed by the resumed run
+        self.replayed: Dict[str, Tuple[str, str]] = {}
+        # Values generated for the run: the values of the resumed run, applied again on the remaining files
+        self.values: Dict[str, Any] = values if values is not None else {}
+        # Values generated for each group by the resumed run, applied again on the remaining files of the group
+        self.groups: Dict[str, Dict[str, Any]] = {}
+        self.resumed: bool = resume and os.path.exists(path) and os.path.getsize(path) > 0
+        if self.resumed:
+            self.replayed = replay(path, plan_hash)
+            self.groups = replay_groups(path, plan_hash)
+            self.values = read_header(path).get("values", {})
+            self._file_descriptor = os.open(path, os.O_RDWR | os.O_APPEND)
+            # A line cut by the interruption is ended: the next entries are appended on their own lines
+            if os.pread(self._file_descriptor, 1, os.fstat(self._file_descriptor).st_size - 1) != b"\n":
+                os.write(self._file_descriptor, b"\n")
+        else:
+            self._file_descriptor = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.write(self._file_descriptor, (json.dumps({"plan_hash": plan_hash, "values": self.values}) + "\n").encode("utf-8"))
+        self._pending: List[str] = []
+        self._last_write: float = time.monotonic()
+
+    def completed(self, file: str) -> bool:
+        """Indicate if the resumed run already completed or failed a file"""
+        return os.path.abspath(file) in self.replayed
+
+    def record(self, file: str, status: str, error: str = None) -> None:
+        """Record the outcome of a file, appended with the next batch
+
+        Args:
+            file (str): Path to the file
+            status (str): Status of the file (see fill_dcm.FileStatus)
+            error (str, optional): Error message if the processing failed. Defaults to None.
+        """
+        self._pending.append(json.dumps({"file": os.path.abspath(file), "status": status, "error": error}))
+        if len(self._pending) >= self.batch_entries or time.monotonic() - self._last_write >= self.batch_seconds:
+            self.flush()
+
+    def record_group(self, group: str, values: Dict[str, Any]) -> None:
+        """Record the values generated for a group, appended with the next batch: before the entries of the files of the group
+
+        Args:
+            group (str): Group (see grouping.file_group())
+            values (Dict[str, Any]): Values generated for the group, by keyword
+        """
+        self._pending.append(json.dumps({"group": group, "values": values}))
+
+    def flush(self) -> None:
+        """Append the pending entries with a single write"""
+        if self._pending:
+            os.write(self._file_descriptor, ("\n".join(self._pending) + "\n").encode("utf-8"))
+            self._pending.clear()
+        self._last_write = time.monotonic()
+
+    def close(self) -> None:
+        """Append the pending entries and close the journal"""
+        self.flush()
+        os.close(self._file_descriptor)
@@ -0,0 +1,139 @@
+""" manifest: files already processed with a plan, skipped by the next runs while they are unchanged
+"""
+
+import hashlib
+import json
+import os
+from typing import List, Tuple
+
+from fill_dcm import parse_argument
+
+# Number of processed files recorded in a single transaction
+DEFAULT_COMMIT_ROWS = 1000
+
+# Time, in seconds, a process waits for another one to release the database
+BUSY_TIMEOUT = 60
+
+# Options changing the files written by a run, with their default value
+OUTPUT_OPTIONS = {
+    "overwrite_output_file": False,
+    "recursive": False,
+    "check_values": True,
+    "mapping_store": None,
+    "per_file_values": False,
+    "group_by": None,
+    "uid_root": None,
+}
+
+
+def plan_hash(input_tags: parse_argument.InputTags, options: parse_argument.Options = None) -> str:
+    """Hash of the content of the tags to fill and to replace, independent of their order, and of the options changing the output
+
+    Args:
+        input_tags (InputTags): Tags to fill or to replace
+        options (Options, optional): Options of the run, only OUTPUT_OPTIONS are hashed. Defaults to None, the tags only.
+
+    Returns:
+        str: SHA-256 of the tags and the options, in hexadecimal
+    """
+    scope = [input_tags.tags_to_fill, input_tags.tags_to_replace]
+    # Hashes of the runs with the default options are the hashes of their tags
+    changed = {name: getattr(options, name) for name, default in OUTPUT_OPTIONS.items() if options is not None and getattr(options, name) != default}
+    if changed:
+        scope.append(changed)
+    content = json.dumps(scope, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _stat(path: str) -> Tuple[int, int]:
+    """Size and modification time of a file, (None, None) if it doesn't exist"""
+    try:
+        status = os.stat(path)
+    except OSError:
+        return None, None
+    return status.st_size, status.st_mtime_ns
+
+
+class Manifest:
+    """Size and modification time of each file once processed, and of its output, and the hash of the plan it was processed with.
+    A file whose size, modification time, output and plan are the ones of the manifest is up to date: two stats are enough to skip
+    it. Records are stored in a SQLite database, committed by batches."""
+
+    def __init__(self, path: str, plan_hash: str, commit_rows: int = DEFAULT_COMMIT_ROWS):
+        """Manifest constructor. The database is created if it doesn't exist
+
+        Args:
+            path (str): Path to the SQLite database
+            plan_hash (str): Hash of the plan of the run (see plan_hash())
+            commit_rows (int, optional): Number of processed files recorded in a single transaction. Defaults to DEFAULT_COMMIT_ROWS.
+        """
+        import sqlite3
+
+        self.path: str = path
+        self.plan_hash: str = plan_hash
+        self.commit_rows: int = commit_rows
+        self._pending: List[Tuple[str, int, int, int, int, str]] = []
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        # Manifests without the outputs of the files are replaced: their files are processed again
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(files)")]
+        if columns and "output_size" not in columns:
+            self._connection.execute("DROP TABLE files")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "output_size INTEGER, output_mtime_ns INTEGER, plan_hash TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def up_to_date(self, file: str, output_file: str) -> bool:
+        """Indicate if a file has been processed with the plan and neither it nor its output have been modified since
+
+        Args:
+            file (str): Path to the file
+            output_file (str): Path to the output of the file, the file itself when it is overwritten
+
+        Returns:
+            bool: True if the file can be skipped
+        """
+        size, mtime_ns = _stat(file)
+        if size is None:
+            return False
+        row = self._connection.execute(
+            "SELECT size, mtime_ns, output_size, output_mtime_ns, plan_hash FROM files WHERE path = ?", (os.path.abspath(file),)
+        ).fetchone()
+        return row == (size, mtime_ns, *_stat(output_file), self.plan_hash)
+
+    def record(self, file: str, output_file: str = None) -> None:
+        """Record a processed file with its current size and modification time, and the ones of its output
+
+        Args:
+            file (str): Path to the processed file, its output when it is overwritten
+            output_file (str, optional): Path to the output written. Defaults to None, no output: the file is left as is.
+        """
+        size, mtime_ns = _stat(file)
+        if size is None:
+            return
+        output = _stat(output_file) if output_file is not None else (None, None)
+        self._pending.append((os.path.abspath(file), size, mtime_ns, *output, self.plan_hash))
+        if len(self._pending) >= self.commit_rows:
+            self.commit()
+
+    def commit(self) -> None:
+        """Write the files recorded since the last commit"""
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, output_size, output_mtime_ns, plan_hash) VALUES (?, ?, ?, ?, ?, ?)",
+                self._pending,
+            )
+        self._pending.clear()
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self) -> None:
+        """Commit the last recorded files and close the database"""
+        self.commit()
+        self._connection.close()
@@ -0,0 +1,141 @@
+""" mapping_store: persistent mapping between original values and generated values
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Number of mappings kept in memory by default
+DEFAULT_CACHE_SIZE = 100_000
+
+# Time, in seconds, a process waits for another one to release the database
+BUSY_TIMEOUT = 60
+
+
+class LRUCache:
+    """Bounded cache evicting the least recently used entries"""
+
+    def __init__(self, max_size: int):
+        """LRUCache constructor
+
+        Args:
+            max_size (int): Maximum number of entries in the cache
+        """
+        self.max_size: int = max_size
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value of a key and mark it as recently used, or default if the key isn't cached"""
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Cache a value, evicting the least recently used entry if the cache is full"""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class MappingStore:
+    """Map each original value of a tag to a generated value. Mappings are stored in a SQLite database,
+    so the same original value gets the same generated value across files, runs and processes.
+    The most recently used mappings are kept in memory."""
+
+    def __init__(self, path: str, cache_size: int = DEFAULT_CACHE_SIZE):
+        """MappingStore constructor. The database is created if it doesn't exist
+
+        Args:
+            path (str): Path to the SQLite database
+            cache_size (int, optional): Number of mappings kept in memory. Defaults to DEFAULT_CACHE_SIZE.
+        """
+        import sqlite3
+
+        self.path: str = path
+        self._cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        # (tag, original) is the primary key of a table without rowid: lookups go through a single B-tree
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS mapping (tag TEXT NOT NULL, original TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (tag, original)) WITHOUT ROWID"
+        )
+        self._connection.commit()
+
+    def get(self, tag: str, original: str, generator: Callable[[], Any]) -> Any:
+        """Return the value mapped to an original value of a tag. If there is none, a value is generated and stored.
+
+        Args:
+            tag (str): Tag name
+            original (str): Original value of the tag ("" if missing or empty)
+            generator (Callable[[], Any]): Generator of a new value
+
+        Returns:
+            Any: The mapped value
+        """
+        key = (tag, original)
+        with self._lock:
+            value = self._cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = self._load(key)
+                if value is _MISSING:
+                    value = self._store(key, generator())
+                self._cache.put(key, value)
+            return value
+
+    def _load(self, key: Tuple[str, str]) -> Any:
+        """Read a mapping from the database"""
+        row = self._connection.execute("SELECT value FROM mapping WHERE tag = ? AND original = ?", key).fetchone()
+        return _MISSING if row is None else json.loads(row[0])
+
+    def _store(self, key: Tuple[str, str], value: Any) -> Any:
+        """Store a new mapping. If another process stored one for the same key meanwhile, its value wins"""
+        with self._connection:
+            cursor = self._connection.execute("INSERT OR IGNORE INTO mapping (tag, original, value) VALUES (?, ?, ?)", (*key, json.dumps(value)))
+        return value if cursor.rowcount == 1 else self._load(key)
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM mapping").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database"""
+        self._connection.close()
+
+
+# Marks a key without mapping. None can't be used: it isn't a generated value but isn't forbidden either
+_MISSING = object()
+
+# Stores opened by the current process, by path
+_stores: Dict[Tuple[int, str], MappingStore] = {}
+
+
+def get_store(path: str, cache_size: int = DEFAULT_CACHE_SIZE) -> MappingStore:
+    """Return the store of a database, opened once per process
+
+    Args:
+        path (str): Path to the SQLite database
+        cache_size (int, optional): Number of mappings kept in memory. Defaults to DEFAULT_CACHE_SIZE.
+
+    Returns:
+        MappingStore: the store
+    """
+    # A SQLite connection can't be used by a forked process: the process id is part of the key
+    key = (os.getpid(), os.path.abspath(path))
+    if key not in _stores:
+        _stores[key] = MappingStore(path, cache_size)
+    return _stores[key]
+
+
+def close_stores() -> None:
+    """Close the stores opened by the current process"""
+    for key in [key for key in _stores if key[0] == os.getpid()]:
+        _stores.pop(key).close()
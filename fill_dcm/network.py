@@ -0,0 +1,201 @@
+""" network: receive DICOM datasets with C-STORE, adjust them in memory and forward them to another SCP.
+Relies on pynetdicom, an optional dependency.
+"""
+
+import logging
+import queue
+import signal
+import threading
+from typing import Tuple
+
+from pynetdicom import (
+    AE,
+    StoragePresentationContexts,
+    VerificationPresentationContexts,
+    evt,
+)
+from pynetdicom.association import Association
+
+from fill_dcm import edit_plan, fill_dcm, mapping_store, parse_argument
+from fill_dcm.parse_argument import DEFAULT_AE_TITLE, DEFAULT_ASSOCIATIONS
+
+logger = logging.getLogger()
+
+# C-STORE statuses returned to the sender when a dataset can't be adjusted or forwarded
+STATUS_CANNOT_UNDERSTAND = 0xC000
+STATUS_OUT_OF_RESOURCES = 0xA700
+
+
+class ForwardError(Exception):
+    """Exception to handle datasets that can't be forwarded to the destination"""
+
+
+class AssociationPool:
+    """Associations with the destination, opened on demand and reused by the threads forwarding datasets.
+    At most `size` associations are opened at once."""
+
+    def __init__(self, ae: AE, destination: Tuple[str, int], ae_title: str, size: int = DEFAULT_ASSOCIATIONS):
+        """AssociationPool constructor
+
+        Args:
+            ae (AE): Application entity requesting the associations
+            destination (Tuple[str, int]): Address and port of the destination
+            ae_title (str): AE title of the destination
+            size (int, optional): Maximum number of associations. Defaults to DEFAULT_ASSOCIATIONS.
+        """
+        self.ae: AE = ae
+        self.destination: Tuple[str, int] = destination
+        self.ae_title: str = ae_title
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+
+    def _acquire(self) -> Association:
+        """Return an idle association, or a new one if there is none. Blocks while `size` associations are in use"""
+        self._slots.acquire()
+        try:
+            while True:
+                association = self._idle.get_nowait()
+                if association.is_established:
+                    return association
+        except queue.Empty:
+            pass
+        association = self.ae.associate(*self.destination, ae_title=self.ae_title)
+        if not association.is_established:
+            self._slots.release()
+            raise ForwardError(f"Can't associate with {self.ae_title}@{self.destination[0]}:{self.destination[1]}")
+        return association
+
+    def _release(self, association: Association) -> None:
+        """Put an association back in the pool"""
+        if association.is_established:
+            self._idle.put(association)
+        self._slots.release()
+
+    def send(self, dataset) -> int:
+        """Send a dataset with C-STORE. An association closed by the destination meanwhile is replaced once
+
+        Args:
+            dataset (Dataset): Dataset to send, with its file meta information
+
+        Returns:
+            int: C-STORE status returned by the destination
+        Exceptions:
+            ForwardError if no association can be established or if the destination doesn't answer
+        """
+        for _ in range(2):
+            association = self._acquire()
+            try:
+                status = association.send_c_store(dataset)
+            finally:
+                self._release(association)
+            # An empty status means the association was aborted or timed out
+            if "Status" in status:
+                return status.Status
+        raise ForwardError(f"No answer from {self.ae_title} to the C-STORE of {dataset.SOPInstanceUID}")
+
+    def close(self) -> None:
+        """Release the idle associations"""
+        while True:
+            try:
+                association = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            association.release()
+
+
+class StoreForwarder:
+    """C-STORE SCP adjusting each received dataset with a plan and forwarding it through an AssociationPool.
+    Each association of a sender is handled by its own thread, datasets never go through the disk."""
+
+    def __init__(
+        self,
+        plan: edit_plan.EditPlan,
+        options: parse_argument.Options,
+        destination: Tuple[str, int],
+        destination_ae_title: str,
+        ae_title: str = DEFAULT_AE_TITLE,
+        associations: int = DEFAULT_ASSOCIATIONS,
+    ):
+        """StoreForwarder constructor
+
+        Args:
+            plan (EditPlan): Plan of the tags to replace/filled (see fill_dcm.run_plan())
+            options (Options): Options
+            destination (Tuple[str, int]): Address and port of the destination
+            destination_ae_title (str): AE title of the destination
+            ae_title (str, optional): AE title of FillDCM. Defaults to DEFAULT_AE_TITLE.
+            associations (int, optional): Maximum number of associations with the destination. Defaults to DEFAULT_ASSOCIATIONS.
+        """
+        self.plan: edit_plan.EditPlan = plan
+        self.options: parse_argument.Options = options
+        self.ae = AE(ae_title=ae_title)
+        # Datasets are forwarded with the transfer syntax they are received with: the same contexts are accepted and requested
+        self.ae.supported_contexts = StoragePresentationContexts + VerificationPresentationContexts
+        self.ae.requested_contexts = StoragePresentationContexts
+        self.pool = AssociationPool(self.ae, destination, destination_ae_title, associations)
+        self.server = None
+
+    def handle_store(self, event: evt.Event) -> int:
+        """Adjust a received dataset and forward it. The status of the destination is returned to the sender"""
+        dataset = event.dataset
+        dataset.file_meta = event.file_meta
+        try:
+            changes = fill_dcm.adjust_dicom_dataset(dataset, fill_dcm.dataset_plan(dataset, self.plan, self.options), self.options.recursive)
+            logger.debug("Adjust the dataset %s: %d change(s)", dataset.get("SOPInstanceUID"), len(changes))
+        except Exception as error:
+            logger.error("Can't adjust the dataset %s: %s", dataset.get("SOPInstanceUID"), error)
+            return STATUS_CANNOT_UNDERSTAND
+        try:
+            return self.pool.send(dataset)
+        except ForwardError as error:
+            logger.error("Can't forward the dataset %s: %s", dataset.SOPInstanceUID, error)
+            return STATUS_OUT_OF_RESOURCES
+
+    def start(self, address: Tuple[str, int]) -> Tuple[str, int]:
+        """Start listening without blocking
+
+        Args:
+            address (Tuple[str, int]): Address and port to listen on. Port 0 picks a free port
+
+        Returns:
+            Tuple[str, int]: address and port listened on
+        """
+        self.server = self.ae.start_server(address, block=False, evt_handlers=[(evt.EVT_C_STORE, self.handle_store)])
+        return self.server.server_address
+
+    def stop(self) -> None:
+        """Stop listening, release the associations with the destination and close the mapping stores"""
+        if self.server is not None:
+            self.server.shutdown()
+        self.pool.close()
+        mapping_store.close_stores()
+
+
+def forward_executable(input_args, input_tags: parse_argument.InputTags, options: parse_argument.Options) -> int:
+    """Network command line: forward datasets until interrupted
+
+    Args:
+        input_args (argparse.Namespace): CLI parameters, with the network ones
+        input_tags (InputTags): Tags to replace/filled in the received datasets
+        options (Options): Options
+
+    Returns:
+        int: exit status
+    """
+    parse_argument.verify_input_tags(input_tags, generated_replacements=options.mapping_store is not None, check_values=options.check_values)
+    plan = fill_dcm.run_plan(edit_plan.compile_plan(input_tags), options)
+    if not options.verbose_log:
+        logging.getLogger("pynetdicom").setLevel(logging.WARNING)
+
+    host, port = input_args.destination.rsplit(":", 1)
+    forwarder = StoreForwarder(plan, options, (host, int(port)), input_args.destination_ae_title, input_args.ae_title, input_args.associations)
+    address = forwarder.start((input_args.listen_address, input_args.port))
+    logger.info(f"Forward from {input_args.ae_title}@{address[0]}:{address[1]} to {input_args.destination_ae_title}@{input_args.destination}")
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+    forwarder.stop()
+    return 0
@@ -1,8 +1,24 @@
+import os
 from argparse import Namespace
-from json import load as json_load
 from typing import Dict, List, Tuple
 
-from pydicom import datadict
+from fill_dcm import vr_validation
+from fill_dcm.durability import DEFAULT_SYNC_FILES, DEFAULT_SYNC_SECONDS, NO_SYNC
+from fill_dcm.events import TAG_DETAIL
+from fill_dcm.mapping_store import DEFAULT_CACHE_SIZE
+from fill_dcm.stats import DEFAULT_SLOWEST_FILES
+
+# Default concurrency of each stage of the pipeline mode and size of the queues between them
+DEFAULT_READ_CONCURRENCY = 4
+DEFAULT_ADJUST_CONCURRENCY = 1
+DEFAULT_WRITE_CONCURRENCY = 4
+DEFAULT_QUEUE_SIZE = 16
+
+# Defaults of the network mode: port and AE title of FillDCM and number of associations opened with the destination
+DEFAULT_PORT = 11112
+DEFAULT_AE_TITLE = "FILLDCM"
+DEFAULT_DESTINATION_AE_TITLE = "ANY-SCP"
+DEFAULT_ASSOCIATIONS = 4
 
 
 class InvalidArgument(Exception):
@@ -30,14 +46,99 @@ class InputTags:
 class Options:
     """Contains application options"""
 
-    def __init__(self, overwrite_output_file: bool = False, verbose_log: bool = False):
+    def __init__(
+        self,
+        overwrite_output_file: bool = False,
+        verbose_log: bool = False,
+        jobs: int = None,
+        pipeline: bool = False,
+        read_concurrency: int = DEFAULT_READ_CONCURRENCY,
+        adjust_concurrency: int = DEFAULT_ADJUST_CONCURRENCY,
+        write_concurrency: int = DEFAULT_WRITE_CONCURRENCY,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        mapping_store: str = None,
+        mapping_cache_size: int = DEFAULT_CACHE_SIZE,
+        per_file_values: bool = False,
+        group_by: str = None,
+        uid_root: str = None,
+        recursive: bool = False,
+        check_values: bool = True,
+        stats_path: str = None,
+        stats_slowest: int = DEFAULT_SLOWEST_FILES,
+        memory_map: bool = False,
+        dry_run: bool = False,
+        scan_report: str = None,
+        manifest_path: str = None,
+        journal_path: str = None,
+        resume: bool = False,
+        log_detail: str = TAG_DETAIL,
+        log_sample: float = 1.0,
+        log_json: bool = False,
+        durability: str = NO_SYNC,
+        sync_files: int = DEFAULT_SYNC_FILES,
+        sync_seconds: float = DEFAULT_SYNC_SECONDS,
+    ):
         """Options constructor
         Args:
             overwrite_output_file (bool, optional): Set to True to overwrite DICOM input files. Defaults to False.
             verbose_log (bool, optional): Set to True to enable verbose mode. Defaults to False.
+            jobs (int, optional): Number of processes used to adjust DICOM files. Defaults to the number of CPUs.
+            pipeline (bool, optional): Set to True to overlap reads, adjustments and writes in an asyncio pipeline. Defaults to False.
+            read_concurrency (int, optional): Pipeline mode: number of concurrent reads. Defaults to DEFAULT_READ_CONCURRENCY.
+            adjust_concurrency (int, optional): Pipeline mode: number of concurrent adjustments. Defaults to DEFAULT_ADJUST_CONCURRENCY.
+            write_concurrency (int, optional): Pipeline mode: number of concurrent writes. Defaults to DEFAULT_WRITE_CONCURRENCY.
+            queue_size (int, optional): Pipeline mode: size of the queues between stages. Defaults to DEFAULT_QUEUE_SIZE.
+            mapping_store (str, optional): Path to the database mapping original values to generated values. Defaults to None.
+            mapping_cache_size (int, optional): Number of mappings kept in memory. Defaults to DEFAULT_CACHE_SIZE.
+            per_file_values (bool, optional): Set to True to generate new values for each file. Defaults to False.
+            group_by (str, optional): Generate new values for each patient, study or series (see grouping.GROUP_BY). Defaults to None.
+            uid_root (str, optional): Organization root of the generated UIDs. Defaults to None, the 2.25 form (see uids.UIDGenerator).
+            recursive (bool, optional): Set to True to also fill or replace the tags in the items of the sequences. Defaults to False.
+            check_values (bool, optional): Set to False to skip the check of the values against their VR. Defaults to True.
+            stats_path (str, optional): Path to the JSON file where the statistics of the run are written. Defaults to None.
+            stats_slowest (int, optional): Number of slowest files reported in the statistics. Defaults to DEFAULT_SLOWEST_FILES.
+            memory_map (bool, optional): Set to True to read the input files through memory maps. Defaults to False.
+            dry_run (bool, optional): Set to True to only scan the files, without writing anything. Defaults to False.
+            scan_report (str, optional): Path to the JSON file where the report of the scan is written. Defaults to None.
+            manifest_path (str, optional): Path to the manifest of the processed files, skipped if unchanged. Defaults to None.
+            journal_path (str, optional): Path to the journal of the run. Defaults to None.
+            resume (bool, optional): Set to True to resume the run recorded in the journal. Defaults to False.
+            log_detail (str, optional): Events logged for each file (see events.LOG_DETAILS). Defaults to TAG_DETAIL.
+            log_sample (float, optional): Fraction of the files whose events are logged. Defaults to 1.0.
+            log_json (bool, optional): Set to True to write the logs as JSON lines. Defaults to False.
+            durability (str, optional): Durability policy of the written files (see durability.DURABILITY_POLICIES). Defaults to NO_SYNC.
+            sync_files (int, optional): Number of written files synced at once. Defaults to DEFAULT_SYNC_FILES.
+            sync_seconds (float, optional): Maximum number of seconds between two syncs. Defaults to DEFAULT_SYNC_SECONDS.
         """
         self.overwrite_output_file: bool = overwrite_output_file
         self.verbose_log: bool = verbose_log
+        self.jobs: int = jobs if jobs is not None else (os.cpu_count() or 1)
+        self.pipeline: bool = pipeline
+        self.read_concurrency: int = read_concurrency
+        self.adjust_concurrency: int = adjust_concurrency
+        self.write_concurrency: int = write_concurrency
+        self.queue_size: int = queue_size
+        self.mapping_store: str = mapping_store
+        self.mapping_cache_size: int = mapping_cache_size
+        self.per_file_values: bool = per_file_values
+        self.group_by: str = group_by
+        self.uid_root: str = uid_root
+        self.recursive: bool = recursive
+        self.check_values: bool = check_values
+        self.stats_path: str = stats_path
+        self.stats_slowest: int = stats_slowest
+        self.memory_map: bool = memory_map
+        self.dry_run: bool = dry_run
+        self.scan_report: str = scan_report
+        self.manifest_path: str = manifest_path
+        self.journal_path: str = journal_path
+        self.resume: bool = resume
+        self.log_detail: str = log_detail
+        self.log_sample: float = log_sample
+        self.log_json: bool = log_json
+        self.durability: str = durability
+        self.sync_files: int = sync_files
+        self.sync_seconds: float = sync_seconds
 
 
 def tag_is_in_dicom_dictionary(tag: str) -> bool:
@@ -49,15 +150,23 @@ def tag_is_in_dicom_dictionary(tag: str) -> bool:
     Returns:
         bool: True if tag exists, otherwise False
     """
+    # The DICOM dictionary is loaded with pydicom, at the first verified tag
+    from pydicom import datadict
+
     return datadict.dictionary_has_tag(tag)
 
 
-def verify_input_tags(input_args: InputTags) -> None:
+def verify_input_tags(input_args: InputTags, generated_replacements: bool = False, check_values: bool = True) -> None:
     """Verify validity of inputs arguments. Rules:
         - a tag can't be in both list (tag and tag to replace)
-        - a tag to replace must have a value (e.g "tag=value")
+        - a tag to replace must have a value (e.g "tag=value"), unless generated_replacements is True
         - at least one tag shall be provided
         - tags of both lists must be a valid tag from DICOM dictionary
+        - values must match the rules of the VR of their tag (see vr_validation), unless check_values is False
+    Args:
+        input_args (InputTags): Tags to verify
+        generated_replacements (bool, optional): True if tags to replace without value get generated values. Defaults to False.
+        check_values (bool, optional): Set to False to skip the check of the values against their VR. Defaults to True.
     Exceptions:
         InvalidArgument if a condition is not matched
     """
@@ -69,7 +178,7 @@ def verify_input_tags(input_args: InputTags) -> None:
     # and Tags to replace must have a value
     # and Tags to replace shall be in DICOM dictionary
     for tag_to_replace in input_args.tags_to_replace:
-        if input_args.tags_to_replace[tag_to_replace] is None:
+        if input_args.tags_to_replace[tag_to_replace] is None and not generated_replacements:
             raise InvalidArgument(f"Tag {tag_to_replace} must have value.")
         if tag_to_replace in input_args.tags_to_fill:
             raise InvalidArgument(f"Tag {tag_to_replace} is duplicated. A tag can only be defined once")
@@ -81,8 +190,25 @@ def verify_input_tags(input_args: InputTags) -> None:
         if not tag_is_in_dicom_dictionary(tag):
             raise InvalidArgument(f"Tag {tag} is not a valid tag from DICOM dictionary")
 
-    # TODO verify that values passed are correct according to  tag's VR.
-    # Add an option to enable/disable this check
+    # Values shall match the rules of the VR of their tag
+    if check_values:
+        verify_values(input_args)
+
+
+def verify_values(input_args: InputTags) -> None:
+    """Verify the values of the tags against the rules of their VR (see vr_validation). Tags shall be in the DICOM dictionary
+    Args:
+        input_args (InputTags): Tags to verify
+    Exceptions:
+        InvalidArgument if a value doesn't match the rules of its VR
+    """
+    from pydicom import datadict
+
+    for tags in (input_args.tags_to_fill, input_args.tags_to_replace):
+        for tag, value in tags.items():
+            reason = vr_validation.invalid_value(datadict.dictionary_VR(tag), value)
+            if reason is not None:
+                raise InvalidArgument(f"Invalid value for tag {tag}: {reason}")
 
 
 def parse(input_args: Namespace) -> Tuple[InputTags, Options]:
@@ -100,6 +226,8 @@ def parse(input_args: Namespace) -> Tuple[InputTags, Options]:
 
     # tags from JSON
     if input_args.json_path is not None:
+        from json import load as json_load
+
         try:
             with open(input_args.json_path, "r") as json_file:
                 parsed_json = json_load(json_file)
@@ -122,6 +250,41 @@ def parse(input_args: Namespace) -> Tuple[InputTags, Options]:
             splitted_tag = raw_tag_to_replace.split("=", 1)
             input_tags.tags_to_replace[splitted_tag[0]] = None if len(splitted_tag) == 1 else splitted_tag[1]
 
-    options = Options(input_args.overwrite_file, input_args.verbose_log)
+    if input_args.resume and input_args.journal_path is None:
+        raise InvalidArgument("--resume requires --journal")
+    if input_args.scan_report is not None and not input_args.dry_run:
+        raise InvalidArgument("--scan-report requires --dry-run")
+
+    options = Options(
+        input_args.overwrite_file,
+        input_args.verbose_log,
+        input_args.jobs,
+        pipeline=input_args.pipeline,
+        read_concurrency=input_args.read_concurrency,
+        adjust_concurrency=input_args.adjust_concurrency,
+        write_concurrency=input_args.write_concurrency,
+        queue_size=input_args.queue_size,
+        mapping_store=input_args.mapping_store,
+        mapping_cache_size=input_args.mapping_cache_size,
+        per_file_values=input_args.per_file_values,
+        group_by=input_args.group_by,
+        uid_root=input_args.uid_root,
+        recursive=input_args.recursive,
+        check_values=input_args.check_values,
+        stats_path=input_args.stats_path,
+        stats_slowest=input_args.stats_slowest,
+        memory_map=input_args.memory_map,
+        dry_run=input_args.dry_run,
+        scan_report=input_args.scan_report,
+        manifest_path=input_args.manifest_path,
+        journal_path=input_args.journal_path,
+        resume=input_args.resume,
+        log_detail=input_args.log_detail,
+        log_sample=input_args.log_sample,
+        log_json=input_args.log_json,
+        durability=input_args.durability,
+        sync_files=input_args.sync_files,
+        sync_seconds=input_args.sync_seconds,
+    )
 
     return (input_tags, options)
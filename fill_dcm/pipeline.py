@@ -0,0 +1,129 @@
+""" pipeline: asyncio pipeline overlapping reads, adjustments and writes of DICOM files
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from fill_dcm import edit_plan, fill_dcm, parse_argument
+
+# Marks the end of the files in a queue
+_END_OF_FILES = None
+
+
+async def _read_stage(files, select, plan, options, discovery_executor, executor, output_queue: asyncio.Queue) -> None:
+    """Read the files, shared by all readers, and put them in the output queue. The next file is taken from the single thread
+    of the discovery executor: walking directories doesn't block the event loop, and the iterator is never run concurrently.
+    Files are selected on the event loop, where the results are accounted"""
+    loop = asyncio.get_running_loop()
+    while (file := await loop.run_in_executor(discovery_executor, next, files, _END_OF_FILES)) is not _END_OF_FILES:
+        if select is not None and not select(file):
+            continue
+        edit = await loop.run_in_executor(executor, fill_dcm.read_dicom_file, file, plan, options.memory_map)
+        await output_queue.put(edit)
+
+
+async def _adjust_stage(plan, options, executor, input_queue: asyncio.Queue, output_queue: asyncio.Queue) -> None:
+    """Adjust files read from the input queue and put them in the output queue"""
+    loop = asyncio.get_running_loop()
+    while (edit := await input_queue.get()) is not _END_OF_FILES:
+        edit = await loop.run_in_executor(executor, fill_dcm.adjust_dicom_edit, edit, plan, options)
+        await output_queue.put(edit)
+
+
+async def _write_stage(options, executor, input_queue: asyncio.Queue, summary: fill_dcm.ProcessingSummary) -> None:
+    """Write files adjusted from the input queue and account their results in the summary"""
+    loop = asyncio.get_running_loop()
+    while (edit := await input_queue.get()) is not _END_OF_FILES:
+        summary.add(await loop.run_in_executor(executor, fill_dcm.write_dicom_edit, edit, options))
+
+
+async def _end_stages(readers, adjusters, writers, read_queue: asyncio.Queue, write_queue: asyncio.Queue) -> None:
+    """Mark the end of the files in the queue of the next stage, once all the tasks of a stage are done"""
+    await asyncio.gather(*readers)
+    for _ in adjusters:
+        await read_queue.put(_END_OF_FILES)
+    await asyncio.gather(*adjusters)
+    for _ in writers:
+        await write_queue.put(_END_OF_FILES)
+
+
+async def adjust_dicom_files_async(
+    files: Iterable[str],
+    plan: edit_plan.EditPlan,
+    options: parse_argument.Options,
+    summary: fill_dcm.ProcessingSummary = None,
+    select: Callable[[str], bool] = None,
+) -> fill_dcm.ProcessingSummary:
+    """Adjust DICOM files in a pipeline of three stages: read, adjust and write.
+    Each stage runs its own number of concurrent tasks and stages are linked by bounded queues:
+    reads of the next files overlap adjustments and writes of the previous ones.
+
+    Args:
+        files (Iterable[str]): paths to DICOM files
+        plan (EditPlan): Plan of the tags to replace/filled (see fill_dcm.adjust_dicom_edit())
+        options (Options): Options, with the concurrency of each stage and the size of the queues
+        summary (ProcessingSummary, optional): Summary the results are added to. Defaults to a new summary.
+        select (Callable[[str], bool], optional): Called on the event loop with each discovered file, False to leave it out of the
+            pipeline (see fill_dcm._to_process()). Defaults to None, all the files.
+
+    Returns:
+        ProcessingSummary: results of the run
+    """
+    if summary is None:
+        summary = fill_dcm.ProcessingSummary(options.stats_slowest, fill_dcm.durability_policy(options))
+    read_queue = asyncio.Queue(maxsize=options.queue_size)
+    write_queue = asyncio.Queue(maxsize=options.queue_size)
+    # All readers consume the same iterator: each file is read once
+    files = iter(files)
+
+    with (
+        ThreadPoolExecutor(1, thread_name_prefix="discover") as discovery_executor,
+        ThreadPoolExecutor(options.read_concurrency, thread_name_prefix="read") as read_executor,
+        ThreadPoolExecutor(options.adjust_concurrency, thread_name_prefix="adjust") as adjust_executor,
+        ThreadPoolExecutor(options.write_concurrency, thread_name_prefix="write") as write_executor,
+    ):
+        readers = [
+            asyncio.create_task(_read_stage(files, select, plan, options, discovery_executor, read_executor, read_queue))
+            for _ in range(options.read_concurrency)
+        ]
+        adjusters = [
+            asyncio.create_task(_adjust_stage(plan, options, adjust_executor, read_queue, write_queue)) for _ in range(options.adjust_concurrency)
+        ]
+        writers = [asyncio.create_task(_write_stage(options, write_executor, write_queue, summary)) for _ in range(options.write_concurrency)]
+
+        tasks = [*readers, *adjusters, *writers, asyncio.create_task(_end_stages(readers, adjusters, writers, read_queue, write_queue))]
+        try:
+            # A task failing stops the pipeline: the tasks of the other stages would wait forever on the bounded queues
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    return summary
+
+
+def adjust_dicom_files_pipeline(
+    files: Iterable[str],
+    plan: edit_plan.EditPlan,
+    options: parse_argument.Options,
+    summary: fill_dcm.ProcessingSummary = None,
+    select: Callable[[str], bool] = None,
+) -> fill_dcm.ProcessingSummary:
+    """Run adjust_dicom_files_async() in a new event loop
+
+    Args:
+        files (Iterable[str]): paths to DICOM files
+        plan (EditPlan): Plan of the tags to replace/filled (see fill_dcm.adjust_dicom_edit())
+        options (Options): Options
+        summary (ProcessingSummary, optional): Summary the results are added to. Defaults to a new summary.
+        select (Callable[[str], bool], optional): Called on the event loop with each discovered file, False to leave it out of the
+            pipeline (see fill_dcm._to_process()). Defaults to None, all the files.
+
+    Returns:
+        ProcessingSummary: results of the run
+    """
+    return asyncio.run(adjust_dicom_files_async(files, plan, options, summary, select))
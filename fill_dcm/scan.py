@@ -0,0 +1,173 @@
+""" scan: dry run reading only the tags of the plan, reporting their state in the files and the files a run would write
+"""
+
+import json
+import logging
+import time
+from typing import Dict, Iterable, List, NamedTuple
+
+from fill_dcm import dicom_io, edit_plan, fill_dcm, parse_argument
+
+logger = logging.getLogger()
+
+# State of a tag of the plan in a file
+MISSING = "missing"
+EMPTY = "empty"
+PRESENT = "present"
+TAG_STATES = (MISSING, EMPTY, PRESENT)
+
+
+class FileScan(NamedTuple):
+    """Outcome of the scan of a file"""
+
+    file: str
+    # State of each tag of the plan, by keyword
+    states: Dict[str, str]
+    # True if a run would write the file, False if the plan leaves it unchanged
+    would_write: bool
+    # Error message if the file can't be read
+    error: str = None
+
+
+def scan_file(file: str, plan: edit_plan.EditPlan, options: parse_argument.Options) -> FileScan:
+    """Scan a file: read only the tags of the plan and tell if a run would change them. With the recursive option,
+    the header is read up to the pixel data, for the tags nested in sequences
+
+    Args:
+        file (str): Path to the DICOM file
+        plan (EditPlan): Plan of the run (see fill_dcm.run_plan())
+        options (Options): Options
+
+    Returns:
+        FileScan: the state of the tags of the plan and the decision of the run
+    """
+    try:
+        if options.recursive:
+            dataset, _ = dicom_io.read_header(file, options.memory_map)
+        else:
+            dataset = dicom_io.read_tags(file, plan.tags, options.memory_map)
+
+        # Same decision as fill_dcm.adjust_dicom_edit(): values identical to the current ones are left as is.
+        # Values generated for each file are unknown: they are considered as changes
+        entries = fill_dcm.dataset_edits(dataset, plan)
+        if all(entry.value is not None for entry in entries):
+            patches = dicom_io.plan_patches(dataset, entries)
+            if patches is not None:
+                entries = [entry for entry, patch in zip(entries, patches) if not dicom_io.is_unchanged(dataset, patch)]
+        # The dataset is never written: nested items are adjusted in memory to find out if some change
+        would_write = bool(entries) or (options.recursive and bool(fill_dcm.adjust_nested_items(dataset, plan)))
+
+        states = {}
+        for entry in plan.entries:
+            if entry.tag not in dataset:
+                states[entry.keyword] = MISSING
+            else:
+                states[entry.keyword] = EMPTY if dataset[entry.tag].VM == 0 else PRESENT
+    except Exception as error:
+        logger.error("Invalid file to scan: %s: %s", file, error)
+        return FileScan(file, {}, False, str(error))
+    return FileScan(file, states, would_write)
+
+
+class ScanReport:
+    """Counts of the states of each tag of the plan and files a run would write, accumulated file by file"""
+
+    def __init__(self, plan: edit_plan.EditPlan):
+        """ScanReport constructor
+
+        Args:
+            plan (EditPlan): Plan of the run
+        """
+        self.tags: Dict[str, Dict[str, int]] = {entry.keyword: {state: 0 for state in TAG_STATES} for entry in plan.entries}
+        self.files_to_write: List[str] = []
+        self.unchanged: int = 0
+        self.errors: Dict[str, str] = {}
+        # Archives are not scanned: their members can only be read by a run
+        self.archives: List[str] = []
+        self.elapsed: float = 0.0
+
+    def add(self, scan: FileScan) -> None:
+        """Account the scan of a file"""
+        if scan.error is not None:
+            self.errors[scan.file] = scan.error
+            return
+        for keyword, state in scan.states.items():
+            self.tags[keyword][state] += 1
+        if scan.would_write:
+            self.files_to_write.append(scan.file)
+            logger.info("Would write %s", scan.file)
+        else:
+            self.unchanged += 1
+
+    @property
+    def total(self) -> int:
+        """Number of files scanned, failed included"""
+        return len(self.files_to_write) + self.unchanged + len(self.errors)
+
+    def report(self) -> dict:
+        """Report of the scan, as a JSON-serializable dictionary"""
+        return {
+            "files": self.total,
+            "elapsed": self.elapsed,
+            "tags": self.tags,
+            "unchanged": self.unchanged,
+            "files_to_write": self.files_to_write,
+            "errors": self.errors,
+            "archives_not_scanned": self.archives,
+        }
+
+    def write(self, path: str) -> None:
+        """Write the report in a JSON file"""
+        with open(path, "w", encoding="utf-8") as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+
+def _scan_chunk_in_worker(files: List[str]) -> List[FileScan]:
+    """Scan files from a worker process, with the plan received at the worker initialization (see fill_dcm._init_worker())"""
+    return [scan_file(file, fill_dcm._worker_plan, fill_dcm._worker_options) for file in files]
+
+
+def scan_dicom_files(files: Iterable[str], input_tags: parse_argument.InputTags, options: parse_argument.Options) -> ScanReport:
+    """Dry run: scan DICOM files without writing anything. If options.jobs is greater than 1, files are spread over a pool of processes
+
+    Args:
+        files (Iterable[str]): paths to DICOM files, possibly discovered while the first ones are scanned (see discovery.discover())
+        input_tags (InputTags): Tags to replace/filled in the list of DICOM files
+        options (Options): Options. With options.scan_report, the report is written in a JSON file
+
+    Returns:
+        ScanReport: the report of the scan
+    """
+    start = time.perf_counter()
+    plan = fill_dcm.run_plan(edit_plan.compile_plan(input_tags), options)
+    report = ScanReport(plan)
+
+    files_count = len(files) if isinstance(files, (list, tuple)) else None
+    files = fill_dcm._without_archives(files, report.archives)
+
+    jobs = options.jobs if files_count is None else min(options.jobs, files_count)
+    if jobs <= 1:
+        for file in files:
+            report.add(scan_file(file, plan, options))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=fill_dcm._init_worker,
+            initargs=(plan, options, logging.getLogger().getEffectiveLevel()),
+        ) as executor:
+            for scan in fill_dcm.map_chunks(executor, _scan_chunk_in_worker, files, jobs, fill_dcm.chunk_size(files_count, jobs)):
+                report.add(scan)
+    report.elapsed = time.perf_counter() - start
+
+    for path in report.archives:
+        logger.warning(f"Archive not scanned: {path}")
+    for keyword, counts in report.tags.items():
+        logger.info(f"{keyword}: {counts[MISSING]} missing, {counts[EMPTY]} empty, {counts[PRESENT]} present")
+    logger.info(
+        f"{report.total} file(s) scanned: {len(report.files_to_write)} would be written, {report.unchanged} unchanged, {len(report.errors)} failed"
+    )
+    if options.scan_report is not None:
+        report.write(options.scan_report)
+    return report
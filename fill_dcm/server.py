@@ -0,0 +1,331 @@
+""" server: long-running FillDCM process accepting jobs over a Unix socket, and its thin client
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from functools import partial
+from itertools import repeat
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List
+
+from fill_dcm import fill_dcm, mapping_store, parse_argument
+from fill_dcm.manifest import plan_hash
+
+# The client doesn't import pydicom: plans are compiled by the server
+if TYPE_CHECKING:
+    import concurrent.futures
+
+    from fill_dcm import edit_plan
+
+logger = logging.getLogger()
+
+# Number of compiled plans kept by the server
+PLAN_CACHE_SIZE = 128
+
+# Options of the command line sent with each job. The others (jobs, pipeline...) are options of the server
+JOB_OPTIONS = (
+    "overwrite_output_file",
+    "per_file_values",
+    "group_by",
+    "uid_root",
+    "recursive",
+    "check_values",
+    "mapping_store",
+    "mapping_cache_size",
+    "stats_path",
+    "stats_slowest",
+    "memory_map",
+    "durability",
+    "sync_files",
+    "sync_seconds",
+)
+
+# Options of the command line handled by the client itself or by the server command line
+CLIENT_OPTIONS = ("jobs", "verbose_log")
+
+
+class JobError(Exception):
+    """Exception to handle jobs the server refused"""
+
+
+def _adjust_dicom_chunk(plan: edit_plan.EditPlan, options: parse_argument.Options, files: List[str]) -> List[fill_dcm.FileResult]:
+    """Adjust files of a job in a worker process of the server pool. The plan is sent with each chunk: jobs don't share their plan"""
+    return [fill_dcm.adjust_dicom_file(file, plan, options) for file in files]
+
+
+class FillDCMServer(socketserver.ThreadingUnixStreamServer):
+    """Server running jobs sent on a Unix socket, one thread per connection. Compiled plans are cached by content hash
+    and, with more than one job, files are spread over a pool of processes started once."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, jobs: int = 1):
+        """FillDCMServer constructor. A socket left by a previous server is removed
+
+        Args:
+            socket_path (str): Path to the Unix socket
+            jobs (int, optional): Number of worker processes. No pool is started if it is 1. Defaults to 1.
+        """
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.socket_path: str = socket_path
+        self.jobs: int = jobs
+        self.plans = mapping_store.LRUCache(PLAN_CACHE_SIZE)
+        self._plans_lock = threading.Lock()
+        self.executor: concurrent.futures.ProcessPoolExecutor = None
+        if jobs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            log_setup = partial(logging.basicConfig, level=logging.getLogger().getEffectiveLevel(), format="%(levelname)s - %(message)s")
+            self.executor = ProcessPoolExecutor(max_workers=jobs, initializer=log_setup)
+        super().__init__(socket_path, JobHandler)
+
+    def server_bind(self) -> None:
+        """Bind the socket with access for its owner only: jobs adjust any file the server can write. The socket is created
+        under a restrictive umask rather than changed afterward, so it is never accessible to other users"""
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def compiled_plan(self, input_tags: parse_argument.InputTags, options: parse_argument.Options) -> edit_plan.EditPlan:
+        """Return the compiled plan of tags, from the cache if the same tags were already received
+
+        Args:
+            input_tags (InputTags): Tags to fill or to replace
+            options (Options): Options of the job
+
+        Returns:
+            EditPlan: the plan, tags without value included (see fill_dcm.run_plan())
+        """
+        from fill_dcm import edit_plan
+
+        key = (plan_hash(input_tags), options.mapping_store is not None, options.check_values)
+        with self._plans_lock:
+            plan = self.plans.get(key)
+        if plan is None:
+            parse_argument.verify_input_tags(input_tags, generated_replacements=options.mapping_store is not None, check_values=options.check_values)
+            plan = edit_plan.compile_plan(input_tags)
+            with self._plans_lock:
+                self.plans.put(key, plan)
+        return plan
+
+    def job_options(self, request: Dict[str, Any]) -> parse_argument.Options:
+        """Return the options of a job: the options sent by the client and the number of jobs of the server"""
+        return parse_argument.Options(jobs=self.jobs, **{name: request["options"][name] for name in JOB_OPTIONS if name in request["options"]})
+
+    def run_job(self, request: Dict[str, Any]) -> Iterator[fill_dcm.FileResult]:
+        """Run a job and yield the result of each file as soon as it is known
+
+        Args:
+            request (Dict[str, Any]): Job sent by submit()
+
+        Returns:
+            Iterator[FileResult]: results of the files
+        """
+        files = request["files"]
+        options = self.job_options(request)
+        input_tags = parse_argument.InputTags(request["tags_to_fill"], request["tags_to_replace"])
+        try:
+            plan = fill_dcm.run_plan(self.compiled_plan(input_tags, options), options)
+        except (parse_argument.InvalidArgument, fill_dcm.InvalidParameter) as error:
+            raise JobError(str(error))
+
+        groups = [(plan, files)]
+        if options.group_by is not None:
+            from fill_dcm import grouping
+
+            # Values of the groups belong to the job: concurrent jobs, with other plans, don't share them
+            groups = list(
+                grouping.grouped_plans(
+                    files, plan, options.group_by, options.memory_map, grouping.GroupValues(options.group_by, uid_root=options.uid_root)
+                )
+            )
+
+        if self.executor is None or len(files) <= 1:
+            for group_plan, group in groups:
+                for file in group:
+                    yield fill_dcm.adjust_dicom_file(file, group_plan, options)
+            return
+        # Chunks don't span groups: each chunk is sent with the plan of its group, whatever the worker adjusting it
+        size = fill_dcm.chunk_size(len(files), self.jobs)
+        plans, chunks = [], []
+        for group_plan, group in groups:
+            for index in range(0, len(group), size):
+                plans.append(group_plan)
+                chunks.append(group[index : index + size])
+        for results in self.executor.map(_adjust_dicom_chunk, plans, repeat(options), chunks):
+            yield from results
+
+    def server_close(self) -> None:
+        """Stop the pool, close the mapping stores and remove the socket"""
+        super().server_close()
+        if self.executor is not None:
+            self.executor.shutdown()
+        mapping_store.close_stores()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """Read a job, a JSON line, and answer a JSON line per file followed by the summary of the job"""
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """Send a JSON line to the client"""
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        start = time.perf_counter()
+        try:
+            request = json.loads(self.rfile.readline())
+            options = self.server.job_options(request)
+            summary = fill_dcm.ProcessingSummary(options.stats_slowest, fill_dcm.durability_policy(options))
+            for result in self.server.run_job(request):
+                summary.add(result)
+                self.send({"file": result.file, "status": result.status.value, "error": result.error})
+            summary.durability_policy.flush()
+        except (JobError, ValueError, KeyError, TypeError) as error:
+            logger.error(f"Invalid job: {error}")
+            self.send({"error": str(error)})
+            return
+        summary.statistics.elapsed = time.perf_counter() - start
+        if request["options"].get("stats_path") is not None:
+            summary.statistics.write(request["options"]["stats_path"])
+        logger.info(f"Job done: {summary.total} file(s) processed, {summary.failed} failed")
+        self.send(
+            {
+                "summary": {
+                    "total": summary.total,
+                    "failed": summary.failed,
+                    "counts": {status.value: count for status, count in summary.counts.items()},
+                }
+            }
+        )
+
+
+def unsupported_options(options: parse_argument.Options) -> List[str]:
+    """Return the options set to another value than their default that a job can't honour: they are neither sent with the job
+    (see JOB_OPTIONS) nor handled by the client (see CLIENT_OPTIONS)
+
+    Args:
+        options (Options): Options of the job
+
+    Returns:
+        List[str]: names of the unsupported options
+    """
+    defaults = vars(parse_argument.Options(jobs=options.jobs))
+    return [name for name, value in vars(options).items() if name not in JOB_OPTIONS and name not in CLIENT_OPTIONS and value != defaults[name]]
+
+
+def submit(
+    socket_path: str,
+    files: List[str],
+    input_tags: parse_argument.InputTags,
+    options: parse_argument.Options,
+) -> Iterator[Dict[str, Any]]:
+    """Send a job to a server and yield its answers: a message per file, then the summary of the job
+
+    Args:
+        socket_path (str): Path to the Unix socket of the server
+        files (List[str]): paths to DICOM files
+        input_tags (InputTags): Tags to replace/filled in the DICOM files
+        options (Options): Options. Only JOB_OPTIONS are sent
+
+    Returns:
+        Iterator[Dict[str, Any]]: answers of the server
+    Exceptions:
+        JobError if the options aren't supported by the server or if the server refused the job
+    """
+    # Options silently dropped would change the meaning of the job, as a dry run rewriting the files
+    unsupported = unsupported_options(options)
+    if unsupported:
+        raise JobError(f"Options not supported by the server: {', '.join(unsupported)}")
+    # The server doesn't run in the current directory of the client
+    job_options = {name: getattr(options, name) for name in JOB_OPTIONS}
+    for name in ("mapping_store", "stats_path"):
+        if job_options[name] is not None:
+            job_options[name] = os.path.abspath(job_options[name])
+    request = {
+        "files": [os.path.abspath(file) for file in files],
+        "tags_to_fill": input_tags.tags_to_fill,
+        "tags_to_replace": input_tags.tags_to_replace,
+        "options": job_options,
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client, client.makefile("rwb") as stream:
+        client.connect(socket_path)
+        stream.write(json.dumps(request).encode("utf-8") + b"\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            if "error" in message and "file" not in message:
+                raise JobError(message["error"])
+            yield message
+
+
+def submit_executable(socket_path: str, files: List[str], input_tags: parse_argument.InputTags, options: parse_argument.Options) -> int:
+    """Client command line: send a job to a server and log its results like a local run
+
+    Returns:
+        int: exit status. 0 if all files have been processed, otherwise 1
+    """
+    failed = 1
+    try:
+        for message in submit(socket_path, files, input_tags, options):
+            if "summary" in message:
+                summary = message["summary"]
+                failed = summary["failed"]
+                logger.info(
+                    f"{summary['total']} file(s) processed: {summary['counts']['patched']} patched, {summary['counts']['rewritten']} rewritten, "
+                    f"{summary['counts']['unchanged']} unchanged, {failed} failed"
+                )
+            elif message["error"] is None:
+                logger.info("%s: %s", message["file"], message["status"])
+            else:
+                logger.error("%s: %s: %s", message["file"], message["status"], message["error"])
+    except (OSError, JobError) as error:
+        logger.error(f"Can't process an error encountered: {error}")
+        return 1
+    return 0 if failed == 0 else 1
+
+
+def serve_executable(arguments: List[str]) -> int:
+    """Server command line: serve jobs until interrupted
+
+    Args:
+        arguments (List[str]): Arguments following "serve"
+
+    Returns:
+        int: exit status
+    """
+    command_line = argparse.ArgumentParser(prog="FillDCM serve", description="Keep FillDCM warm and run the jobs sent by 'FillDCM client'.")
+    command_line.add_argument("--socket", required=True, help="Path to the Unix socket to listen on.")
+    command_line.add_argument(
+        "-J",
+        "--jobs",
+        type=fill_dcm.positive_integer,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes, started once. 1 to run the jobs in the server process. Defaults to the number of CPUs.",
+    )
+    command_line.add_argument("-v", "--verbose", dest="verbose_log", action="store_true", help="Enable verbose mode. More logs output.")
+    args = command_line.parse_args(arguments)
+    logging.basicConfig(level=logging.DEBUG if args.verbose_log else logging.INFO, format="%(levelname)s - %(message)s")
+
+    with FillDCMServer(args.socket, args.jobs) as server:
+        # serve_forever() is stopped from another thread: it waits for the end of the current requests
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+        logger.info(f"Serve on {args.socket} with {args.jobs} job(s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
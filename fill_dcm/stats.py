@@ -0,0 +1,128 @@
+""" stats: time spent in each stage of a run, bytes read and written, changes and errors, reported as JSON
+"""
+
+import heapq
+import json
+from array import array
+from typing import Dict, List, Tuple
+
+# Stages timed for each file, in order
+FILE_STAGES = ("read", "adjust", "output_filepath", "write")
+
+# Percentiles reported for each stage
+PERCENTILES = (50, 95, 99)
+
+# Number of slowest files reported by default
+DEFAULT_SLOWEST_FILES = 10
+
+
+def percentile(sorted_values: array, rank: int) -> float:
+    """Nearest-rank percentile of sorted values, 0 if there is none
+
+    Args:
+        sorted_values (array): Values sorted in ascending order
+        rank (int): Percentile, from 0 to 100
+
+    Returns:
+        float: the percentile
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, -(-rank * len(sorted_values) // 100) - 1)
+    return sorted_values[index]
+
+
+def distribution(durations: array) -> Dict[str, float]:
+    """Total, percentiles and maximum of durations"""
+    sorted_durations = array("d", sorted(durations))
+    report = {"total": sum(sorted_durations)}
+    report.update({f"p{rank}": percentile(sorted_durations, rank) for rank in PERCENTILES})
+    report["max"] = sorted_durations[-1] if sorted_durations else 0.0
+    return report
+
+
+class RunStatistics:
+    """Timings and volumes of a run, accumulated file by file. Durations are kept in arrays of doubles,
+    so percentiles of millions of files are computed exactly with a few bytes per file."""
+
+    def __init__(self, slowest_files: int = DEFAULT_SLOWEST_FILES):
+        """RunStatistics constructor
+
+        Args:
+            slowest_files (int, optional): Number of slowest files reported. Defaults to DEFAULT_SLOWEST_FILES.
+        """
+        self.slowest_files: int = slowest_files
+        # Run-level durations, such as the discovery of the files and the elapsed time of the run
+        self.discovery: float = 0.0
+        self.elapsed: float = 0.0
+        self.durations: Dict[str, array] = {stage: array("d") for stage in FILE_STAGES + ("file",)}
+        self.bytes_read: int = 0
+        self.bytes_written: int = 0
+        self.statuses: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        # Number of additions and updates of each tag, and number of errors of each exception type
+        self.changes: Dict[str, Dict[str, int]] = {}
+        self.error_types: Dict[str, int] = {}
+        # Min-heap of (duration, file, timings) of the slowest files
+        self._slowest: List[Tuple[float, str, Dict[str, float]]] = []
+
+    def add(self, result) -> None:
+        """Account the timings and volumes of a processed file
+
+        Args:
+            result (FileResult): Result of a processed file
+        """
+        status = result.status.value
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not result.succeeded:
+            self.errors[status] = self.errors.get(status, 0) + 1
+        if result.error_type is not None:
+            self.error_types[result.error_type] = self.error_types.get(result.error_type, 0) + 1
+        for operation, keyword, _ in result.changes:
+            counts = self.changes.setdefault(keyword, {})
+            counts[operation] = counts.get(operation, 0) + 1
+        # Files skipped without being read have no timings: they would skew the distributions
+        if not result.timings:
+            return
+
+        file_duration = 0.0
+        for stage, duration in result.timings.items():
+            self.durations[stage].append(duration)
+            file_duration += duration
+        self.durations["file"].append(file_duration)
+        self.bytes_read += result.bytes_read
+        self.bytes_written += result.bytes_written
+
+        slow_file = (file_duration, result.file, result.timings)
+        if len(self._slowest) < self.slowest_files:
+            heapq.heappush(self._slowest, slow_file)
+        elif self.slowest_files > 0 and file_duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, slow_file)
+
+    def report(self) -> Dict:
+        """Return the statistics of the run as a JSON serializable dictionary"""
+        return {
+            "files": sum(self.statuses.values()),
+            "elapsed": self.elapsed,
+            "discovery": self.discovery,
+            "stages": {stage: distribution(self.durations[stage]) for stage in FILE_STAGES},
+            "file": distribution(self.durations["file"]),
+            "slowest_files": [
+                {"file": file, "seconds": duration, "stages": timings} for duration, file, timings in sorted(self._slowest, reverse=True)
+            ],
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "statuses": self.statuses,
+            "errors": self.errors,
+            "error_types": self.error_types,
+            "changes": self.changes,
+        }
+
+    def write(self, path: str) -> None:
+        """Write the report of the run in a JSON file
+
+        Args:
+            path (str): Path to the JSON file
+        """
+        with open(path, "w") as json_file:
+            json.dump(self.report(), json_file, indent=2)
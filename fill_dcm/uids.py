@@ -0,0 +1,114 @@
+""" uids: UIDs generated by blocks, unique by construction under an organization root or derived from random UUIDs in the 2.25 form
+"""
+
+import os
+import secrets
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from fill_dcm import vr_validation
+
+# Root of the UIDs derived from a UUID (see DICOM PS3.5, B.2)
+UUID_ROOT = "2.25"
+
+# Digits of the counter of a generator: it gives 10**12 UIDs per process and run
+COUNTER_DIGITS = 12
+COUNTER_LIMIT = 10**COUNTER_DIGITS
+
+# Bits of the namespace of a generator taken by the process id
+PID_BITS = 32
+
+# Longest organization root: the UID keeps at least 20 digits for the namespace of the generator, 12 for the counter and their dots
+MAX_ROOT_LENGTH = 64 - 2 - COUNTER_DIGITS - 20
+
+# Number of UIDs reserved at once by generate_block() by default
+DEFAULT_BLOCK_SIZE = 4096
+
+
+def invalid_root(root: str) -> Optional[str]:
+    """Check an organization root of the generated UIDs
+
+    Args:
+        root (str): Organization root, such as "1.2.826.0.1.3680043.10.543"
+
+    Returns:
+        str: The reason why the root is invalid, None if it is valid
+    """
+    reason = vr_validation.invalid_value("UI", root)
+    if reason is not None:
+        return reason
+    if not root or "\\" in root:
+        return "the root shall be a single UID"
+    if len(root) > MAX_ROOT_LENGTH:
+        return f"the root shall have at most {MAX_ROOT_LENGTH} characters"
+    return None
+
+
+class UIDGenerator:
+    """Generate UIDs under an organization root, made of a namespace, unique to the generator, and of a counter: <root>.<namespace>.<counter>.
+    UIDs of a generator never collide, and no set of issued UIDs is kept. The namespace holds the process id, so the generators of the
+    processes running at the same time never collide either, and random bits, for the other runs and hosts.
+    Without root, UIDs are derived from random (version 4) UUIDs as DICOM PS3.5, B.2 requires: 2.25.<integer of the UUID>"""
+
+    def __init__(self, root: str = None):
+        """UIDGenerator constructor
+
+        Args:
+            root (str, optional): Organization root of the UIDs. Defaults to None, the 2.25 form.
+
+        Raises:
+            ValueError: if the root is invalid (see invalid_root())
+        """
+        if root is not None and invalid_root(root) is not None:
+            raise ValueError(f"Invalid UID root {root}: {invalid_root(root)}")
+        self.root: str = root
+        self._format: str = None
+        if root is not None:
+            namespace_bits = (10 ** (64 - len(root) - 2 - COUNTER_DIGITS) - 1).bit_length() - 1
+            self._format = f"{root}.{self._namespace(namespace_bits)}.{{}}"
+        self._next: int = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _namespace(bits: int) -> int:
+        """Namespace of `bits` bits: random bits followed by the process id. It is never 0, so it never starts the counter with a 0"""
+        return (secrets.randbits(bits - PID_BITS) << PID_BITS) | (os.getpid() & (2**PID_BITS - 1)) or 1
+
+    def reserve(self, count: int) -> range:
+        """Reserve a block of `count` consecutive counters, formatted later without holding the generator
+
+        Raises:
+            OverflowError: if the counters of the generator are exhausted
+        """
+        with self._lock:
+            if self._next + count > COUNTER_LIMIT:
+                raise OverflowError("The counters of the UID generator are exhausted")
+            block = range(self._next, self._next + count)
+            self._next += count
+        return block
+
+    def generate_block(self, count: int = DEFAULT_BLOCK_SIZE) -> List[str]:
+        """Generate a block of `count` UIDs at once. Random UUIDs are made from a single read of random bytes"""
+        if self._format is None:
+            random_bytes = secrets.token_bytes(16 * count)
+            return [f"{UUID_ROOT}.{uuid.UUID(bytes=random_bytes[index:index + 16], version=4).int}" for index in range(0, 16 * count, 16)]
+        return list(map(self._format.format, self.reserve(count)))
+
+    def next(self) -> str:
+        """Generate a single UID"""
+        if self._format is None:
+            return f"{UUID_ROOT}.{uuid.uuid4().int}"
+        return self._format.format(self.reserve(1)[0])
+
+
+# Generators of the current process, by root: a forked process shall not reuse the counters of its parent
+_generators: Dict[Tuple[int, str], UIDGenerator] = {}
+
+
+def get_generator(root: str = None) -> UIDGenerator:
+    """Return the generator of the current process for an organization root, None for the 2.25 form"""
+    key = (os.getpid(), root)
+    if key not in _generators:
+        _generators[key] = UIDGenerator(root)
+    return _generators[key]
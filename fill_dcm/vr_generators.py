@@ -1,8 +1,20 @@
 """ VR Generators: generate random data according to DICOM VR
 """
 
+import os
 import string
+import threading
+from collections import deque
+from itertools import accumulate
 from random import choices, randrange
+from typing import Any, Callable, Dict, List
+
+from fill_dcm import uids
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 PERSONAL_NAME_SAMPLE = {
     "first_names_male": [
@@ -175,6 +187,15 @@ PERSONAL_NAME_SAMPLE = {
     ],
 }
 
+# Alphabets and samples built once, not at each generation
+ALPHANUMERIC = string.ascii_letters + string.digits
+UPPERCASE_ALPHANUMERIC = string.ascii_uppercase + string.digits
+FIRST_NAMES = PERSONAL_NAME_SAMPLE["first_names_female"] + PERSONAL_NAME_SAMPLE["first_names_male"]
+LAST_NAMES = PERSONAL_NAME_SAMPLE["last_names"]
+
+# Number of values generated at once to refill a pool
+DEFAULT_POOL_SIZE = 4096
+
 
 def generate_id() -> str:
     """Generate a Patient ID following DICOM LO VR spec
@@ -183,7 +204,7 @@ def generate_id() -> str:
     Returns:
         A Patient ID as a string
     """
-    return "".join(choices(string.ascii_uppercase + string.digits, k=10))
+    return "".join(choices(UPPERCASE_ALPHANUMERIC, k=10))
 
 
 def generate_age_string() -> str:
@@ -238,10 +259,7 @@ def generate_personal_name() -> str:
     Returns:
         A DICOM personal name
     """
-    possible_first_names = []
-    possible_first_names.extend(PERSONAL_NAME_SAMPLE["first_names_female"])
-    possible_first_names.extend(PERSONAL_NAME_SAMPLE["first_names_male"])
-    return f"{choices(PERSONAL_NAME_SAMPLE['last_names'])[0]}^{choices(possible_first_names)[0]}"
+    return f"{choices(LAST_NAMES)[0]}^{choices(FIRST_NAMES)[0]}"
 
 
 def generate_date() -> str:
@@ -260,7 +278,7 @@ def generate_lo() -> str:
         Returns:
             A randomized LO value with at least one character and max 64
     """
-    return "".join(choices(string.ascii_letters + string.digits, k=randrange(1, 64)))
+    return "".join(choices(ALPHANUMERIC, k=randrange(1, 64)))
 
 
 def generate_long_text() -> str:
@@ -269,7 +287,7 @@ def generate_long_text() -> str:
         Returns:
             A randomized LT value with at least one character and max 1024
     """
-    return "".join(choices(string.ascii_letters + string.digits, k=randrange(1, 1024)))
+    return "".join(choices(ALPHANUMERIC, k=randrange(1, 1024)))
 
 
 def generate_short_string() -> str:
@@ -278,7 +296,7 @@ def generate_short_string() -> str:
         Returns:
             A randomized SH value with at least one character and max 16
     """
-    return "".join(choices(string.ascii_letters + string.digits, k=randrange(1, 16)))
+    return "".join(choices(ALPHANUMERIC, k=randrange(1, 16)))
 
 
 def generate_short_text() -> str:
@@ -287,7 +305,7 @@ def generate_short_text() -> str:
         Returns:
             A randomized ST value with at least one character and max 1024
     """
-    return "".join(choices(string.ascii_letters + string.digits, k=randrange(1, 1024)))
+    return "".join(choices(ALPHANUMERIC, k=randrange(1, 1024)))
 
 
 def generate_time() -> str:
@@ -299,13 +317,15 @@ def generate_time() -> str:
     return f"{randrange(0, 23):02}{randrange(0, 59):02}{randrange(0, 59):02}"
 
 
-def generate_unique_identifier() -> str:
+def generate_unique_identifier(root: str = None) -> str:
     """Generate a data and follow DICOM UI VR specs.
     https://dicom.nema.org/dicom/2013/output/chtml/part05/sect_6.2.html
+        Parameters:
+            root : str Organization root of the UID, None for the 2.25 form
         Returns:
-            A randomized UI value with the format <digits>.<digits>.<digits>.<digits>
+            A UI value unique by construction, 2.25.<digits> or <root>.<digits>.<digits> (see uids.UIDGenerator)
     """
-    return f"{randrange(1,1000)}.{randrange(1,1000)}.{randrange(1,1000)}.{randrange(1,1000)}"
+    return uids.get_generator(root).next()
 
 
 def generate_unsigned_short() -> int:
@@ -315,3 +335,173 @@ def generate_unsigned_short() -> int:
             A randomized US, a number in the range 0 <= x < 65536
     """
     return randrange(0, 65536)
+
+
+# Generator of a single value for each managed VR
+VR_GENERATORS: Dict[str, Callable[[], Any]] = {
+    "AS": generate_age_string,
+    "DA": generate_date,
+    "DS": generate_decimal_string,
+    "DT": generate_date_time,
+    "IS": generate_integer_string,
+    "LO": generate_lo,
+    "LT": generate_long_text,
+    "PN": generate_personal_name,
+    "SH": generate_short_string,
+    "ST": generate_short_text,
+    "TM": generate_time,
+    "UI": generate_unique_identifier,
+    "US": generate_unsigned_short,
+}
+
+# NumPy random generator of the current process: a forked process shall not reuse the state of its parent
+_numpy_generator = (None, None)
+
+
+def _numpy_random_generator():
+    """Return the NumPy random generator of the current process"""
+    global _numpy_generator
+    pid, generator = _numpy_generator
+    if pid != os.getpid():
+        generator = numpy.random.default_rng()
+        _numpy_generator = (os.getpid(), generator)
+    return generator
+
+
+def _random_integers(low: int, high: int, count: int) -> List[int]:
+    """Generate `count` integers in the range low <= x < high, with NumPy if it is available"""
+    if numpy is not None:
+        return _numpy_random_generator().integers(low, high, count).tolist()
+    return choices(range(low, high), k=count)
+
+
+def _random_characters(alphabet: str, count: int) -> str:
+    """Generate a string of `count` characters from an ASCII alphabet, with NumPy if it is available"""
+    if numpy is not None:
+        indices = _numpy_random_generator().integers(0, len(alphabet), count)
+        return numpy.frombuffer(alphabet.encode("ascii"), dtype=numpy.uint8)[indices].tobytes().decode("ascii")
+    return "".join(choices(alphabet, k=count))
+
+
+def _random_strings(alphabet: str, min_length: int, max_length: int, count: int) -> List[str]:
+    """Generate `count` strings of characters from `alphabet` with a length in the range min_length <= x < max_length.
+    All characters are drawn at once and then split in strings."""
+    lengths = [min_length] * count if max_length - min_length <= 1 else _random_integers(min_length, max_length, count)
+    characters = _random_characters(alphabet, sum(lengths))
+    ends = list(accumulate(lengths))
+    return [characters[end - length : end] for end, length in zip(ends, lengths)]
+
+
+def _generate_dates(count: int) -> List[str]:
+    """Batch version of generate_date()"""
+    years = _random_integers(1950, 2020, count)
+    months = _random_integers(1, 12, count)
+    days = _random_integers(1, 30, count)
+    return [f"{year}{month:02}{day:02}" for year, month, day in zip(years, months, days)]
+
+
+def _generate_times(count: int) -> List[str]:
+    """Batch version of generate_time()"""
+    hours = _random_integers(0, 23, count)
+    minutes = _random_integers(0, 59, count)
+    seconds = _random_integers(0, 59, count)
+    return [f"{hour:02}{minute:02}{second:02}" for hour, minute, second in zip(hours, minutes, seconds)]
+
+
+def _generate_personal_names(count: int) -> List[str]:
+    """Batch version of generate_personal_name()"""
+    last_names = _random_integers(0, len(LAST_NAMES), count)
+    first_names = _random_integers(0, len(FIRST_NAMES), count)
+    return [f"{LAST_NAMES[last_name]}^{FIRST_NAMES[first_name]}" for last_name, first_name in zip(last_names, first_names)]
+
+
+def _generate_unique_identifiers(count: int, root: str = None) -> List[str]:
+    """Batch version of generate_unique_identifier(): a block of consecutive counters is reserved at once"""
+    return uids.get_generator(root).generate_block(count)
+
+
+# Generator of `count` values for each managed VR
+BATCH_GENERATORS: Dict[str, Callable[[int], List[Any]]] = {
+    "AS": lambda count: [f"{digits}Y" for digits in _random_strings(string.digits, 3, 4, count)],
+    "DA": _generate_dates,
+    "DS": lambda count: _random_strings(string.digits, 1, 16, count),
+    "DT": lambda count: [f"{date}{time}" for date, time in zip(_generate_dates(count), _generate_times(count))],
+    "IS": lambda count: [str(value) for value in _random_integers(-1 * 2**31, (2**31) - 1, count)],
+    "LO": lambda count: _random_strings(ALPHANUMERIC, 1, 64, count),
+    "LT": lambda count: _random_strings(ALPHANUMERIC, 1, 1024, count),
+    "PN": _generate_personal_names,
+    "SH": lambda count: _random_strings(ALPHANUMERIC, 1, 16, count),
+    "ST": lambda count: _random_strings(ALPHANUMERIC, 1, 1024, count),
+    "TM": _generate_times,
+    "UI": _generate_unique_identifiers,
+    "US": lambda count: _random_integers(0, 65536, count),
+}
+
+
+def generate_batch(vr: str, count: int, uid_root: str = None) -> List[Any]:
+    """Generate `count` values following the DICOM spec of a VR, in one pass. NumPy is used if it is available.
+    Values follow the same rules as the generator of a single value of the VR (see VR_GENERATORS).
+
+    Args:
+        vr (str): DICOM VR
+        count (int): Number of values to generate
+        uid_root (str, optional): Organization root of the UI values. Defaults to None, the 2.25 form.
+
+    Raises:
+        ValueError: if the VR isn't managed
+
+    Returns:
+        List[Any]: The generated values
+    """
+    if vr not in BATCH_GENERATORS:
+        raise ValueError(f"VR: {vr} not managed")
+    if vr == "UI":
+        return _generate_unique_identifiers(count, uid_root)
+    return BATCH_GENERATORS[vr](count)
+
+
+class ValuePool:
+    """Pool of pre-generated values of a VR, refilled by batches. Each value is given once."""
+
+    def __init__(self, vr: str, batch_size: int = DEFAULT_POOL_SIZE, uid_root: str = None):
+        """ValuePool constructor
+
+        Args:
+            vr (str): DICOM VR of the values
+            batch_size (int, optional): Number of values generated at each refill. Defaults to DEFAULT_POOL_SIZE.
+            uid_root (str, optional): Organization root of the UI values. Defaults to None, the 2.25 form.
+        """
+        self.vr: str = vr
+        self.batch_size: int = batch_size
+        self.uid_root: str = uid_root
+        self._values: deque = deque()
+        self._lock = threading.Lock()
+
+    def next(self) -> Any:
+        """Return a new value of the pool"""
+        with self._lock:
+            if not self._values:
+                self._values.extend(generate_batch(self.vr, self.batch_size, self.uid_root))
+            return self._values.popleft()
+
+
+# Pools of the current process, by VR
+_pools: Dict[tuple, ValuePool] = {}
+
+
+def get_pool(vr: str, uid_root: str = None) -> ValuePool:
+    """Return the pool of values of a VR, created once per process
+
+    Args:
+        vr (str): DICOM VR
+        uid_root (str, optional): Organization root of the UI values. Defaults to None, the 2.25 form.
+
+    Returns:
+        ValuePool: the pool
+    """
+    # UIDs pre-generated under another root aren't given to a run with another root
+    uid_root = uid_root if vr == "UI" else None
+    key = (os.getpid(), vr, uid_root)
+    if key not in _pools:
+        _pools[key] = ValuePool(vr, uid_root=uid_root)
+    return _pools[key]
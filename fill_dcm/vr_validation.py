@@ -0,0 +1,132 @@
+""" vr_validation: rules of the values of each VR, compiled once and checked on the plan before any file is processed
+"""
+
+import re
+from typing import Any, Dict, NamedTuple, Optional, Pattern, Tuple
+
+# Characters allowed in the values of the string VRs: no control character but ESC, used by the character sets, and no backslash,
+# the separator of multiple values
+_TEXT = r"[^\\\x00-\x1a\x1c-\x1f]*"
+# Characters allowed in the values of the text VRs, single-valued: backslashes, tabs and line breaks are also allowed
+_LONG_TEXT = r"[^\x00-\x08\x0b\x0e-\x1a\x1c-\x1f]*"
+# Component group of a person name: up to 5 components separated by '^'
+_PN_GROUP = r"[^=^\\\x00-\x1a\x1c-\x1f]*(\^[^=^\\\x00-\x1a\x1c-\x1f]*){0,4}"
+_DATE = r"\d{4}(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])"
+_TIME = r"([01]\d|2[0-3])([0-5]\d(([0-5]\d|60)(\.\d{1,6})?)?)?"
+
+
+class VRRule(NamedTuple):
+    """Rule of the values of a VR (see DICOM PS3.5, table 6.2-1)"""
+
+    # Maximum number of characters of a value, 0 if unlimited. For PN, of each component group
+    max_length: int = 0
+    # Pattern each value shall fully match, None for the binary VRs
+    pattern: Optional[Pattern] = None
+    # False if the characters of a specific character set are allowed, True if only ASCII characters are
+    default_repertoire: bool = True
+    # False if a string value is a single value, backslashes included
+    multi_valued: bool = True
+    # Type of the values of the binary VRs, None for the string VRs
+    number_type: type = None
+    # Inclusive bounds of the numbers, None if unbounded
+    bounds: Tuple[int, int] = None
+
+
+def _rule(max_length: int, pattern: str, default_repertoire: bool = True, multi_valued: bool = True, bounds: Tuple[int, int] = None) -> VRRule:
+    """Rule of a string VR, with its pattern compiled"""
+    return VRRule(max_length, re.compile(pattern), default_repertoire, multi_valued, None, bounds)
+
+
+# Rules of the VRs whose values can be checked. Values of the other VRs (OB, SQ, UN, ambiguous VRs...) are only checked by pydicom
+RULES: Dict[str, VRRule] = {
+    "AE": _rule(16, r"[\x20-\x5b\x5d-\x7e]*"),
+    "AS": _rule(4, r"\d{3}[DWMY]"),
+    "CS": _rule(16, r"[A-Z0-9 _]*"),
+    "DA": _rule(8, _DATE),
+    "DS": _rule(16, r" *[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)? *"),
+    "DT": _rule(26, r"\d{4}((0[1-9]|1[0-2])((0[1-9]|[12]\d|3[01])(" + _TIME + r")?)?)?([+-]((0\d|1[0-3])[0-5]\d|1400))?"),
+    "IS": _rule(12, r" *[+-]?\d+ *", bounds=(-(2**31), 2**31 - 1)),
+    "LO": _rule(64, _TEXT, default_repertoire=False),
+    "LT": _rule(10240, _LONG_TEXT, default_repertoire=False, multi_valued=False),
+    "PN": _rule(64, _PN_GROUP + "(=" + _PN_GROUP + "){0,2}", default_repertoire=False),
+    "SH": _rule(16, _TEXT, default_repertoire=False),
+    "ST": _rule(1024, _LONG_TEXT, default_repertoire=False, multi_valued=False),
+    "TM": _rule(14, _TIME),
+    "UC": _rule(0, _TEXT, default_repertoire=False),
+    "UI": _rule(64, r"(0|[1-9]\d*)(\.(0|[1-9]\d*))*"),
+    "UR": _rule(0, r"[\x21-\x5b\x5d-\x7e]*", multi_valued=False),
+    "UT": _rule(0, _LONG_TEXT, default_repertoire=False, multi_valued=False),
+    "FL": VRRule(number_type=float),
+    "FD": VRRule(number_type=float),
+    "SS": VRRule(number_type=int, bounds=(-(2**15), 2**15 - 1)),
+    "US": VRRule(number_type=int, bounds=(0, 2**16 - 1)),
+    "SL": VRRule(number_type=int, bounds=(-(2**31), 2**31 - 1)),
+    "UL": VRRule(number_type=int, bounds=(0, 2**32 - 1)),
+    "SV": VRRule(number_type=int, bounds=(-(2**63), 2**63 - 1)),
+    "UV": VRRule(number_type=int, bounds=(0, 2**64 - 1)),
+}
+
+
+def is_checked(vr: str) -> bool:
+    """Indicate if the values of a VR are checked by invalid_value()"""
+    return vr in RULES
+
+
+def invalid_value(vr: str, value: Any) -> Optional[str]:
+    """Check a value against the rule of its VR
+
+    Args:
+        vr (str): VR of the element
+        value (Any): Value of the element: a string, a number or a list of them. A string of a multi-valued VR may hold
+            several values separated by backslashes
+
+    Returns:
+        str: The reason why the value is invalid, None if it is valid or if its VR isn't checked
+    """
+    rule = RULES.get(vr)
+    if rule is None or value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        values = value
+    elif isinstance(value, str) and rule.multi_valued:
+        values = value.split("\\")
+    else:
+        values = [value]
+    for single_value in values:
+        reason = _invalid_single_value(vr, rule, single_value)
+        if reason is not None:
+            return reason
+    return None
+
+
+def _invalid_single_value(vr: str, rule: VRRule, value: Any) -> Optional[str]:
+    """Check a single value against the rule of its VR (see invalid_value())"""
+    if rule.number_type is not None:
+        if isinstance(value, bool) or not isinstance(value, (int, float) if rule.number_type is float else int):
+            return f"{vr} values shall be {'numbers' if rule.number_type is float else 'integers'}, given as numbers in a JSON input"
+        return _out_of_bounds(vr, rule, value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and vr in ("DS", "IS"):
+        value = str(value)
+    if not isinstance(value, str):
+        return f"{vr} values shall be strings"
+    if not value:
+        # An empty value leaves the element empty
+        return None
+    if rule.default_repertoire and not value.isascii():
+        return f"{vr} values shall only have characters of the default repertoire"
+    if rule.max_length:
+        groups = value.split("=") if vr == "PN" else [value]
+        if any(len(group) > rule.max_length for group in groups):
+            return f"{vr} values shall have at most {rule.max_length} characters"
+    if not rule.pattern.fullmatch(value):
+        return f"'{value}' isn't a valid {vr} value"
+    if rule.bounds is not None:
+        return _out_of_bounds(vr, rule, int(value))
+    return None
+
+
+def _out_of_bounds(vr: str, rule: VRRule, value: Any) -> Optional[str]:
+    """Check a number against the bounds of its VR"""
+    if rule.bounds is not None and not rule.bounds[0] <= value <= rule.bounds[1]:
+        return f"{vr} values shall be between {rule.bounds[0]} and {rule.bounds[1]}"
+    return None
@@ -1,4 +1,6 @@
+import sys
+
 from fill_dcm import fill_dcm
 
 if __name__ == "__main__":
-    fill_dcm.fill_dcm_executable()
+    sys.exit(fill_dcm.fill_dcm_executable())
@@ -4,9 +4,9 @@
 import unittest
 from json import loads
 
-from pydicom import Dataset
+from pydicom import Dataset, config
 
-from fill_dcm import fill_dcm, parse_argument
+from fill_dcm import edit_plan, fill_dcm, parse_argument
 
 
 class TestAdjustDICOMDataset(unittest.TestCase):
@@ -155,6 +155,50 @@ class TestAdjustDICOMDataset(unittest.TestCase):
             ds.ReferringPhysicianName,
         )
 
+    def test_recursive(self):
+        """With recursive, tags of the plan are filled or replaced in the items of the sequences at any depth, but not added to them"""
+        ds = self.load_dataset(DICOM_DATASET_JSON, tags_to_remove=[])
+        nested = Dataset()
+        nested.PatientID = "8"
+        nested.InstitutionName = ""
+        item = Dataset()
+        item.ReferencedStudySequence = [nested]
+        ds.RequestAttributesSequence = [item]
+        plan = fill_dcm.update_data(parse_argument.InputTags({"InstitutionName": "Hospital"}, {"PatientID": "ABCD"}))
+
+        changes = fill_dcm.adjust_dicom_dataset(ds, plan, recursive=True)
+
+        self.assertEqual(ds.PatientID, "ABCD")
+        self.assertEqual(nested.PatientID, "ABCD")
+        self.assertEqual(nested.InstitutionName, "Hospital")
+        self.assertNotIn("PatientID", item)
+        self.assertEqual(changes.count(("update", "PatientID", "ABCD")), 2)
+
+    def test_not_recursive(self):
+        """By default, the items of the sequences are left as is"""
+        ds = self.load_dataset(DICOM_DATASET_JSON, tags_to_remove=[])
+        item = Dataset()
+        item.PatientID = "8"
+        ds.ReferencedStudySequence = [item]
+
+        fill_dcm.adjust_dicom_dataset(ds, fill_dcm.update_data(parse_argument.InputTags({}, {"PatientID": "ABCD"})))
+
+        self.assertEqual(ds.PatientID, "ABCD")
+        self.assertEqual(item.PatientID, "8")
+
+    def test_validated_plan(self):
+        """Values of a validated plan are not checked again by pydicom, the others are"""
+        ds = self.load_dataset(DICOM_DATASET_JSON, tags_to_remove=["00100010"])
+        validated = edit_plan.compile_plan(parse_argument.InputTags({"PatientName": "Wayne^Bruce"}, {"PatientID": "42"}))
+        self.assertTrue(validated.validated)
+
+        fill_dcm.adjust_dicom_dataset(ds, validated)
+
+        self.assertEqual(ds["PatientName"].validation_mode, config.IGNORE)
+        self.assertEqual(ds["PatientID"].validation_mode, config.IGNORE)
+        with self.assertWarns(UserWarning):
+            fill_dcm.adjust_dicom_dataset(ds, parse_argument.InputTags({}, {"StudyDate": "2024-01-01"}))
+
 
 DICOM_DATASET_JSON = r"""{
     "00080005": { "Value": ["ISO_IR 100"], "vr": "CS" },
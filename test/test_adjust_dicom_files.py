@@ -0,0 +1,412 @@
+""" Test fill_dcm.adjust_dicom_files() unit tests
+"""
+
+import json
+import logging
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+from pydicom import Dataset, dcmread, examples
+
+from fill_dcm import fill_dcm, parse_argument
+
+
+class TestAdjustDICOMFiles(unittest.TestCase):
+    """Test fill_dcm.adjust_dicom_files()"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def create_files(self, count):
+        """Write `count` DICOM files in the temporary directory and return their paths"""
+        files = []
+        for index in range(count):
+            file = self.directory / f"ct_{index}.dcm"
+            examples.ct.save_as(file)
+            files.append(str(file))
+        return files
+
+    def test_serial_run(self):
+        """With one job, all files are adjusted and a '_modified' copy is written"""
+        files = self.create_files(3)
+        input_tags = parse_argument.InputTags({}, {"PatientID": "FILLDCM"})
+
+        summary = fill_dcm.adjust_dicom_files(files, input_tags, parse_argument.Options(jobs=1))
+
+        self.assertEqual(summary.total, 3)
+        self.assertEqual(summary.failed, 0)
+        for file in files:
+            self.assertEqual(dcmread(fill_dcm.output_filepath(file)).PatientID, "FILLDCM")
+
+    def test_output_file_logs(self):
+        """Output files are only logged at debug level, the run logs its summary"""
+        files = self.create_files(3)
+        input_tags = parse_argument.InputTags({}, {"PatientID": "FILLDCM"})
+
+        with self.assertLogs(level=logging.INFO) as logs:
+            fill_dcm.adjust_dicom_files(files, input_tags, parse_argument.Options(jobs=1, log_detail="run"))
+
+        self.assertFalse(any("Output file" in message for message in logs.output))
+        self.assertTrue(any("3 file(s) processed" in message for message in logs.output))
+
+    def test_parallel_run(self):
+        """With several jobs, all files are adjusted with the same generated values"""
+        files = self.create_files(6)
+        input_tags = parse_argument.InputTags({"PatientID": None}, {"InstitutionName": "FillDCM"})
+
+        summary = fill_dcm.adjust_dicom_files(files, input_tags, parse_argument.Options(overwrite_output_file=True, jobs=3))
+
+        self.assertEqual(summary.total, 6)
+        self.assertEqual(summary.failed, 0)
+        for file in files:
+            dataset = dcmread(file)
+            self.assertEqual(dataset.InstitutionName, "FillDCM")
+            # PatientID exists in the example, it is not filled
+            self.assertEqual(dataset.PatientID, examples.ct.PatientID)
+
+    def test_streamed_files(self):
+        """Files are processed as they are discovered, in serial and in parallel runs"""
+        files = self.create_files(40)
+        input_tags = parse_argument.InputTags({}, {"PatientID": "FILLDCM"})
+
+        def discovered_files():
+            for file in files[:2]:
+                yield file
+            # The first files are adjusted before the next ones are discovered
+            self.assertTrue(Path(fill_dcm.output_filepath(files[0])).exists())
+
+        summary = fill_dcm.adjust_dicom_files(discovered_files(), input_tags, parse_argument.Options(jobs=1))
+        self.assertEqual(summary.total, 2)
+
+        summary = fill_dcm.adjust_dicom_files(iter(files), input_tags, parse_argument.Options(overwrite_output_file=True, jobs=2))
+        self.assertEqual(summary.total, 40)
+        self.assertEqual(summary.failed, 0)
+        self.assertEqual(dcmread(files[-1]).PatientID, "FILLDCM")
+
+    def test_streamed_files_pool_size(self):
+        """The pool of a run with discovered files is sized from the first files, no pool is started for a single chunk"""
+        files = self.create_files(40)
+        input_tags = parse_argument.InputTags({}, {"PatientID": "FILLDCM"})
+        options = parse_argument.Options(overwrite_output_file=True, jobs=4)
+
+        with patch("concurrent.futures.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as executor:
+            summary = fill_dcm.adjust_dicom_files(iter(files[: fill_dcm.STREAM_CHUNK_SIZE]), input_tags, options)
+            self.assertEqual(summary.total, fill_dcm.STREAM_CHUNK_SIZE)
+            executor.assert_not_called()
+
+            summary = fill_dcm.adjust_dicom_files(iter(files), input_tags, options)
+            self.assertEqual(summary.total, 40)
+            self.assertEqual(executor.call_args.kwargs["max_workers"], 3)
+        self.assertEqual(dcmread(files[-1]).PatientID, "FILLDCM")
+
+    def test_executable_with_directory(self):
+        """Directories given on the command line are walked, with the include patterns"""
+        files = self.create_files(2)
+        (self.directory / "notes.txt").write_text("not a DICOM file")
+        # The executable sets the handler of the root logger
+        root = logging.getLogger()
+        self.addCleanup(setattr, root, "handlers", root.handlers[:])
+        self.addCleanup(root.setLevel, root.level)
+
+        status = fill_dcm.fill_dcm_executable([str(self.directory), "--include", "*.dcm", "-ov", "-J", "1", "-r", "PatientID=ABCD"])
+
+        self.assertEqual(status, 0)
+        self.assertEqual([dcmread(file).PatientID for file in files], ["ABCD", "ABCD"])
+
+    def test_executable_with_directory_copies(self):
+        """Copies written while a directory is walked, or by a previous run, aren't adjusted again"""
+        files = self.create_files(40)
+        root = logging.getLogger()
+        self.addCleanup(setattr, root, "handlers", root.handlers[:])
+        self.addCleanup(root.setLevel, root.level)
+
+        for _ in range(2):
+            status = fill_dcm.fill_dcm_executable([str(self.directory), "-J", "2", "-r", "PatientID=ABCD"])
+            self.assertEqual(status, 0)
+
+        self.assertEqual(
+            sorted(path.name for path in self.directory.iterdir()),
+            sorted([Path(file).name for file in files] + [Path(fill_dcm.output_filepath(file)).name for file in files]),
+        )
+        self.assertEqual(dcmread(fill_dcm.output_filepath(files[-1])).PatientID, "ABCD")
+
+    def test_parallel_run_with_invalid_file(self):
+        """Errors raised in worker processes are reported in the summary"""
+        files = self.create_files(2)
+        invalid_file = self.directory / "invalid.dcm"
+        invalid_file.write_bytes(b"not a DICOM file")
+        files.append(str(invalid_file))
+
+        summary = fill_dcm.adjust_dicom_files(files, parse_argument.InputTags({}, {"PatientID": "FILLDCM"}), parse_argument.Options(jobs=2))
+
+        self.assertEqual(summary.total, 3)
+        self.assertEqual(summary.failed, 1)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.READ_ERROR], 1)
+
+    def test_overwrite_patch_and_rewrite(self):
+        """With the overwrite option, values that fit in the current elements are patched, otherwise the file is rewritten"""
+        files = self.create_files(2)
+        options = parse_argument.Options(overwrite_output_file=True, jobs=1)
+
+        summary = fill_dcm.adjust_dicom_files(files[:1], parse_argument.InputTags({}, {"PatientID": "ABCD"}), options)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.PATCHED], 1)
+        self.assertEqual(dcmread(files[0]).PatientID, "ABCD")
+
+        summary = fill_dcm.adjust_dicom_files(files[1:], parse_argument.InputTags({"PatientSize": "1.80"}, {"PatientID": "ABCD"}), options)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.REWRITTEN], 1)
+        self.assertEqual(dcmread(files[1]).PatientSize, 1.8)
+
+    def test_copy_patched(self):
+        """Without the overwrite option, values that fit in the current elements are patched in a copy of the input"""
+        files = self.create_files(1)
+        original = Path(files[0]).read_bytes()
+
+        summary = fill_dcm.adjust_dicom_files(files, parse_argument.InputTags({}, {"PatientID": "ABCD"}), parse_argument.Options(jobs=1))
+
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.PATCHED], 1)
+        self.assertEqual(Path(files[0]).read_bytes(), original)
+        self.assertEqual(dcmread(fill_dcm.output_filepath(files[0])).PatientID, "ABCD")
+
+    def test_memory_map(self):
+        """Files read through memory maps are adjusted like files read with file objects, in place included"""
+        files = self.create_files(2)
+        options = parse_argument.Options(overwrite_output_file=True, jobs=1, memory_map=True)
+
+        summary = fill_dcm.adjust_dicom_files(files, parse_argument.InputTags({"PatientSize": "1.80"}, {"PatientID": "ABCD"}), options)
+
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.REWRITTEN], 2)
+        for file in files:
+            dataset = dcmread(file)
+            self.assertEqual(dataset.PatientSize, 1.8)
+            self.assertEqual(dataset.PixelData, examples.ct.PixelData)
+
+    def test_recursive(self):
+        """With recursive, a file whose nested tags change is rewritten rather than patched"""
+        file = self.directory / "ct_nested.dcm"
+        dataset = examples.ct
+        item = Dataset()
+        item.PatientID = examples.ct.PatientID
+        dataset.RequestAttributesSequence = [item]
+        dataset.save_as(file)
+        input_tags = parse_argument.InputTags({}, {"PatientID": "ABCD"})
+
+        summary = fill_dcm.adjust_dicom_files([str(file)], input_tags, parse_argument.Options(overwrite_output_file=True, jobs=1, recursive=True))
+
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.REWRITTEN], 1)
+        adjusted = dcmread(file)
+        self.assertEqual(adjusted.PatientID, "ABCD")
+        self.assertEqual(adjusted.RequestAttributesSequence[0].PatientID, "ABCD")
+        self.assertEqual(adjusted.PixelData, examples.ct.PixelData)
+
+    def test_per_file_values(self):
+        """With per file values, each file gets its own generated values"""
+        files = self.create_files(4)
+        input_tags = parse_argument.InputTags({"InstitutionAddress": None}, {})
+
+        fill_dcm.adjust_dicom_files(files, input_tags, parse_argument.Options(jobs=1, per_file_values=True))
+
+        addresses = {dcmread(fill_dcm.output_filepath(file)).InstitutionAddress for file in files}
+        self.assertEqual(len(addresses), 4)
+
+    def test_per_file_uids(self):
+        """UIDs generated for each file by parallel workers are unique and under the organization root"""
+        files = self.create_files(8)
+        input_tags = parse_argument.InputTags({}, {"SOPInstanceUID": None})
+        options = parse_argument.Options(jobs=2, per_file_values=True, uid_root="1.2.826.0.1.3680043.10.543")
+
+        fill_dcm.adjust_dicom_files(files, input_tags, options)
+
+        instances = {dcmread(fill_dcm.output_filepath(file)).SOPInstanceUID for file in files}
+        self.assertEqual(len(instances), 8)
+        self.assertTrue(all(instance.startswith("1.2.826.0.1.3680043.10.543.") for instance in instances))
+
+    def test_group_by(self):
+        """With groups, the files of a study share their generated values, other studies get other values"""
+        files = self.create_files(6)
+        for index, file in enumerate(files):
+            dataset = dcmread(file)
+            dataset.StudyInstanceUID = f"1.2.{index % 2}"
+            dataset.save_as(file)
+        input_tags = parse_argument.InputTags({"InstitutionAddress": None}, {"StudyInstanceUID": None})
+
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                summary = fill_dcm.adjust_dicom_files(files, input_tags, parse_argument.Options(jobs=jobs, group_by="study"))
+
+                self.assertEqual(summary.counts[fill_dcm.FileStatus.REWRITTEN], 6)
+                adjusted = [dcmread(fill_dcm.output_filepath(file)) for file in files]
+                studies = [(dataset.StudyInstanceUID, dataset.InstitutionAddress) for dataset in adjusted]
+                self.assertEqual(len(set(studies[0::2])), 1)
+                self.assertEqual(len(set(studies[1::2])), 1)
+                self.assertNotEqual(studies[0][0], studies[1][0])
+                self.assertNotEqual(studies[0][1], studies[1][1])
+
+    def test_resume_group_by(self):
+        """A resumed run gives the remaining files of a group the values the interrupted run generated for the group"""
+        files = self.create_files(4)
+        for file in files:
+            dataset = dcmread(file)
+            dataset.StudyInstanceUID = "1.2.3"
+            dataset.save_as(file)
+        input_tags = parse_argument.InputTags({}, {"InstitutionName": None})
+        journal_path = str(self.directory / "journal.jsonl")
+
+        fill_dcm.adjust_dicom_files(files[:2], input_tags, parse_argument.Options(jobs=1, group_by="study", journal_path=journal_path))
+        options = parse_argument.Options(jobs=1, group_by="study", journal_path=journal_path, resume=True)
+        summary = fill_dcm.adjust_dicom_files(files, input_tags, options)
+
+        self.assertEqual(summary.total, 4)
+        self.assertEqual(len({dcmread(fill_dcm.output_filepath(file)).InstitutionName for file in files}), 1)
+
+    def test_stats(self):
+        """With a stats path, the timings of each stage, the volumes and the errors are written in a JSON file"""
+        files = self.create_files(3)
+        invalid_file = self.directory / "invalid.dcm"
+        invalid_file.write_bytes(b"not a DICOM file")
+        files.append(str(invalid_file))
+        stats_path = self.directory / "stats.json"
+        options = parse_argument.Options(jobs=2, stats_path=str(stats_path), stats_slowest=2)
+
+        fill_dcm.adjust_dicom_files(files, parse_argument.InputTags({}, {"InstitutionAddress": "FillDCM"}), options)
+
+        report = json.loads(stats_path.read_text())
+        self.assertEqual(report["files"], 4)
+        self.assertEqual(report["statuses"], {"rewritten": 3, "read_error": 1})
+        self.assertEqual(report["errors"], {"read_error": 1})
+        self.assertEqual(set(report["stages"]), {"read", "adjust", "output_filepath", "write"})
+        self.assertEqual(len(report["stages"]["read"]), 5)
+        self.assertEqual(len(report["slowest_files"]), 2)
+        self.assertGreater(report["bytes_read"], 0)
+        self.assertEqual(report["bytes_written"], sum(Path(fill_dcm.output_filepath(file)).stat().st_size for file in files[:3]))
+
+    def test_rewrite_failure_keeps_original(self):
+        """A file rewritten in place is left untouched if the write fails midway"""
+        files = self.create_files(1)
+        original = Path(files[0]).read_bytes()
+
+        def truncated_save(dataset, filename, *args, **kwargs):
+            Path(filename).write_bytes(b"DICM")
+            raise OSError("No space left on device")
+
+        # The whole dataset is read and saved
+        with patch("fill_dcm.dicom_io.can_passthrough", return_value=False), patch("pydicom.Dataset.save_as", truncated_save):
+            summary = fill_dcm.adjust_dicom_files(
+                files, parse_argument.InputTags({"PatientSize": "1.80"}, {}), parse_argument.Options(overwrite_output_file=True, jobs=1)
+            )
+
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.WRITE_ERROR], 1)
+        self.assertEqual(Path(files[0]).read_bytes(), original)
+        self.assertEqual(sorted(path.name for path in self.directory.iterdir()), ["ct_0.dcm"])
+
+    def test_durability_batch(self):
+        """With the batch durability policy, the written files are synced by batches, the last one at the end of the run, before
+        they are renamed into place"""
+        files = self.create_files(5)
+        options = parse_argument.Options(jobs=1, durability="batch", sync_files=2)
+
+        with patch.object(fill_dcm.durability, "fsync_path", wraps=fill_dcm.durability.fsync_path) as fsync_path:
+            summary = fill_dcm.adjust_dicom_files(files, parse_argument.InputTags({}, {"InstitutionAddress": "FillDCM"}), options)
+
+        self.assertEqual(summary.failed, 0)
+        self.assertEqual(summary.durability_policy.syncs, 3)
+        synced = [call.args[0] for call in fsync_path.call_args_list]
+        self.assertEqual(synced.count(str(self.directory)), 3)
+        temporary_files = set(synced) - {str(self.directory)}
+        self.assertEqual(len(temporary_files), 5)
+        self.assertTrue(all(Path(path).name.startswith(".") and path.endswith(".tmp") for path in temporary_files))
+        self.assertTrue(all(Path(fill_dcm.output_filepath(file)).exists() for file in files))
+        self.assertFalse(any(path.name.endswith(".tmp") for path in self.directory.iterdir()))
+
+    def test_unchanged(self):
+        """Files the plan doesn't change are left as is"""
+        files = self.create_files(2)
+        status = Path(files[0]).stat()
+        input_tags = parse_argument.InputTags({"PatientID": None}, {"PatientName": str(examples.ct.PatientName)})
+
+        summary = fill_dcm.adjust_dicom_files(files, input_tags, parse_argument.Options(overwrite_output_file=True, jobs=1))
+
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.UNCHANGED], 2)
+        self.assertEqual(summary.failed, 0)
+        self.assertEqual(Path(files[0]).stat().st_mtime_ns, status.st_mtime_ns)
+
+    def test_manifest(self):
+        """With a manifest, files processed with the same tags and unchanged since are skipped"""
+        files = self.create_files(3)
+        options = parse_argument.Options(overwrite_output_file=True, jobs=1, manifest_path=str(self.directory / "manifest.db"))
+        input_tags = parse_argument.InputTags({}, {"InstitutionName": "FillDCM"})
+
+        summary = fill_dcm.adjust_dicom_files(files, input_tags, options)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.PATCHED], 3)
+
+        examples.ct.save_as(files[1])
+        summary = fill_dcm.adjust_dicom_files(files, input_tags, options)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.SKIPPED], 2)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.PATCHED], 1)
+
+        summary = fill_dcm.adjust_dicom_files(files, parse_argument.InputTags({}, {"InstitutionName": "FillDCM 2"}), options)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.SKIPPED], 0)
+
+    def test_manifest_deleted_output(self):
+        """With a manifest, a file whose output has been deleted since is processed again"""
+        files = self.create_files(2)
+        options = parse_argument.Options(jobs=1, manifest_path=str(self.directory / "manifest.db"))
+        input_tags = parse_argument.InputTags({}, {"InstitutionName": "FillDCM"})
+
+        summary = fill_dcm.adjust_dicom_files(files, input_tags, options)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.PATCHED], 2)
+
+        os.remove(fill_dcm.output_filepath(files[0]))
+        summary = fill_dcm.adjust_dicom_files(files, input_tags, options)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.SKIPPED], 1)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.PATCHED], 1)
+        self.assertTrue(os.path.exists(fill_dcm.output_filepath(files[0])))
+
+    def test_resume_parallel_run(self):
+        """A resumed parallel run processes only the files the journal doesn't have, and reports the whole run"""
+        files = self.create_files(4)
+        invalid_file = self.directory / "invalid.dcm"
+        invalid_file.write_bytes(b"not a DICOM file")
+        files.insert(1, str(invalid_file))
+        input_tags = parse_argument.InputTags({}, {"PatientID": "ABCD"})
+        journal_path = str(self.directory / "journal.jsonl")
+
+        # The interrupted run completed two files and failed one
+        fill_dcm.adjust_dicom_files(files[:3], input_tags, parse_argument.Options(overwrite_output_file=True, jobs=2, journal_path=journal_path))
+        options = parse_argument.Options(overwrite_output_file=True, jobs=2, journal_path=journal_path, resume=True)
+        summary = fill_dcm.adjust_dicom_files(files, input_tags, options)
+
+        self.assertEqual(summary.total, 5)
+        # Completed files processed again would be unchanged
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.PATCHED], 4)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.UNCHANGED], 0)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.READ_ERROR], 1)
+        for file in files[3:]:
+            self.assertEqual(dcmread(file).PatientID, "ABCD")
+
+    def test_resume_generated_values(self):
+        """A resumed run applies the values generated by the interrupted run"""
+        files = self.create_files(4)
+        input_tags = parse_argument.InputTags({}, {"InstitutionName": None})
+        journal_path = str(self.directory / "journal.jsonl")
+
+        def interrupted_files():
+            yield from files[:2]
+            raise KeyboardInterrupt()
+
+        with self.assertRaises(KeyboardInterrupt):
+            fill_dcm.adjust_dicom_files(
+                interrupted_files(), input_tags, parse_argument.Options(overwrite_output_file=True, jobs=1, journal_path=journal_path)
+            )
+        options = parse_argument.Options(overwrite_output_file=True, jobs=1, journal_path=journal_path, resume=True)
+        summary = fill_dcm.adjust_dicom_files(files, input_tags, options)
+
+        self.assertEqual(summary.total, 4)
+        self.assertEqual(len({dcmread(file).InstitutionName for file in files}), 1)
@@ -0,0 +1,113 @@
+""" Test fill_dcm.archive unit tests
+"""
+
+import io
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from pydicom import dcmread, examples
+
+from fill_dcm import archive, edit_plan, fill_dcm, parse_argument
+
+
+class TestArchive(unittest.TestCase):
+    """Test fill_dcm.archive"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+        buffer = io.BytesIO()
+        examples.ct.save_as(buffer)
+        self.members = {f"study/ct_{index}.dcm": buffer.getvalue() for index in range(3)}
+        self.members["study/README.txt"] = b"not a DICOM file"
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def create_zip(self):
+        path = self.directory / "study.zip"
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for name, data in self.members.items():
+                zip_file.writestr(name, data)
+        return str(path)
+
+    def create_tar(self, suffix):
+        path = self.directory / f"study{suffix}"
+        with tarfile.open(path, f"w:{'gz' if suffix == '.tar.gz' else ''}") as tar_file:
+            for name, data in self.members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar_file.addfile(info, io.BytesIO(data))
+        return str(path)
+
+    def read_members(self, path):
+        """Members of an archive by name"""
+        if path.endswith(".zip"):
+            with zipfile.ZipFile(path) as zip_file:
+                return {name: zip_file.read(name) for name in zip_file.namelist()}
+        with tarfile.open(path) as tar_file:
+            return {member.name: tar_file.extractfile(member).read() for member in tar_file}
+
+    def check_archive(self, path, jobs):
+        """All DICOM members are adjusted in a new archive, the other members are copied"""
+        plan = fill_dcm.run_plan(edit_plan.compile_plan(parse_argument.InputTags({}, {"InstitutionAddress": "FillDCM"})), parse_argument.Options())
+
+        results = archive.adjust_archive(path, plan, parse_argument.Options(jobs=jobs))
+
+        self.assertEqual([result.status for result in results].count(fill_dcm.FileStatus.REWRITTEN), 3)
+        self.assertEqual([result.status for result in results].count(fill_dcm.FileStatus.SKIPPED), 1)
+        self.assertTrue(all(result.succeeded for result in results))
+        members = self.read_members(archive.output_archive_path(path))
+        self.assertEqual(list(members), list(self.members))
+        self.assertEqual(members["study/README.txt"], self.members["study/README.txt"])
+        for name in list(members)[:3]:
+            dataset = dcmread(io.BytesIO(members[name]))
+            self.assertEqual(dataset.InstitutionAddress, "FillDCM")
+            self.assertEqual(dataset.PixelData, examples.ct.PixelData)
+
+    def test_zip(self):
+        self.check_archive(self.create_zip(), jobs=1)
+
+    def test_zip_parallel(self):
+        self.check_archive(self.create_zip(), jobs=2)
+
+    def test_tar_parallel(self):
+        self.check_archive(self.create_tar(".tar"), jobs=2)
+
+    def test_compressed_tar(self):
+        self.check_archive(self.create_tar(".tar.gz"), jobs=2)
+
+    def test_compressed_tar_stream(self):
+        """Members of compressed TAR archives are streamed: once prepared, only the bytes following their header are read"""
+        reader = archive.ArchiveReader(self.create_tar(".tar.gz"))
+        self.addCleanup(reader.close)
+        member = next(iter(reader))
+        plan = fill_dcm.run_plan(edit_plan.compile_plan(parse_argument.InputTags({}, {"InstitutionAddress": "FillDCM"})), parse_argument.Options())
+
+        with reader.open(member) as stream:
+            prepared = archive.prepare_member(stream, member.name, plan, parse_argument.Options())
+            stream.release(prepared.tail_offset)
+
+            self.assertRaises(io.UnsupportedOperation, stream.seek, 0)
+            stream.seek(prepared.tail_offset)
+            self.assertEqual(stream.read(), self.members[member.name][prepared.tail_offset :])
+
+    def test_output_archive_path(self):
+        self.assertEqual(archive.output_archive_path("/data/study.tar.gz"), "/data/study_modified.tar.gz")
+        self.assertEqual(archive.output_archive_path("/data/study.ZIP"), "/data/study_modified.ZIP")
+        self.assertEqual(archive.output_archive_path("/data/study.zip", overwrite_output_file=True), "/data/study.zip")
+
+    def test_adjust_dicom_files_with_archive(self):
+        """Archives given with files are adjusted in place with the overwrite option"""
+        path = self.create_zip()
+
+        summary = fill_dcm.adjust_dicom_files(
+            [path], parse_argument.InputTags({}, {"PatientID": "ABCD"}), parse_argument.Options(overwrite_output_file=True)
+        )
+
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.REWRITTEN], 3)
+        self.assertEqual(dcmread(io.BytesIO(self.read_members(path)["study/ct_0.dcm"])).PatientID, "ABCD")
+        self.assertEqual(list(self.directory.iterdir()), [Path(path)])
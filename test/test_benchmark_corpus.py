@@ -0,0 +1,28 @@
+""" Test benchmark.corpus unit tests
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from pydicom import dcmread
+
+from benchmark import corpus
+
+
+class TestBenchmarkCorpus(unittest.TestCase):
+    """Test benchmark.corpus"""
+
+    def test_generate_corpus(self):
+        """The corpus has readable files with all transfer syntaxes and is reproducible"""
+        spec = corpus.CorpusSpec(slices=len(corpus.SLICE_TRANSFER_SYNTAXES), slice_size=16, multiframes=1, multiframe_size_mb=1)
+        with tempfile.TemporaryDirectory() as first_directory, tempfile.TemporaryDirectory() as second_directory:
+            files = corpus.generate_corpus(first_directory, spec)
+            other_files = corpus.generate_corpus(second_directory, spec)
+
+            self.assertEqual(len(files), len(corpus.SLICE_TRANSFER_SYNTAXES) + 1)
+            transfer_syntaxes = {dcmread(file).file_meta.TransferSyntaxUID for file in files}
+            self.assertEqual(transfer_syntaxes, set(corpus.SLICE_TRANSFER_SYNTAXES))
+            self.assertEqual(dcmread(files[-1]).NumberOfFrames, 2)
+            for file, other_file in zip(files, other_files):
+                self.assertEqual(Path(file).read_bytes(), Path(other_file).read_bytes())
@@ -0,0 +1,232 @@
+""" Test fill_dcm.dicom_io unit tests
+"""
+
+import errno
+import os
+import tempfile
+import unittest
+from copy import deepcopy
+from pathlib import Path
+from unittest.mock import patch
+
+from pydicom import Dataset, dcmread, examples
+from pydicom.tag import Tag
+from pydicom.uid import DeflatedExplicitVRLittleEndian, ImplicitVRLittleEndian
+
+from fill_dcm import dicom_io, edit_plan, parse_argument
+
+
+class TestDicomIO(unittest.TestCase):
+    """Test fill_dcm.dicom_io"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+        self.source = self.directory / "ct.dcm"
+        examples.ct.save_as(self.source)
+        dicom_io._clone_unsupported_devices.clear()
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def entries(self, tags_to_replace):
+        """Entries of the plan replacing the given tags"""
+        return edit_plan.compile_plan(parse_argument.InputTags({}, tags_to_replace)).entries
+
+    def test_read_header(self):
+        """read_header() shall stop before the pixel data and return their offset"""
+        dataset, pixel_data_offset = dicom_io.read_header(self.source)
+
+        self.assertNotIn("PixelData", dataset)
+        self.assertEqual(dataset.PatientID, examples.ct.PatientID)
+        with open(self.source, "rb") as source:
+            source.seek(pixel_data_offset)
+            self.assertEqual(source.read(4), b"\xe0\x7f\x10\x00")
+
+    def test_read_header_memory_map(self):
+        """read_header() shall parse the header from a memory-mapped view as from the file"""
+        dataset, pixel_data_offset = dicom_io.read_header(self.source, memory_map=True)
+
+        self.assertNotIn("PixelData", dataset)
+        self.assertEqual(dataset.PatientID, examples.ct.PatientID)
+        self.assertEqual(pixel_data_offset, dicom_io.read_header(self.source)[1])
+
+    def test_read_dataset_memory_map(self):
+        """The dataset read from a memory-mapped view shall stay usable once the mapping is closed"""
+        dataset = dicom_io.read_dataset(self.source, memory_map=True)
+
+        self.assertEqual(dataset.PixelData, examples.ct.PixelData)
+        self.assertEqual(dataset.PatientID, examples.ct.PatientID)
+
+    def test_read_tags(self):
+        """read_tags() shall only read the requested tags and the character set, and stop after the highest one"""
+        dataset = dicom_io.read_tags(self.source, [Tag("PatientID"), Tag("StudyDate")])
+
+        self.assertEqual(set(dataset.keys()), {Tag("SpecificCharacterSet"), Tag("StudyDate"), Tag("PatientID")})
+        self.assertEqual(dataset.PatientID, examples.ct.PatientID)
+
+    def test_open_source_empty_file(self):
+        """An empty file can't be mapped: it shall be read with a file object"""
+        empty = self.directory / "empty.dcm"
+        empty.touch()
+        with dicom_io.open_source(empty, memory_map=True) as source:
+            self.assertEqual(source.read(), b"")
+
+    def test_read_header_deflated(self):
+        """read_header() shall not return an offset for a deflated dataset"""
+        deflated = deepcopy(examples.ct)
+        deflated.file_meta.TransferSyntaxUID = DeflatedExplicitVRLittleEndian
+        deflated.save_as(self.source)
+
+        _, pixel_data_offset = dicom_io.read_header(self.source)
+        self.assertIsNone(pixel_data_offset)
+
+    def test_can_passthrough(self):
+        """Only tags before the pixel data can be modified with a passthrough"""
+        self.assertTrue(dicom_io.can_passthrough(100, ["PatientID", 0x00080020]))
+        self.assertFalse(dicom_io.can_passthrough(100, ["PatientID", 0xFFFCFFFC]))
+        self.assertFalse(dicom_io.can_passthrough(None, ["PatientID"]))
+
+    def test_write_header_and_passthrough(self):
+        """The output has the modified header and the pixel data of the source"""
+        output = self.directory / "output.dcm"
+        dataset, pixel_data_offset = dicom_io.read_header(self.source)
+        dataset.PatientID = "FILLDCM"
+
+        dicom_io.write_header_and_passthrough(dataset, self.source, pixel_data_offset, output)
+
+        written = dcmread(output)
+        self.assertEqual(written.PatientID, "FILLDCM")
+        self.assertEqual(written.PixelData, examples.ct.PixelData)
+        self.assertEqual(written.file_meta.TransferSyntaxUID, examples.ct.file_meta.TransferSyntaxUID)
+
+    def test_write_header_and_passthrough_in_place(self):
+        """The source is replaced when it is also the output, without temporary file left"""
+        dataset, pixel_data_offset = dicom_io.read_header(self.source)
+        dataset.PatientName = "Hampton^Fredrick"
+
+        dicom_io.write_header_and_passthrough(dataset, self.source, pixel_data_offset, self.source)
+
+        written = dcmread(self.source)
+        self.assertEqual(written.PatientName, "Hampton^Fredrick")
+        self.assertEqual(written.PixelData, examples.ct.PixelData)
+        self.assertEqual(os.listdir(self.directory), ["ct.dcm"])
+
+    def test_copy_file_range_without_kernel_copy(self):
+        """copy_file_range() shall fall back on a copy in user space"""
+        output = self.directory / "copy.bin"
+        with (
+            patch("os.copy_file_range", side_effect=OSError("not supported")),
+            patch("os.sendfile", side_effect=OSError("not supported")),
+            open(self.source, "rb") as source,
+            open(output, "wb") as destination,
+        ):
+            dicom_io.copy_file_range(source.fileno(), destination.fileno(), 128, 1000)
+
+        self.assertEqual(output.read_bytes(), self.source.read_bytes()[128:1128])
+
+    def test_copy_file_range_memory_map_unaligned(self):
+        """Without kernel copy, copy_file_range() shall write memoryviews of a mapping starting before an unaligned offset"""
+        output = self.directory / "copy.bin"
+        offset = dicom_io.mmap.ALLOCATIONGRANULARITY + 3
+        with (
+            patch("os.copy_file_range", side_effect=OSError("not supported")),
+            patch("os.sendfile", side_effect=OSError("not supported")),
+            patch("os.pread") as pread,
+            open(self.source, "rb") as source,
+            open(output, "wb") as destination,
+        ):
+            dicom_io.copy_file_range(source.fileno(), destination.fileno(), offset, 5000)
+
+        pread.assert_not_called()
+        self.assertEqual(output.read_bytes(), self.source.read_bytes()[offset : offset + 5000])
+
+    def test_copy_file_range_without_memory_map(self):
+        """copy_file_range() shall read the source in chunks if it can't be mapped"""
+        output = self.directory / "copy.bin"
+        with (
+            patch("os.copy_file_range", side_effect=OSError("not supported")),
+            patch("os.sendfile", side_effect=OSError("not supported")),
+            patch.object(dicom_io, "_map_file", return_value=None),
+            open(self.source, "rb") as source,
+            open(output, "wb") as destination,
+        ):
+            dicom_io.copy_file_range(source.fileno(), destination.fileno(), 128, 1000)
+
+        self.assertEqual(output.read_bytes(), self.source.read_bytes()[128:1128])
+
+    def test_plan_patches_same_length(self):
+        """A value with the length of the current value is patched at the offset of the current value"""
+        dataset, _ = dicom_io.read_header(self.source)
+        patches = dicom_io.plan_patches(dataset, self.entries({"PatientID": "ABCD"}))
+
+        self.assertEqual(len(patches), 1)
+        with open(self.source, "rb") as source:
+            source.seek(patches[0].offset)
+            self.assertEqual(source.read(4), examples.ct.PatientID.encode())
+        self.assertEqual(patches[0].data, b"ABCD")
+
+    def test_plan_patches_padded(self):
+        """A shorter value is padded with spaces if its VR allows it"""
+        dataset, _ = dicom_io.read_header(self.source)
+        patches = dicom_io.plan_patches(dataset, self.entries({"PatientName": "Doe^John"}))
+
+        self.assertEqual(len(patches[0].data), dataset.get_item("PatientName").length)
+        self.assertTrue(patches[0].data.startswith(b"Doe^John "))
+
+    def test_plan_patches_not_possible(self):
+        """No patch if a value is longer, if the VR can't be padded or if the element is missing"""
+        dataset, _ = dicom_io.read_header(self.source)
+        self.assertIsNone(dicom_io.plan_patches(dataset, self.entries({"PatientID": "ABCDEFGH"})))
+        self.assertIsNone(dicom_io.plan_patches(dataset, self.entries({"StudyInstanceUID": "1.2.3"})))
+        self.assertIsNone(dicom_io.plan_patches(dataset, self.entries({"PatientID": "ABCD", "PatientSize": "1.80"})))
+
+    def test_apply_patches_implicit_vr(self):
+        """Patches are applied in a file with an implicit VR transfer syntax"""
+        implicit = deepcopy(examples.ct)
+        implicit.file_meta.TransferSyntaxUID = ImplicitVRLittleEndian
+        implicit.save_as(self.source)
+
+        dataset, _ = dicom_io.read_header(self.source)
+        dicom_io.apply_patches(self.source, dicom_io.plan_patches(dataset, self.entries({"PatientID": "ABCD", "PatientName": "Doe^John"})))
+
+        patched = dcmread(self.source)
+        self.assertEqual(patched.PatientID, "ABCD")
+        self.assertEqual(patched.PatientName, "Doe^John")
+        self.assertEqual(patched.PixelData, examples.ct.PixelData)
+
+    def test_is_sequence_implicit_vr(self):
+        """Sequences of implicit VR files are recognized without parsing their raw elements"""
+        implicit = deepcopy(examples.ct)
+        implicit.file_meta.TransferSyntaxUID = ImplicitVRLittleEndian
+        implicit.ReferencedStudySequence = [Dataset()]
+        implicit.ReferencedStudySequence[0].ReferencedSOPInstanceUID = "1.2.3"
+        implicit.save_as(self.source)
+
+        dataset, _ = dicom_io.read_header(self.source)
+
+        self.assertIsNone(dataset.get_item("PatientID").VR)
+        self.assertTrue(dicom_io.is_sequence(dataset, Tag("ReferencedStudySequence")))
+        self.assertFalse(dicom_io.is_sequence(dataset, Tag("PatientID")))
+
+    def test_copy_file(self):
+        """copy_file() shall copy the whole file, cloned or not"""
+        output = self.directory / "copy.dcm"
+        dicom_io.copy_file(self.source, output)
+        self.assertEqual(output.read_bytes(), self.source.read_bytes())
+
+    def test_copy_file_clone_not_supported(self):
+        """If cloning isn't supported, the file is copied and cloning isn't tried again on the same device"""
+        output = self.directory / "copy.dcm"
+        with patch("fcntl.ioctl", side_effect=OSError(errno.EOPNOTSUPP, "not supported")) as ioctl:
+            self.assertFalse(dicom_io.copy_file(self.source, output))
+            self.assertFalse(dicom_io.copy_file(self.source, output))
+            self.assertEqual(ioctl.call_count, 1)
+        self.assertEqual(output.read_bytes(), self.source.read_bytes())
+
+    def test_copy_file_clone(self):
+        """If the ioctl succeeds, the file is reported as cloned"""
+        output = self.directory / "copy.dcm"
+        with patch("fcntl.ioctl") as ioctl:
+            self.assertTrue(dicom_io.copy_file(self.source, output))
+            self.assertEqual(ioctl.call_args.args[1], dicom_io.FICLONE)
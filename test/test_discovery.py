@@ -0,0 +1,79 @@
+""" Test fill_dcm.discovery unit tests
+"""
+
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fill_dcm import discovery
+
+
+class TestDiscovery(unittest.TestCase):
+    """Test fill_dcm.discovery"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+        for relative_path in ["a.dcm", "DICOMDIR", "study/b.dcm", "study/notes.txt", "study/series/c.dcm", "cache/d.dcm"]:
+            path = self.directory / relative_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"")
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def relative_paths(self, paths):
+        """Paths relative to the temporary directory, sorted"""
+        return sorted(os.path.relpath(path, self.directory) for path in paths)
+
+    def test_walk(self):
+        """Directories are walked recursively"""
+        self.assertEqual(
+            self.relative_paths(discovery.walk(str(self.directory))),
+            ["DICOMDIR", "a.dcm", "cache/d.dcm", "study/b.dcm", "study/notes.txt", "study/series/c.dcm"],
+        )
+
+    def test_walk_patterns(self):
+        """Include patterns select files, exclude patterns skip files and whole directories, by name or by relative path"""
+        path_filter = discovery.PathFilter(include=["*.dcm", "DICOMDIR"], exclude=["cache", "study/series/*"])
+        self.assertEqual(self.relative_paths(discovery.walk(str(self.directory), path_filter)), ["DICOMDIR", "a.dcm", "study/b.dcm"])
+
+    def test_walk_skips_outputs(self):
+        """Temporary files of FillDCM are always skipped, its copies only if asked"""
+        for name in ["a_modified.dcm", "study/b_modified.dcm", ".a.dcm.x1y2.tmp", "study_modified.tar.gz"]:
+            (self.directory / name).write_bytes(b"")
+
+        self.assertEqual(
+            self.relative_paths(discovery.walk(str(self.directory), discovery.PathFilter(skip_outputs=True))),
+            ["DICOMDIR", "a.dcm", "cache/d.dcm", "study/b.dcm", "study/notes.txt", "study/series/c.dcm"],
+        )
+        self.assertEqual(len(list(discovery.walk(str(self.directory)))), 9)
+
+    def test_discover(self):
+        """Files given explicitly are kept whatever the patterns, paths listed in a file are read and directories walked"""
+        files_from = self.directory / "files.txt"
+        files_from.write_text(f"{self.directory / 'study'}\n\n{self.directory / 'DICOMDIR'}\n")
+
+        files = discovery.discover([str(self.directory / "study/notes.txt")], str(files_from), include=["*.dcm"])
+
+        self.assertEqual(self.relative_paths(files), ["DICOMDIR", "study/b.dcm", "study/notes.txt", "study/series/c.dcm"])
+
+    def test_read_paths_from_standard_input(self):
+        """Paths are read lazily from the standard input"""
+        with patch("sys.stdin", io.StringIO("a.dcm\r\nb.dcm\n")):
+            paths = discovery.read_paths("-")
+            self.assertEqual(next(paths), "a.dcm")
+            self.assertEqual(list(paths), ["b.dcm"])
+
+    def test_timed_paths(self):
+        """The time spent to produce the paths is accumulated"""
+        paths = discovery.TimedPaths(discovery.walk(str(self.directory)))
+        self.assertEqual(len(list(paths)), 6)
+        self.assertGreater(paths.seconds, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+""" Test fill_dcm.durability unit tests
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fill_dcm import durability
+
+
+class TestAtomicOutput(unittest.TestCase):
+    """Test durability.atomic_output()"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+        self.output = self.directory / "output.dcm"
+        self.output.write_bytes(b"original")
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_replace(self):
+        """The output is replaced once the temporary file is written, with the permissions of the mode file"""
+        mode_file = self.directory / "input.dcm"
+        mode_file.write_bytes(b"")
+        os.chmod(mode_file, 0o640)
+
+        with durability.atomic_output(self.output, mode_file) as target:
+            Path(target).write_bytes(b"adjusted")
+            self.assertEqual(self.output.read_bytes(), b"original")
+
+        self.assertEqual(self.output.read_bytes(), b"adjusted")
+        self.assertEqual(os.stat(self.output).st_mode & 0o777, 0o640)
+        self.assertEqual(sorted(os.listdir(self.directory)), ["input.dcm", "output.dcm"])
+
+    def test_failure(self):
+        """A failed write leaves the output untouched and no temporary file"""
+        with self.assertRaises(RuntimeError):
+            with durability.atomic_output(self.output) as target:
+                Path(target).write_bytes(b"trunc")
+                raise RuntimeError("crash")
+
+        self.assertEqual(self.output.read_bytes(), b"original")
+        self.assertEqual(os.listdir(self.directory), ["output.dcm"])
+
+
+class TestDurabilityPolicy(unittest.TestCase):
+    """Test durability.DurabilityPolicy"""
+
+    def test_no_sync(self):
+        """Nothing is synced with the 'none' policy"""
+        policy = durability.DurabilityPolicy(durability.NO_SYNC, sync_files=1)
+        with patch("os.sync") as sync, patch.object(durability, "fsync_path") as fsync_path:
+            policy.written("/data/a.dcm")
+            policy.flush()
+        sync.assert_not_called()
+        fsync_path.assert_not_called()
+        self.assertEqual(policy.syncs, 0)
+
+    def test_batch_by_files(self):
+        """With the 'batch' policy, the files of each batch and their directories are synced, the last batch when flushed"""
+        policy = durability.DurabilityPolicy(durability.BATCH_SYNC, sync_files=3, sync_seconds=3600)
+        with patch("os.sync") as sync, patch.object(durability, "fsync_path") as fsync_path:
+            for index in range(7):
+                policy.written(f"/data/{index % 2}/{index}.dcm")
+            self.assertEqual(fsync_path.call_count, 2 * (3 + 2))
+            policy.flush()
+        sync.assert_not_called()
+        self.assertEqual([call.args[0] for call in fsync_path.call_args_list[-2:]], ["/data/0/6.dcm", "/data/0"])
+        self.assertEqual(policy.syncs, 3)
+
+    def test_batch_by_seconds(self):
+        """A batch also ends when its time is elapsed"""
+        policy = durability.DurabilityPolicy(durability.BATCH_SYNC, sync_files=1000, sync_seconds=5)
+        with patch.object(durability, "fsync_path") as fsync_path, patch("time.monotonic", side_effect=[1, 6, 6]):
+            policy._last_sync = 0
+            policy.written("/data/a.dcm")
+            policy.written("/data/b.dcm")
+        self.assertEqual(policy.syncs, 1)
+        self.assertEqual(fsync_path.call_count, 3)
+
+    def test_batch_renames(self):
+        """With the 'batch' policy, temporary files are synced, then renamed, then their directory is synced, then they are durable"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output = Path(directory.name) / "a.dcm"
+        with durability.atomic_output(str(output), deferred=True) as target:
+            Path(target).write_bytes(b"adjusted")
+        self.assertFalse(output.exists())
+
+        events = []
+        policy = durability.DurabilityPolicy(durability.BATCH_SYNC)
+        with patch.object(durability, "fsync_path", side_effect=lambda path: events.append((path, output.exists()))):
+            policy.written(str(output), target, lambda: events.append(("durable", output.exists())))
+            policy.flush()
+
+        self.assertEqual(events, [(target, False), (directory.name, True), ("durable", True)])
+        self.assertEqual(output.read_bytes(), b"adjusted")
+
+    def test_directory(self):
+        """With the 'directory' policy, each directory of the batch is synced once, files aren't"""
+        policy = durability.DurabilityPolicy(durability.DIRECTORY_SYNC)
+        with patch("os.sync") as sync, patch.object(durability, "fsync_path") as fsync_path:
+            for file in ("/data/a/1.dcm", "/data/a/2.dcm", "/data/b/1.dcm"):
+                policy.written(file)
+            policy.flush()
+        sync.assert_not_called()
+        self.assertEqual(sorted(call.args[0] for call in fsync_path.call_args_list), ["/data/a", "/data/b"])
+
+    def test_unknown_policy(self):
+        """Only the known policies are accepted"""
+        with self.assertRaises(ValueError):
+            durability.DurabilityPolicy("always")
+
+
+if __name__ == "__main__":
+    unittest.main()
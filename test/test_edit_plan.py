@@ -0,0 +1,72 @@
+""" Test fill_dcm.edit_plan unit tests
+"""
+
+import unittest
+
+from pydicom.tag import Tag
+
+from fill_dcm import edit_plan, parse_argument
+
+
+class TestEditPlan(unittest.TestCase):
+    """Test fill_dcm.edit_plan"""
+
+    def test_compile_plan(self):
+        """Tags are resolved once and sorted, with their VR and operation"""
+        plan = edit_plan.compile_plan(
+            parse_argument.InputTags({"StudyDate": "20240101", "PatientName": None}, {"Rows": 512, "InstitutionName": "FillDCM"})
+        )
+
+        self.assertEqual(plan.tags, (Tag("StudyDate"), Tag("InstitutionName"), Tag("PatientName"), Tag("Rows")))
+        self.assertEqual([entry.vr for entry in plan.entries], ["DA", "LO", "PN", "US"])
+        self.assertEqual(plan.entries[0].operation, edit_plan.Operation.FILL)
+        self.assertEqual(plan.entries[1].operation, edit_plan.Operation.REPLACE)
+        self.assertEqual(plan.entries[1].keyword, "InstitutionName")
+        self.assertTrue(plan.has_generated_values)
+
+    def test_pre_encoded_values(self):
+        """Values are encoded once and padded to an even length"""
+        plan = edit_plan.compile_plan(parse_argument.InputTags({}, {"Rows": 512, "InstitutionName": "FillDCM", "PatientName": "Élise"}))
+
+        self.assertEqual(plan.entries[0].encoded, b"FillDCM ")
+        # Depends on the character set of each file
+        self.assertIsNone(plan.entries[1].encoded)
+        self.assertEqual(plan.entries[2].encoded, b"\x00\x02")
+
+    def test_validated(self):
+        """A plan is validated if all its values match the rules of their VR, and stays validated once resolved"""
+        plan = edit_plan.compile_plan(parse_argument.InputTags({"PatientID": None}, {"StudyDate": "20240101", "Rows": 512}))
+        self.assertTrue(plan.validated)
+        self.assertTrue(plan.resolve(lambda entry: "ABCD").validated)
+
+        self.assertFalse(edit_plan.compile_plan(parse_argument.InputTags({}, {"StudyDate": "2024-01-01"})).validated)
+        # Values of VRs without rule can't be validated
+        self.assertFalse(edit_plan.compile_plan(parse_argument.InputTags({}, {"PixelData": b"\x00\x00"})).validated)
+
+    def test_plan_is_immutable(self):
+        """A plan and its entries can't be modified"""
+        plan = edit_plan.compile_plan(parse_argument.InputTags({}, {"PatientID": "ABCD"}))
+
+        with self.assertRaises(AttributeError):
+            plan.entries[0].value = "EFGH"
+        with self.assertRaises(AttributeError):
+            plan.other = None
+
+    def test_resolve(self):
+        """Entries without value get the resolved value, other entries are kept"""
+        plan = edit_plan.compile_plan(parse_argument.InputTags({"PatientID": None}, {"InstitutionName": "FillDCM"}))
+
+        resolved = plan.resolve(lambda entry: f"ID-{entry.keyword}")
+
+        self.assertFalse(resolved.has_generated_values)
+        self.assertEqual(resolved.entries[0], plan.entries[0])
+        self.assertEqual(resolved.entries[1].value, "ID-PatientID")
+        self.assertEqual(resolved.entries[1].encoded, b"ID-PatientID")
+        # The index by tag is built once with each plan
+        self.assertIs(resolved.by_tag, resolved.by_tag)
+        self.assertEqual(resolved.by_tag[Tag("PatientID")], resolved.entries[1])
+        self.assertIsNone(plan.by_tag[Tag("PatientID")].value)
+
+    def test_invalid_tag(self):
+        """Compilation shall throw on a tag that doesn't exist"""
+        self.assertRaises(parse_argument.InvalidArgument, edit_plan.compile_plan, parse_argument.InputTags({"NotATag": None}, {}))
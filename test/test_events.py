@@ -0,0 +1,67 @@
+""" Test fill_dcm.events unit tests
+"""
+
+import json
+import logging
+import unittest
+
+from fill_dcm import events, fill_dcm, stats
+
+
+class TestEvents(unittest.TestCase):
+    """Test fill_dcm.events"""
+
+    def result(self, file="/data/ct.dcm"):
+        """Result of a file with two changes"""
+        return fill_dcm.FileResult(file, fill_dcm.FileStatus.REWRITTEN, changes=[("add", "PatientWeight", "72"), ("update", "PatientID", "ABCD")])
+
+    def test_json_formatter(self):
+        """A record is formatted as a JSON line with its fields"""
+        record = logging.LogRecord("root", logging.INFO, __file__, 1, "Add %s:%s", ("PatientID", "ABCD"), None)
+        record.fields = {"event": "add", "tag": "PatientID"}
+
+        line = json.loads(events.JSONFormatter().format(record))
+
+        self.assertEqual(line["message"], "Add PatientID:ABCD")
+        self.assertEqual(line["level"], "INFO")
+        self.assertEqual(line["event"], "add")
+        self.assertEqual(line["tag"], "PatientID")
+
+    def test_sampled(self):
+        """The sampling of a file only depends on its path and follows the rate"""
+        files = [f"/data/{index}.dcm" for index in range(10000)]
+        self.assertTrue(all(events.sampled(file, 1.0) for file in files))
+        sampled = [file for file in files if events.sampled(file, 0.1)]
+        self.assertAlmostEqual(len(sampled) / len(files), 0.1, delta=0.02)
+        self.assertEqual(sampled, [file for file in files if events.sampled(file, 0.1)])
+
+    def test_tag_detail(self):
+        """With the tag detail, one event is logged per change"""
+        with self.assertLogs(level=logging.INFO) as logs:
+            events.EventLog(events.TAG_DETAIL).file_done(self.result())
+        self.assertEqual(logs.output, ["INFO:root:Add PatientWeight:72", "INFO:root:Update PatientID:ABCD"])
+        self.assertEqual(logs.records[1].fields, {"event": "update", "file": "/data/ct.dcm", "tag": "PatientID", "value": "ABCD"})
+
+    def test_file_detail(self):
+        """With the file detail, one event is logged per file"""
+        with self.assertLogs(level=logging.INFO) as logs:
+            events.EventLog(events.FILE_DETAIL).file_done(self.result())
+        self.assertEqual(logs.output, ["INFO:root:/data/ct.dcm: rewritten, 2 change(s)"])
+
+    def test_run_detail(self):
+        """With the run detail, only the report of the run is logged, with the changes aggregated per tag"""
+        statistics = stats.RunStatistics()
+        error = fill_dcm.FileResult("/data/invalid.dcm", fill_dcm.FileStatus.READ_ERROR, "Invalid file", error_type="InvalidDicomError")
+        event_log = events.EventLog(events.RUN_DETAIL)
+        with self.assertLogs(level=logging.INFO) as logs:
+            for result in (self.result("/data/1.dcm"), self.result("/data/2.dcm"), error):
+                statistics.add(result)
+                event_log.file_done(result)
+            event_log.report(statistics)
+
+        self.assertEqual(logs.output, ["INFO:root:Changes: PatientWeight add=2, PatientID update=2. Errors: InvalidDicomError=1"])
+        self.assertEqual(logs.records[0].fields["changes"], {"PatientWeight": {"add": 2}, "PatientID": {"update": 2}})
+
+
+if __name__ == "__main__":
+    unittest.main()
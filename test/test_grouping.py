@@ -0,0 +1,87 @@
+""" Test fill_dcm.grouping unit tests
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from pydicom import examples
+
+from fill_dcm import edit_plan, grouping, parse_argument
+
+
+class TestGrouping(unittest.TestCase):
+    """Test fill_dcm.grouping"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+        self.plan = edit_plan.compile_plan(parse_argument.InputTags({"InstitutionAddress": None}, {"PatientID": "ABCD"}))
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+        grouping.clear_group_values()
+
+    def create_file(self, name, study):
+        """Write a DICOM file of a study and return its path"""
+        dataset = examples.ct
+        if study is None:
+            del dataset.StudyInstanceUID
+        else:
+            dataset.StudyInstanceUID = study
+        file = self.directory / name
+        dataset.save_as(file)
+        return str(file)
+
+    def test_file_group(self):
+        """The group of a file is the value of the tag of the group, None if it is missing or the file invalid"""
+        invalid_file = self.directory / "invalid.dcm"
+        invalid_file.write_bytes(b"not a DICOM file")
+
+        self.assertEqual(grouping.file_group(self.create_file("a.dcm", "1.2.3"), "study"), "1.2.3")
+        self.assertEqual(grouping.file_group(self.create_file("a.dcm", "1.2.3"), "patient"), examples.ct.PatientID)
+        self.assertIsNone(grouping.file_group(self.create_file("b.dcm", None), "study"))
+        self.assertIsNone(grouping.file_group(str(invalid_file), "study"))
+
+    def test_group_files(self):
+        """Files are bucketed by group, in the order their group was first found"""
+        files = [self.create_file(f"{index}.dcm", study) for index, study in enumerate(("1.2.3", "1.2.4", "1.2.3", None))]
+
+        groups = grouping.group_files(files, "study")
+
+        self.assertEqual(groups, {"1.2.3": [files[0], files[2]], "1.2.4": [files[1]], None: [files[3]]})
+
+    def test_group_values(self):
+        """Values are generated once per group, explicit values are kept"""
+        values = grouping.GroupValues("study")
+
+        first = values.plan("1.2.3", self.plan)
+        second = values.plan("1.2.4", self.plan)
+
+        self.assertIs(values.plan("1.2.3", self.plan), first)
+        self.assertNotEqual(first.by_tag[0x00080081].value, second.by_tag[0x00080081].value)
+        self.assertEqual(first.by_tag[0x00100020].value, "ABCD")
+        self.assertIsNot(values.plan(None, self.plan), values.plan(None, self.plan))
+
+    def test_group_values_cache_size(self):
+        """The least recently used groups are evicted"""
+        values = grouping.GroupValues("study", cache_size=1)
+
+        first = values.plan("1.2.3", self.plan)
+        values.plan("1.2.4", self.plan)
+
+        self.assertIsNot(values.plan("1.2.3", self.plan), first)
+
+    def test_grouped_plans(self):
+        """Each group comes with its plan, files without group come one by one"""
+        files = [self.create_file(f"{index}.dcm", study) for index, study in enumerate(("1.2.3", None, "1.2.3", None))]
+
+        groups = list(grouping.grouped_plans(files, self.plan, "study"))
+
+        self.assertEqual([group for _, group in groups], [[files[0], files[2]], [files[1]], [files[3]]])
+        self.assertIs(groups[0][0], grouping.get_group_values("study").plan("1.2.3", self.plan))
+        self.assertTrue(all(entry.value is not None for plan, _ in groups for entry in plan.entries))
+
+
+if __name__ == "__main__":
+    unittest.main()
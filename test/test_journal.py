@@ -0,0 +1,90 @@
+""" Test fill_dcm.journal unit tests
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from fill_dcm import journal
+
+
+class TestJournal(unittest.TestCase):
+    """Test fill_dcm.journal"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.temporary_directory.name) / "journal.jsonl"
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_batched_appends(self):
+        """Entries are appended by batches, the last one when the journal is closed"""
+        run = journal.Journal(str(self.path), "hash", batch_entries=2, batch_seconds=3600)
+        for index in range(3):
+            run.record(f"/data/{index}.dcm", "rewritten")
+        self.assertEqual(len(self.path.read_text().splitlines()), 3)
+        run.close()
+        self.assertEqual(len(self.path.read_text().splitlines()), 4)
+
+    def test_resume(self):
+        """A resumed journal replays its entries, ignores a cut line and appends the next entries on their own lines"""
+        run = journal.Journal(str(self.path), "hash")
+        run.record("/data/0.dcm", "patched")
+        run.record("/data/1.dcm", "read_error", "Invalid file")
+        run.close()
+        with open(self.path, "a") as journal_file:
+            journal_file.write('{"file": "/data/2.dcm", "sta')
+
+        run = journal.Journal(str(self.path), "hash", resume=True)
+        self.assertEqual(run.replayed, {"/data/0.dcm": ("patched", None), "/data/1.dcm": ("read_error", "Invalid file")})
+        self.assertTrue(run.completed("/data/1.dcm"))
+        self.assertFalse(run.completed("/data/2.dcm"))
+        run.record("/data/2.dcm", "rewritten")
+        run.close()
+
+        self.assertIn("/data/2.dcm", journal.replay(str(self.path), "hash"))
+
+    def test_resume_values(self):
+        """Values of the run are written in the header of a new journal and read back when it is resumed"""
+        journal.Journal(str(self.path), "hash", values={"InstitutionName": "ABCD"}).close()
+
+        run = journal.Journal(str(self.path), "hash", resume=True, values={"InstitutionName": "EFGH"})
+        run.close()
+
+        self.assertTrue(run.resumed)
+        self.assertEqual(run.values, {"InstitutionName": "ABCD"})
+        self.assertEqual(journal.read_header(str(self.path)), {"plan_hash": "hash", "values": {"InstitutionName": "ABCD"}})
+
+    def test_resume_groups(self):
+        """Values generated for the groups are appended with the entries and read back when the journal is resumed"""
+        run = journal.Journal(str(self.path), "hash")
+        run.record_group("1.2.3", {"InstitutionName": "ABCD"})
+        run.record("/data/0.dcm", "rewritten")
+        run.close()
+
+        run = journal.Journal(str(self.path), "hash", resume=True)
+        run.close()
+
+        self.assertEqual(run.groups, {"1.2.3": {"InstitutionName": "ABCD"}})
+        self.assertEqual(run.replayed, {"/data/0.dcm": ("rewritten", None)})
+
+    def test_resume_other_tags(self):
+        """A journal written with other tags can't be resumed"""
+        journal.Journal(str(self.path), "hash").close()
+        with self.assertRaises(journal.JournalMismatch):
+            journal.Journal(str(self.path), "other hash", resume=True)
+
+    def test_new_run_replaces_journal(self):
+        """Without resume, the journal of a previous run is replaced"""
+        run = journal.Journal(str(self.path), "hash")
+        run.record("/data/0.dcm", "patched")
+        run.close()
+
+        run = journal.Journal(str(self.path), "hash")
+        run.close()
+        self.assertEqual(journal.replay(str(self.path), "hash"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+""" Test fill_dcm.manifest unit tests
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from fill_dcm import manifest, parse_argument
+
+
+class TestManifest(unittest.TestCase):
+    """Test fill_dcm.manifest.Manifest"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+        self.path = str(self.directory / "manifest.db")
+        self.file = self.directory / "ct.dcm"
+        self.file.write_bytes(b"DICM")
+        self.output_file = self.directory / "ct_modified.dcm"
+        self.output_file.write_bytes(b"DICM")
+        self.hash = manifest.plan_hash(parse_argument.InputTags({}, {"PatientID": "ABCD"}))
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_up_to_date(self):
+        """A recorded file is up to date for the same plan until it is modified"""
+        store = manifest.Manifest(self.path, self.hash)
+        self.assertFalse(store.up_to_date(self.file, self.output_file))
+        store.record(self.file, self.output_file)
+        store.close()
+
+        store = manifest.Manifest(self.path, self.hash)
+        self.assertTrue(store.up_to_date(self.file, self.output_file))
+        self.assertFalse(manifest.Manifest(self.path, "another plan").up_to_date(self.file, self.output_file))
+
+        status = os.stat(self.file)
+        os.utime(self.file, ns=(status.st_atime_ns, status.st_mtime_ns + 1_000_000_000))
+        self.assertFalse(store.up_to_date(self.file, self.output_file))
+        store.close()
+
+    def test_output_modified(self):
+        """A file whose output has been modified or deleted since it was recorded isn't up to date"""
+        store = manifest.Manifest(self.path, self.hash)
+        store.record(self.file, self.output_file)
+        store.commit()
+        self.assertTrue(store.up_to_date(self.file, self.output_file))
+
+        self.output_file.write_bytes(b"DICM and more")
+        self.assertFalse(store.up_to_date(self.file, self.output_file))
+        self.output_file.unlink()
+        self.assertFalse(store.up_to_date(self.file, self.output_file))
+        store.close()
+
+    def test_without_output(self):
+        """A file left as is is up to date as long as no output appears"""
+        store = manifest.Manifest(self.path, self.hash)
+        self.output_file.unlink()
+        store.record(self.file)
+        store.commit()
+        self.assertTrue(store.up_to_date(self.file, self.output_file))
+        self.output_file.write_bytes(b"DICM")
+        self.assertFalse(store.up_to_date(self.file, self.output_file))
+        store.close()
+
+    def test_plan_hash_options(self):
+        """Options changing the output change the hash, the other options don't"""
+        input_tags = parse_argument.InputTags({}, {"PatientID": "ABCD"})
+
+        self.assertEqual(manifest.plan_hash(input_tags, parse_argument.Options(jobs=4, memory_map=True)), self.hash)
+        hashes = {
+            manifest.plan_hash(input_tags, parse_argument.Options(**options))
+            for options in (
+                {"overwrite_output_file": True},
+                {"recursive": True},
+                {"mapping_store": "mapping.db"},
+                {"per_file_values": True},
+                {"group_by": "study"},
+                {"uid_root": "1.2.3"},
+                {"uid_root": "1.2.4"},
+            )
+        }
+        self.assertEqual(len(hashes), 7)
+        self.assertNotIn(self.hash, hashes)
+
+    def test_commit_by_batches(self):
+        """Recorded files are committed by batches, the last one when the manifest is closed"""
+        files = []
+        for index in range(5):
+            files.append(self.directory / f"{index}.dcm")
+            files[-1].write_bytes(b"DICM")
+        store = manifest.Manifest(self.path, self.hash, commit_rows=2)
+        for file in files:
+            store.record(file)
+
+        self.assertEqual(len(manifest.Manifest(self.path, self.hash)), 4)
+        store.close()
+        self.assertEqual(len(manifest.Manifest(self.path, self.hash)), 5)
+
+    def test_missing_file(self):
+        """A missing file is neither up to date nor recorded"""
+        store = manifest.Manifest(self.path, self.hash)
+        store.record(self.directory / "missing.dcm")
+        self.assertFalse(store.up_to_date(self.directory / "missing.dcm", self.directory / "missing.dcm"))
+        self.assertEqual(len(store), 0)
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
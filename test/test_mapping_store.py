@@ -0,0 +1,87 @@
+""" Test fill_dcm.mapping_store unit tests
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from pydicom import dcmread, examples
+
+from fill_dcm import fill_dcm, mapping_store, parse_argument
+
+
+class TestMappingStore(unittest.TestCase):
+    """Test fill_dcm.mapping_store"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+        self.database = str(self.directory / "mapping.db")
+
+    def tearDown(self):
+        mapping_store.close_stores()
+        self.temporary_directory.cleanup()
+
+    def test_lru_cache_eviction(self):
+        """The least recently used entry is evicted when the cache is full"""
+        cache = mapping_store.LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_same_original_same_value(self):
+        """An original value is mapped once, different original values get different generated values"""
+        store = mapping_store.MappingStore(self.database)
+        values = iter(["first", "second"])
+
+        self.assertEqual(store.get("PatientName", "Doe^John", lambda: next(values)), "first")
+        self.assertEqual(store.get("PatientName", "Doe^John", lambda: next(values)), "first")
+        self.assertEqual(store.get("PatientName", "Doe^Jane", lambda: next(values)), "second")
+        self.assertEqual(len(store), 2)
+        store.close()
+
+    def test_mapping_persistence(self):
+        """Mappings are kept across stores and their type is preserved"""
+        store = mapping_store.MappingStore(self.database, cache_size=1)
+        store.get("Rows", "512", lambda: 42)
+        store.close()
+
+        store = mapping_store.MappingStore(self.database)
+        self.assertEqual(store.get("Rows", "512", lambda: 0), 42)
+        store.close()
+
+    def test_concurrent_stores(self):
+        """If two stores generate a value for the same key, the first stored value wins"""
+        first_store = mapping_store.MappingStore(self.database)
+        second_store = mapping_store.MappingStore(self.database)
+
+        self.assertEqual(first_store.get("PatientID", "1", lambda: "A"), "A")
+        self.assertEqual(second_store._store(("PatientID", "1"), "B"), "A")
+        first_store.close()
+        second_store.close()
+
+    def test_adjust_dicom_files_with_mapping_store(self):
+        """Files with the same original value get the same generated value, in the same run and in the next runs"""
+        files = []
+        for index, patient_name in enumerate(["Doe^John", "Doe^Jane", "Doe^John"]):
+            dataset = examples.ct.copy()
+            dataset.PatientName = patient_name
+            file = self.directory / f"ct_{index}.dcm"
+            dataset.save_as(file)
+            files.append(str(file))
+        options = parse_argument.Options(jobs=1, mapping_store=self.database)
+
+        fill_dcm.adjust_dicom_files(files, parse_argument.InputTags({}, {"PatientName": None}), options)
+        names = [dcmread(fill_dcm.output_filepath(file)).PatientName for file in files]
+        fill_dcm.adjust_dicom_files(files, parse_argument.InputTags({}, {"PatientName": None}), options)
+
+        self.assertEqual(names[0], names[2])
+        self.assertNotEqual(names[0], names[1])
+        self.assertNotIn(str(names[0]), ["Doe^John", "Doe^Jane"])
+        self.assertEqual(names, [dcmread(fill_dcm.output_filepath(file)).PatientName for file in files])
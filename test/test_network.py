@@ -0,0 +1,84 @@
+""" Test fill_dcm.network unit tests
+"""
+
+import threading
+import unittest
+
+from pydicom import examples
+
+from fill_dcm import edit_plan, parse_argument
+
+try:
+    from pynetdicom import AE, StoragePresentationContexts, evt
+
+    from fill_dcm import network
+except ImportError:
+    network = None
+
+
+@unittest.skipIf(network is None, "pynetdicom isn't installed")
+class TestNetwork(unittest.TestCase):
+    """Test fill_dcm.network"""
+
+    def setUp(self):
+        # Stand-in of the destination SCP: it keeps the received datasets
+        self.received = []
+        self.lock = threading.Lock()
+        destination = AE(ae_title="DESTINATION")
+        destination.supported_contexts = StoragePresentationContexts
+        self.destination = destination.start_server(("127.0.0.1", 0), block=False, evt_handlers=[(evt.EVT_C_STORE, self.store)])
+        self.addCleanup(destination.shutdown)
+
+    def store(self, event):
+        """Keep a received dataset"""
+        with self.lock:
+            self.received.append(event.dataset)
+        return 0x0000
+
+    def start_forwarder(self, input_tags, options, associations=2):
+        """Start a forwarder to the destination and return its port"""
+        plan = edit_plan.compile_plan(input_tags)
+        forwarder = network.StoreForwarder(plan, options, self.destination.server_address, "DESTINATION", associations=associations)
+        self.addCleanup(forwarder.stop)
+        return forwarder.start(("127.0.0.1", 0))[1]
+
+    def send(self, port, datasets):
+        """Send datasets to the forwarder on one association and return the statuses"""
+        sender = AE(ae_title="MODALITY")
+        sender.requested_contexts = StoragePresentationContexts
+        association = sender.associate("127.0.0.1", port, ae_title=network.DEFAULT_AE_TITLE)
+        self.assertTrue(association.is_established)
+        statuses = [association.send_c_store(dataset).Status for dataset in datasets]
+        association.release()
+        return statuses
+
+    def test_forward(self):
+        """Received datasets are adjusted and forwarded"""
+        port = self.start_forwarder(parse_argument.InputTags({"PatientWeight": "72"}, {"InstitutionName": "FillDCM"}), parse_argument.Options())
+
+        self.assertEqual(self.send(port, [examples.ct, examples.mr]), [0x0000, 0x0000])
+
+        self.assertEqual(len(self.received), 2)
+        for dataset in self.received:
+            self.assertEqual(dataset.InstitutionName, "FillDCM")
+        self.assertEqual({dataset.SOPInstanceUID for dataset in self.received}, {examples.ct.SOPInstanceUID, examples.mr.SOPInstanceUID})
+
+    def test_concurrent_senders(self):
+        """Senders are handled concurrently and share the associations of the pool"""
+        port = self.start_forwarder(parse_argument.InputTags({}, {"InstitutionName": "FillDCM"}), parse_argument.Options(), associations=2)
+        senders = [threading.Thread(target=self.send, args=(port, [examples.ct] * 3)) for _ in range(4)]
+        for sender in senders:
+            sender.start()
+        for sender in senders:
+            sender.join()
+        self.assertEqual(len(self.received), 12)
+
+    def test_destination_unreachable(self):
+        """A dataset that can't be forwarded is refused"""
+        plan = edit_plan.compile_plan(parse_argument.InputTags({}, {"InstitutionName": "FillDCM"}))
+        self.destination.shutdown()
+        forwarder = network.StoreForwarder(plan, parse_argument.Options(), self.destination.server_address, "DESTINATION")
+        self.addCleanup(forwarder.stop)
+        port = forwarder.start(("127.0.0.1", 0))[1]
+
+        self.assertEqual(self.send(port, [examples.ct]), [network.STATUS_OUT_OF_RESOURCES])
@@ -77,6 +77,13 @@ class TestParseArgument(unittest.TestCase):
         parse_argument.verify_input_tags(parse_argument.InputTags({"PixelSpacing": None, "PatientName": "Raymond"}, {}))
         parse_argument.verify_input_tags(parse_argument.InputTags({}, {"PatientID": "42", "PatientName": "Raymond"}))
 
+    def test_verify_input_tags_invalid_value(self):
+        """parse_argument.verify_input_tags() shall throw if a value doesn't match the VR of its tag, unless values aren't checked"""
+        input_tags = parse_argument.InputTags({"StudyDate": "2024-01-01"}, {"PatientID": "42"})
+        with self.assertRaisesRegex(parse_argument.InvalidArgument, "StudyDate"):
+            parse_argument.verify_input_tags(input_tags)
+        parse_argument.verify_input_tags(input_tags, check_values=False)
+
     def test_parse_with_tag_to_fill_one_tag_with_value(self):
         """parse_argument.parse() shall parse tag to fill: one tag with value"""
         tag_value1 = ("PatientName", "Wayne^Bruce")
@@ -322,3 +329,31 @@ class TestParseArgument(unittest.TestCase):
         (_, options) = parse_argument.parse(args)
         self.assertTrue(options.verbose_log)
         self.assertTrue(options.overwrite_output_file)
+
+    def test_parse_option_jobs(self):
+        """parse_argument.parse() shall parse the number of jobs"""
+        args = Mock(fill=None, replace=None, json_path=None, jobs=4)
+        (_, options) = parse_argument.parse(args)
+        self.assertEqual(options.jobs, 4)
+
+    def test_parse_option_jobs_none(self):
+        """parse_argument.parse() shall use at least one job if the number of jobs is not specified"""
+        args = Mock(fill=None, replace=None, json_path=None, jobs=None)
+        (_, options) = parse_argument.parse(args)
+        self.assertGreaterEqual(options.jobs, 1)
+
+    def test_parse_option_resume_without_journal(self):
+        """parse_argument.parse() shall raise an exception if a run is resumed without journal"""
+        args = Mock(fill=None, replace=None, json_path=None, resume=True, journal_path=None)
+        with self.assertRaises(parse_argument.InvalidArgument):
+            parse_argument.parse(args)
+
+    def test_parse_option_scan_report_without_dry_run(self):
+        """parse_argument.parse() shall raise an exception if a scan report is requested without dry run"""
+        args = Mock(fill=None, replace=None, json_path=None, scan_report="scan.json", dry_run=False)
+        with self.assertRaises(parse_argument.InvalidArgument):
+            parse_argument.parse(args)
+
+    def test_verify_input_tags_generated_replacements(self):
+        """parse_argument.verify_input_tags() shall accept tags to replace without value if they are generated"""
+        parse_argument.verify_input_tags(parse_argument.InputTags({}, {"PatientName": None}), generated_replacements=True)
@@ -0,0 +1,116 @@
+""" Test fill_dcm.pipeline unit tests
+"""
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from pydicom import dcmread, examples
+
+from fill_dcm import edit_plan, fill_dcm, parse_argument, pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    """Test fill_dcm.pipeline"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+        self.files = []
+        for index in range(8):
+            file = self.directory / f"ct_{index}.dcm"
+            examples.ct.save_as(file)
+            self.files.append(str(file))
+        invalid_file = self.directory / "invalid.dcm"
+        invalid_file.write_bytes(b"not a DICOM file")
+        self.files.append(str(invalid_file))
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def check_run(self, options):
+        """Run the pipeline and check all valid files are adjusted"""
+        plan = edit_plan.compile_plan(parse_argument.InputTags({}, {"PatientID": "ABCD", "InstitutionAddress": "FillDCM"}))
+
+        summary = pipeline.adjust_dicom_files_pipeline(self.files, plan, options)
+
+        self.assertEqual(summary.total, 9)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.REWRITTEN], 8)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.READ_ERROR], 1)
+        for file in self.files[:-1]:
+            dataset = dcmread(fill_dcm.output_filepath(file, options.overwrite_output_file))
+            self.assertEqual(dataset.PatientID, "ABCD")
+            self.assertEqual(dataset.InstitutionAddress, "FillDCM")
+
+    def test_pipeline(self):
+        """All files go through the three stages"""
+        self.check_run(parse_argument.Options(pipeline=True))
+
+    def test_pipeline_single_task_per_stage(self):
+        """The pipeline completes with one task per stage and queues of one file"""
+        self.check_run(
+            parse_argument.Options(
+                overwrite_output_file=True, pipeline=True, read_concurrency=1, adjust_concurrency=1, write_concurrency=1, queue_size=1
+            )
+        )
+
+    def test_discovery_outside_event_loop(self):
+        """Files discovered during the run are iterated from the discovery thread, not from the thread of the event loop"""
+        threads = []
+
+        def discovered_files():
+            for file in self.files:
+                threads.append(threading.current_thread().name)
+                yield file
+
+        plan = edit_plan.compile_plan(parse_argument.InputTags({}, {"PatientID": "ABCD"}))
+        summary = pipeline.adjust_dicom_files_pipeline(discovered_files(), plan, parse_argument.Options(pipeline=True))
+
+        self.assertEqual(summary.total, 9)
+        self.assertTrue(all(thread.startswith("discover") for thread in threads))
+
+    def test_adjust_dicom_files_with_pipeline(self):
+        """fill_dcm.adjust_dicom_files() uses the pipeline when the option is set"""
+        summary = fill_dcm.adjust_dicom_files(self.files, parse_argument.InputTags({}, {"PatientID": "ABCD"}), parse_argument.Options(pipeline=True))
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.PATCHED], 8)
+        self.assertEqual(summary.failed, 1)
+
+    def test_pipeline_with_manifest(self):
+        """Discovered files are checked against the manifest from the thread of the run: unchanged files are skipped by the next run"""
+        input_tags = parse_argument.InputTags({}, {"PatientID": "ABCD"})
+        options = parse_argument.Options(jobs=1, pipeline=True, manifest_path=str(self.directory / "manifest.db"))
+
+        summary = fill_dcm.adjust_dicom_files(iter(self.files), input_tags, options)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.PATCHED], 8)
+        summary = fill_dcm.adjust_dicom_files(iter(self.files), input_tags, options)
+
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.SKIPPED], 8)
+        self.assertEqual(summary.failed, 1)
+
+    def test_pipeline_with_resume(self):
+        """A resumed pipeline run replays the files of the journal and processes the others"""
+        input_tags = parse_argument.InputTags({}, {"PatientID": "ABCD"})
+        journal_path = str(self.directory / "journal.jsonl")
+        fill_dcm.adjust_dicom_files(
+            iter(self.files[:4]), input_tags, parse_argument.Options(overwrite_output_file=True, jobs=1, pipeline=True, journal_path=journal_path)
+        )
+        options = parse_argument.Options(overwrite_output_file=True, jobs=1, pipeline=True, journal_path=journal_path, resume=True)
+
+        summary = fill_dcm.adjust_dicom_files(iter(self.files), input_tags, options)
+
+        self.assertEqual(summary.total, 9)
+        # Replayed files are counted with their status in the interrupted run, the files processed again would be unchanged
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.PATCHED], 8)
+        self.assertEqual(summary.counts[fill_dcm.FileStatus.UNCHANGED], 0)
+        self.assertEqual(summary.failed, 1)
+
+    def test_pipeline_failure(self):
+        """An unexpected error in a stage stops the pipeline and is raised, the other stages don't wait for the failed one"""
+        plan = edit_plan.compile_plan(parse_argument.InputTags({}, {"PatientID": "ABCD"}))
+        options = parse_argument.Options(pipeline=True, read_concurrency=1, adjust_concurrency=1, write_concurrency=1, queue_size=1)
+
+        with patch.object(fill_dcm, "_adjust_dicom_edit", side_effect=RuntimeError("adjust failed")):
+            with self.assertRaisesRegex(RuntimeError, "adjust failed"):
+                pipeline.adjust_dicom_files_pipeline(self.files, plan, options)
@@ -0,0 +1,68 @@
+""" Test fill_dcm.scan unit tests
+"""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from pydicom import examples
+
+from fill_dcm import parse_argument, scan
+
+
+class TestScan(unittest.TestCase):
+    """Test fill_dcm.scan"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+        self.files = []
+        for index, patient_id in enumerate(["ABCD", "1234", "5678"]):
+            dataset = examples.ct
+            dataset.PatientID = patient_id
+            if index == 2:
+                dataset.InstitutionAddress = ""
+            self.files.append(str(self.directory / f"ct_{index}.dcm"))
+            dataset.save_as(self.files[-1])
+        invalid_file = self.directory / "invalid.dcm"
+        invalid_file.write_bytes(b"not a DICOM file")
+        self.files.append(str(invalid_file))
+        self.input_tags = parse_argument.InputTags({"InstitutionAddress": None}, {"PatientID": "ABCD"})
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_scan_dicom_files(self):
+        """States of the tags and files to write are reported, and nothing is written"""
+        contents = {file: Path(file).read_bytes() for file in self.files}
+        report_path = self.directory / "scan.json"
+
+        report = scan.scan_dicom_files(self.files, self.input_tags, parse_argument.Options(jobs=1, dry_run=True, scan_report=str(report_path)))
+
+        self.assertEqual(report.tags["PatientID"], {"missing": 0, "empty": 0, "present": 3})
+        self.assertEqual(report.tags["InstitutionAddress"], {"missing": 2, "empty": 1, "present": 0})
+        self.assertEqual(report.files_to_write, self.files[:3])
+        self.assertEqual(list(report.errors), self.files[3:])
+        self.assertEqual(json.loads(report_path.read_text())["files"], 4)
+        self.assertEqual({file: Path(file).read_bytes() for file in self.files}, contents)
+        self.assertEqual(sorted(path.name for path in self.directory.iterdir()), ["ct_0.dcm", "ct_1.dcm", "ct_2.dcm", "invalid.dcm", "scan.json"])
+
+    def test_unchanged(self):
+        """Files whose values are already the ones of the plan wouldn't be written"""
+        report = scan.scan_dicom_files(self.files[:2], parse_argument.InputTags({}, {"PatientID": "ABCD"}), parse_argument.Options(jobs=1))
+
+        self.assertEqual(report.files_to_write, self.files[1:2])
+        self.assertEqual(report.unchanged, 1)
+
+    def test_parallel_scan(self):
+        """With several jobs, the report is the one of a serial scan"""
+        report = scan.scan_dicom_files(self.files, self.input_tags, parse_argument.Options(jobs=2))
+
+        self.assertEqual(report.tags["InstitutionAddress"], {"missing": 2, "empty": 1, "present": 0})
+        self.assertEqual(sorted(report.files_to_write), self.files[:3])
+        self.assertEqual(len(report.errors), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+""" Test fill_dcm.server unit tests
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from pydicom import dcmread, examples
+
+from fill_dcm import fill_dcm, parse_argument, server
+
+
+class TestServer(unittest.TestCase):
+    """Test fill_dcm.server"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = Path(self.temporary_directory.name)
+        self.socket_path = str(self.directory / "filldcm.sock")
+        self.files = []
+        for index in range(4):
+            file = self.directory / f"ct_{index}.dcm"
+            examples.ct.save_as(file)
+            self.files.append(str(file))
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def start_server(self, jobs):
+        """Start a server in a thread and stop it at the end of the test"""
+        filldcm_server = server.FillDCMServer(self.socket_path, jobs)
+        thread = threading.Thread(target=filldcm_server.serve_forever)
+        thread.start()
+
+        def stop():
+            filldcm_server.shutdown()
+            thread.join()
+            filldcm_server.server_close()
+
+        self.addCleanup(stop)
+        return filldcm_server
+
+    def test_plan_hash(self):
+        """The hash depends on the content of the tags, not on their order"""
+        first = parse_argument.InputTags({"PatientID": None, "PatientName": "A^B"}, {})
+        second = parse_argument.InputTags({"PatientName": "A^B", "PatientID": None}, {})
+        self.assertEqual(server.plan_hash(first), server.plan_hash(second))
+        self.assertNotEqual(server.plan_hash(first), server.plan_hash(parse_argument.InputTags({}, {"PatientName": "A^B"})))
+
+    def test_socket_mode(self):
+        """The socket is only accessible to the user running the server"""
+        self.start_server(1)
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+
+    def check_jobs(self, jobs):
+        """Results of each file are streamed and the compiled plan is cached between jobs"""
+        filldcm_server = self.start_server(jobs)
+        input_tags = parse_argument.InputTags({}, {"InstitutionAddress": "FillDCM"})
+
+        for _ in range(2):
+            messages = list(server.submit(self.socket_path, self.files, input_tags, parse_argument.Options(overwrite_output_file=True)))
+
+            self.assertEqual([message["file"] for message in messages[:-1]], self.files)
+            self.assertTrue(all(message["error"] is None for message in messages[:-1]))
+            self.assertEqual(messages[-1]["summary"]["total"], 4)
+            self.assertEqual(messages[-1]["summary"]["failed"], 0)
+        self.assertEqual(len(filldcm_server.plans), 1)
+        for file in self.files:
+            self.assertEqual(dcmread(file).InstitutionAddress, "FillDCM")
+
+    def test_serial_jobs(self):
+        """Jobs run in the server process with one job"""
+        self.check_jobs(1)
+
+    def test_pool_jobs(self):
+        """Jobs are spread over the pool of the server"""
+        self.check_jobs(2)
+
+    def test_group_by_job(self):
+        """Files of a group get the same values in a job spread over the pool, other groups get other values"""
+        self.start_server(2)
+        for index, file in enumerate(self.files):
+            dataset = dcmread(file)
+            dataset.PatientID = f"PATIENT{index % 2}"
+            del dataset.InstitutionName
+            dataset.save_as(file)
+        input_tags = parse_argument.InputTags({"InstitutionName": None}, {})
+
+        messages = list(
+            server.submit(self.socket_path, self.files, input_tags, parse_argument.Options(overwrite_output_file=True, group_by="patient"))
+        )
+
+        self.assertEqual(messages[-1]["summary"]["failed"], 0)
+        institutions = [dcmread(file).InstitutionName for file in self.files]
+        self.assertEqual(institutions[0], institutions[2])
+        self.assertEqual(institutions[1], institutions[3])
+        self.assertNotEqual(institutions[0], institutions[1])
+
+    def test_uid_root_jobs(self):
+        """UIDs generated by the pool follow the root of each job"""
+        self.start_server(2)
+        input_tags = parse_argument.InputTags({"IrradiationEventUID": None}, {})
+
+        for root in ("1.2.826.0.1.3680043.10.543", None):
+            for file in self.files:
+                examples.ct.save_as(file)
+            options = parse_argument.Options(overwrite_output_file=True, per_file_values=True, uid_root=root)
+            messages = list(server.submit(self.socket_path, self.files, input_tags, options))
+
+            self.assertEqual(messages[-1]["summary"]["failed"], 0)
+            for file in self.files:
+                self.assertTrue(dcmread(file).IrradiationEventUID.startswith(f"{root or '2.25'}."))
+
+    def test_invalid_job(self):
+        """A job with an invalid plan is refused"""
+        self.start_server(1)
+        input_tags = parse_argument.InputTags({}, {"NotATag": "FillDCM"})
+        with self.assertRaises(server.JobError):
+            list(server.submit(self.socket_path, self.files, input_tags, parse_argument.Options()))
+
+    def test_client_executable(self):
+        """The client command line sends its job to the server"""
+        self.start_server(1)
+        status = fill_dcm.fill_dcm_executable(["client", "--socket", self.socket_path, "-r", "PatientID=ABCD", *self.files])
+        self.assertEqual(status, 0)
+        for file in self.files:
+            self.assertEqual(dcmread(fill_dcm.output_filepath(file)).PatientID, "ABCD")
+
+    def test_client_unsupported_options(self):
+        """Options a job can't honour are refused by the client, before anything is sent"""
+        self.start_server(1)
+        self.assertEqual(server.unsupported_options(parse_argument.Options(jobs=3, overwrite_output_file=True)), [])
+        self.assertEqual(server.unsupported_options(parse_argument.Options(dry_run=True, pipeline=True)), ["pipeline", "dry_run"])
+
+        # The executable sets the handler of the root logger
+        root = logging.getLogger()
+        self.addCleanup(setattr, root, "handlers", root.handlers[:])
+        self.addCleanup(root.setLevel, root.level)
+        status = fill_dcm.fill_dcm_executable(["client", "--socket", self.socket_path, "--dry-run", "-ov", "-r", "PatientID=ABCD", *self.files])
+
+        self.assertEqual(status, 1)
+        for file in self.files:
+            self.assertEqual(dcmread(file).PatientID, examples.ct.PatientID)
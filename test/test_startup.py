@@ -0,0 +1,38 @@
+""" Test benchmark.startup unit tests
+"""
+
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from benchmark import startup
+
+
+class TestStartup(unittest.TestCase):
+    """Test benchmark.startup"""
+
+    def test_parse_importtime(self):
+        """Self and cumulative times of each module are parsed, nested imports aren't top-level"""
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   enum\n"
+            "import time:       300 |        420 | fill_dcm\n"
+            "usage: FillDCM\n"
+        )
+        modules = startup.parse_importtime(stderr)
+        self.assertEqual(modules["enum"], {"self_us": 120, "cumulative_us": 120, "top_level": False})
+        self.assertEqual(modules["fill_dcm"], {"self_us": 300, "cumulative_us": 420, "top_level": True})
+
+    def test_help_defers_imports(self):
+        """--help is answered without importing pydicom, numpy or the processing modules"""
+        with tempfile.TemporaryDirectory() as pycache_prefix:
+            run = startup.run_command(startup.COMMANDS["help"], pycache_prefix)
+        self.assertIn("fill_dcm.fill_dcm", run["modules"])
+        for module in startup.DEFERRED_MODULES:
+            self.assertNotIn(module, run["modules"])
+
+    def test_lazy_modules(self):
+        """Modules of the package are still reachable as attributes of fill_dcm.fill_dcm"""
+        code = "import sys; from fill_dcm import fill_dcm; assert 'pydicom' not in sys.modules; fill_dcm.vr_generators.generate_date()"
+        subprocess.run([sys.executable, "-c", code], check=True)
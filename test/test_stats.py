@@ -0,0 +1,44 @@
+""" Test fill_dcm.stats unit tests
+"""
+
+import unittest
+from array import array
+
+from fill_dcm import fill_dcm, stats
+
+
+class TestStats(unittest.TestCase):
+    """Test fill_dcm.stats"""
+
+    def test_percentile(self):
+        """Percentiles use the nearest rank"""
+        values = array("d", range(1, 101))
+        self.assertEqual(stats.percentile(values, 50), 50)
+        self.assertEqual(stats.percentile(values, 95), 95)
+        self.assertEqual(stats.percentile(values, 100), 100)
+        self.assertEqual(stats.percentile(array("d", [3.0]), 99), 3.0)
+        self.assertEqual(stats.percentile(array("d"), 50), 0.0)
+
+    def test_run_statistics(self):
+        """Timings, volumes and errors of the files are accumulated"""
+        statistics = stats.RunStatistics(slowest_files=2)
+        for index in range(5):
+            timings = {"read": index, "adjust": 0.5, "output_filepath": 0.0, "write": 1.0}
+            changes = [("update", "InstitutionName", "Github Hospital")]
+            statistics.add(fill_dcm.FileResult(f"file_{index}", fill_dcm.FileStatus.PATCHED, None, timings, 100, 10, changes=changes))
+        statistics.add(fill_dcm.FileResult("invalid", fill_dcm.FileStatus.READ_ERROR, "error", {"read": 0.1}, error_type="InvalidDicomError"))
+
+        report = statistics.report()
+
+        self.assertEqual(report["files"], 6)
+        self.assertEqual(report["stages"]["read"]["total"], 10.1)
+        self.assertEqual(report["stages"]["read"]["max"], 4)
+        self.assertEqual(report["stages"]["write"]["p50"], 1.0)
+        self.assertEqual(report["bytes_read"], 500)
+        self.assertEqual(report["bytes_written"], 50)
+        self.assertEqual(report["statuses"], {"patched": 5, "read_error": 1})
+        self.assertEqual(report["errors"], {"read_error": 1})
+        self.assertEqual(report["error_types"], {"InvalidDicomError": 1})
+        self.assertEqual(report["changes"], {"InstitutionName": {"update": 5}})
+        self.assertEqual([slow["file"] for slow in report["slowest_files"]], ["file_4", "file_3"])
+        self.assertEqual(report["slowest_files"][0]["seconds"], 5.5)
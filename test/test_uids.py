@@ -0,0 +1,74 @@
+""" Test fill_dcm.uids unit tests
+"""
+
+import os
+import unittest
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from fill_dcm import uids, vr_validation
+
+
+def _generate_in_worker(count):
+    """Generate UIDs from a worker process"""
+    return uids.get_generator().generate_block(count)
+
+
+class TestUIDs(unittest.TestCase):
+    """Test fill_dcm.uids"""
+
+    def test_uuid_form(self):
+        """Without root, UIDs are 2.25.<integer> with the integer of a random UUID"""
+        generator = uids.UIDGenerator()
+        values = generator.generate_block(1000) + [generator.next()]
+
+        self.assertEqual(len(set(values)), 1001)
+        for value in values:
+            self.assertIsNone(vr_validation.invalid_value("UI", value))
+            root, integer = value.rsplit(".", 1)
+            self.assertEqual(root, "2.25")
+            self.assertLess(int(integer), 2**128)
+            self.assertEqual(uuid.UUID(int=int(integer)).version, 4)
+
+    def test_organization_root(self):
+        """With a root, UIDs are <root>.<namespace>.<counter> and fit in 64 characters"""
+        root = "1.2.826.0.1.3680043.10.543.7"
+        generator = uids.UIDGenerator(root)
+        generator.reserve(uids.COUNTER_LIMIT - 2)
+
+        values = generator.generate_block(2)
+
+        for value in values:
+            self.assertIsNone(vr_validation.invalid_value("UI", value))
+            self.assertTrue(value.startswith(f"{root}."))
+            self.assertEqual(len(value.split(".")), len(root.split(".")) + 2)
+        self.assertLessEqual(len(values[1]), 64)
+        self.assertRaises(OverflowError, generator.next)
+
+    def test_invalid_root(self):
+        """A root shall be a single valid UID short enough to prefix the UIDs"""
+        self.assertIsNone(uids.invalid_root("1.2.3"))
+        for root in ("", "1.02.3", "1.2.", "1.2\\1.3", "1." + "2" * uids.MAX_ROOT_LENGTH):
+            with self.subTest(root=root):
+                self.assertIsNotNone(uids.invalid_root(root))
+        self.assertRaises(ValueError, uids.UIDGenerator, "1.02.3")
+
+    def test_generators_never_collide(self):
+        """Generators of the same process use different namespaces, and so do the generators of other processes"""
+        values = uids.UIDGenerator().generate_block(100) + uids.UIDGenerator().generate_block(100)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            for block in executor.map(_generate_in_worker, [100] * 4):
+                values += block
+
+        self.assertEqual(len(set(values)), len(values))
+
+    def test_get_generator(self):
+        """The process has a generator per root"""
+        self.assertTrue(uids.get_generator("1.2.3").next().startswith("1.2.3."))
+        self.assertIs(uids.get_generator("1.2.3"), uids.get_generator("1.2.3"))
+        self.assertTrue(uids.get_generator().next().startswith("2.25."))
+        self.assertEqual(int(uids.get_generator("1.2.3").next().split(".")[-2]) % 2**uids.PID_BITS, os.getpid())
+
+
+if __name__ == "__main__":
+    unittest.main()
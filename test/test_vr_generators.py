@@ -3,6 +3,7 @@
 
 import string
 import unittest
+from unittest.mock import patch
 
 from fill_dcm import fill_dcm
 
@@ -116,12 +117,58 @@ class TestVRGenerators(unittest.TestCase):
         unique_identifier = fill_dcm.vr_generators.generate_unique_identifier()
         self.assertLessEqual(len(unique_identifier), 64)
         splitted_uid = unique_identifier.split(".")
-        self.assertEqual(len(splitted_uid), 4)
-        for part in splitted_uid:
-            int(part)  # each part is a number
+        self.assertEqual(splitted_uid[:2], ["2", "25"])
+        self.assertLess(int(splitted_uid[2]), 2**128)
+        self.assertNotEqual(fill_dcm.vr_generators.generate_unique_identifier(), unique_identifier)
 
     def test_generate_unsigned_short(self):
         """Test generate_unsigned_short()"""
         unsigned_short = fill_dcm.vr_generators.generate_unsigned_short()
         self.assertGreaterEqual(unsigned_short, 0)
         self.assertLess(unsigned_short, 65536)
+
+    def check_batches(self):
+        """Generate a batch for each VR and check the values"""
+        for vr in fill_dcm.vr_generators.VR_GENERATORS:
+            values = fill_dcm.vr_generators.generate_batch(vr, 50)
+            self.assertEqual(len(values), 50, vr)
+            self.assertEqual(type(values[0]), type(fill_dcm.vr_generators.VR_GENERATORS[vr]()), vr)
+
+        for date in fill_dcm.vr_generators.generate_batch("DA", 50):
+            self.assertEqual(len(date), 8)
+            self.assertTrue(date.isdigit())
+            self.assertLessEqual(int(date[4:6]), 12)
+        for long_string in fill_dcm.vr_generators.generate_batch("LO", 50):
+            self.assertGreaterEqual(len(long_string), 1)
+            self.assertLessEqual(len(long_string), 64)
+            self.assertTrue(long_string.isalnum())
+        for age_string in fill_dcm.vr_generators.generate_batch("AS", 50):
+            self.assertEqual(len(age_string), 4)
+            self.assertTrue(age_string[0:3].isdigit())
+        unique_identifiers = fill_dcm.vr_generators.generate_batch("UI", 50)
+        self.assertEqual(len(set(unique_identifiers)), 50)
+        for unique_identifier in unique_identifiers:
+            self.assertTrue(unique_identifier.startswith("2.25."))
+        for unsigned_short in fill_dcm.vr_generators.generate_batch("US", 50):
+            self.assertLess(unsigned_short, 65536)
+
+    def test_generate_batch(self):
+        """Test generate_batch()"""
+        self.check_batches()
+
+    def test_generate_batch_without_numpy(self):
+        """Test generate_batch() without NumPy"""
+        with patch.object(fill_dcm.vr_generators, "numpy", None):
+            self.check_batches()
+
+    def test_generate_batch_invalid_vr(self):
+        """generate_batch() shall throw if the VR is not managed"""
+        self.assertRaises(ValueError, fill_dcm.vr_generators.generate_batch, "SQ", 10)
+
+    def test_value_pool(self):
+        """A pool gives values of its VR and is refilled when empty"""
+        pool = fill_dcm.vr_generators.ValuePool("SH", batch_size=3)
+        values = [pool.next() for _ in range(7)]
+        for value in values:
+            self.assertGreaterEqual(len(value), 1)
+            self.assertLessEqual(len(value), 16)
@@ -0,0 +1,64 @@
+""" Test fill_dcm.vr_validation unit tests
+"""
+
+import unittest
+
+from fill_dcm import vr_validation
+
+
+class TestVRValidation(unittest.TestCase):
+    """Test fill_dcm.vr_validation"""
+
+    def test_valid_values(self):
+        """Values matching the rules of their VR are valid"""
+        for vr, value in [
+            ("DA", "20240229"),
+            ("TM", "235960.123456"),
+            ("DT", "20240101120000+0100"),
+            ("UI", "1.2.840.10008.1.2"),
+            ("DS", "-1.5e3\\.5"),
+            ("IS", 2147483647),
+            ("CS", "ORIGINAL\\PRIMARY"),
+            ("PN", "Wayne^Bruce=ウェイン^ブルース"),
+            ("LO", "Hôpital"),
+            ("LT", "Line 1\r\nLine 2 with a \\"),
+            ("AS", "042Y"),
+            ("US", [512, 0]),
+            ("FD", 1.5),
+            ("LO", ""),
+        ]:
+            with self.subTest(vr=vr, value=value):
+                self.assertIsNone(vr_validation.invalid_value(vr, value))
+
+    def test_invalid_values(self):
+        """Values breaking the length, the characters or the format of their VR are invalid"""
+        for vr, value in [
+            ("DA", "20241301"),
+            ("DA", "2024-01-01"),
+            ("TM", "246000"),
+            ("UI", "1.02.3"),
+            ("UI", "1." + "2" * 63),
+            ("DS", "abc"),
+            ("DS", "1.00000000000000001"),
+            ("IS", "2147483648"),
+            ("CS", "lower"),
+            ("AE", "Hôpital"),
+            ("SH", "A" * 17),
+            ("PN", "A^B^C^D^E^F"),
+            ("LO", "Line\nbreak"),
+            ("US", "512"),
+            ("US", 70000),
+            ("FL", True),
+        ]:
+            with self.subTest(vr=vr, value=value):
+                self.assertIsNotNone(vr_validation.invalid_value(vr, value))
+
+    def test_unchecked_vrs(self):
+        """Values of the VRs without rule are not checked"""
+        self.assertFalse(vr_validation.is_checked("OB"))
+        self.assertIsNone(vr_validation.invalid_value("OB", "anything"))
+        self.assertIsNone(vr_validation.invalid_value("DA", None))
+
+
+if __name__ == "__main__":
+    unittest.main()